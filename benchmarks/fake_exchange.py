@@ -0,0 +1,267 @@
+# Local stand-in for the exchange order endpoints, plus a benchmark of the
+# order execution pipeline against it
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib import import_module
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from ladon.execution import Executor
+
+API_KEY = "benchmark-key"
+API_SECRET = "benchmark-secret"
+
+
+class FakeExchange(object):
+    # Checks signatures and order rate limits like the exchange does, fills
+    # every market order in full after `delay` seconds and keeps the
+    # resulting positions. Answers 429 once `orders_per_10s` orders were
+    # placed within the current 10 second window.
+    def __init__(self, symbols, futures=True, orders_per_10s=300, delay=0.0):
+        self.symbols = symbols
+        self.futures = futures
+        self.orders_per_10s = orders_per_10s
+        self.delay = delay
+        self.positions = dict.fromkeys(symbols, 0.0)
+        self.balance = 10000.0
+        self.orders = 0
+        self.rejected = 0
+        self.requests = 0
+        self.connections = set()
+        self._window = 0
+        self._placed = 0
+        self._lock = threading.Lock()
+
+    def exchange_info(self):
+        return {
+            "rateLimits": [
+                {
+                    "rateLimitType": "REQUEST_WEIGHT",
+                    "interval": "MINUTE",
+                    "intervalNum": 1,
+                    "limit": 2400,
+                },
+                {
+                    "rateLimitType": "ORDERS",
+                    "interval": "SECOND",
+                    "intervalNum": 10,
+                    "limit": self.orders_per_10s,
+                },
+                {
+                    "rateLimitType": "ORDERS",
+                    "interval": "DAY",
+                    "intervalNum": 1,
+                    "limit": 200000,
+                },
+            ],
+            "symbols": [
+                {
+                    "symbol": symbol,
+                    "status": "TRADING",
+                    "baseAsset": symbol[:-4],
+                    "quoteAsset": "USDT",
+                    "filters": [
+                        {"filterType": "LOT_SIZE", "stepSize": "0.001"},
+                        {"filterType": "MIN_NOTIONAL", "notional": "5"},
+                    ],
+                }
+                for symbol in self.symbols
+            ],
+        }
+
+    def account(self):
+        if self.futures:
+            return {
+                "totalMarginBalance": str(self.balance),
+                "positions": [
+                    {"symbol": symbol, "positionAmt": str(amount)}
+                    for symbol, amount in self.positions.items()
+                ],
+            }
+        return {
+            "balances": [{"asset": "USDT", "free": str(self.balance), "locked": "0"}]
+            + [
+                {"asset": symbol[:-4], "free": str(amount), "locked": "0"}
+                for symbol, amount in self.positions.items()
+            ]
+        }
+
+    def _count(self, orders):
+        # Orders placed in this window, or None if over the limit
+        with self._lock:
+            window = int(time.time() // 10)
+            if window != self._window:
+                self._window = window
+                self._placed = 0
+            if self._placed + orders > self.orders_per_10s:
+                self.rejected += orders
+                return None
+            self._placed += orders
+            self.orders += orders
+            return self._placed
+
+    def fill(self, order):
+        quantity = float(order["quantity"])
+        with self._lock:
+            self.positions[order["symbol"]] += (
+                quantity if order["side"] == "BUY" else -quantity
+            )
+            order_id = self.orders
+        return {
+            "orderId": order_id,
+            "symbol": order["symbol"],
+            "status": "FILLED",
+            "executedQty": order["quantity"],
+        }
+
+    def handler(self):
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body, headers=()):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def signed(self, query):
+                payload, _, signature = query.rpartition("&signature=")
+                expected = hmac.new(
+                    API_SECRET.encode(), payload.encode(), hashlib.sha256
+                ).hexdigest()
+                return self.headers.get(
+                    "X-MBX-APIKEY"
+                ) == API_KEY and hmac.compare_digest(signature, expected)
+
+            def handle_one_request(self):
+                exchange.connections.add(self.client_address)
+                super().handle_one_request()
+
+            def do_GET(self):
+                exchange.requests += 1
+                url = urlparse(self.path)
+                if url.path.endswith("/exchangeInfo"):
+                    return self.reply(200, exchange.exchange_info())
+                if not self.signed(url.query):
+                    return self.reply(401, {"code": -1022, "msg": "Bad signature"})
+                if url.path.endswith("/account"):
+                    return self.reply(200, exchange.account())
+                self.reply(404, {"code": -1, "msg": "Not found"})
+
+            def do_POST(self):
+                exchange.requests += 1
+                url = urlparse(self.path)
+                if not self.signed(url.query):
+                    return self.reply(401, {"code": -1022, "msg": "Bad signature"})
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                if url.path.endswith("/batchOrders"):
+                    orders = json.loads(params["batchOrders"])
+                elif url.path.endswith("/order"):
+                    orders = [params]
+                else:
+                    return self.reply(404, {"code": -1, "msg": "Not found"})
+
+                count = exchange._count(len(orders))
+                if count is None:
+                    return self.reply(
+                        429,
+                        {"code": -1015, "msg": "Too many new orders"},
+                        [("Retry-After", "1")],
+                    )
+                time.sleep(exchange.delay)
+                results = [exchange.fill(order) for order in orders]
+                self.reply(
+                    200,
+                    results if url.path.endswith("/batchOrders") else results[0],
+                    [("x-mbx-order-count-10s", str(count))],
+                )
+
+        return Handler
+
+    def serve(self, host="localhost", port=0):
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+async def run(args):
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    exchange = FakeExchange(
+        symbols, args.provider == "binance_futures", args.orders_per_10s, args.delay
+    )
+    server = exchange.serve()
+
+    os.environ["BINANCE_API_KEY"] = API_KEY
+    os.environ["BINANCE_API_SECRET"] = API_SECRET
+    provider = import_module(f"ladon.providers.{args.provider}")
+    provider.BASE_URL = f"http://localhost:{server.server_address[1]}"
+
+    info = await provider.exchange_info()
+    executor = Executor(provider, info, symbols, band=args.band)
+    rng = np.random.default_rng(0)
+    prices = 100 + rng.normal(size=len(symbols))
+    await executor.sync(prices)
+
+    worker = asyncio.ensure_future(executor.run())
+    start_time = time.perf_counter()
+    for _ in range(args.rebalances):
+        weights = rng.dirichlet(np.ones(len(symbols)))
+        executor.rebalance(weights, prices)
+        await asyncio.sleep(args.period)
+    # Let the last rebalance drain
+    while executor._pending or np.any(executor.in_flight != 0):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start_time
+    worker.cancel()
+    await provider.close()
+    server.shutdown()
+
+    print(
+        f"{executor.sent} orders in {elapsed:.2f}s ({executor.sent / elapsed:.0f}/s), "
+        f"{executor.failed} failed"
+    )
+    print(
+        f"{exchange.requests} requests over {len(exchange.connections)} "
+        f"connections, {exchange.rejected} orders rejected by the rate limit"
+    )
+    print(f"order round trip: {executor.latency}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--provider",
+        default="binance_futures",
+        choices=["binance", "binance_futures"],
+    )
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--rebalances", type=int, default=20)
+    parser.add_argument("--period", type=float, default=0.05)
+    parser.add_argument("--band", type=float, default=0.001)
+    parser.add_argument("--orders-per-10s", type=int, default=300)
+    parser.add_argument("--delay", type=float, default=0.001)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
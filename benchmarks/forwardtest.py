@@ -0,0 +1,85 @@
+# Per-bar stage timings of ForwardTest on a simulated 1m universe streamed
+# from the local kline stand-in server
+import argparse
+import asyncio
+from importlib import import_module
+
+import numpy as np
+from kline_server import KlineServer
+
+from ladon.base import Candlestick
+from ladon.forwardtest import ForwardTest
+from ladon.providers.stream import KlineStream
+
+
+def universe(symbols, history, start):
+    rng = np.random.default_rng(0)
+    candlesticks = {}
+    for i in range(symbols):
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, history)))
+        array = np.empty((history, 7))
+        array[:, 0] = start + 60 * np.arange(-history, 0)
+        array[:, 1:5] = closes[:, None]
+        array[:, 5] = 10.0
+        array[:, 6] = 10 * closes
+        symbol = f"SYM{i}USDT"
+        candlesticks[symbol] = Candlestick.from_array(
+            symbol, array, max_history=history
+        )
+    return candlesticks
+
+
+def empty_backfill(symbol, interval, start_time):
+    async def pages():
+        return
+        yield
+
+    return pages()
+
+
+async def run(args):
+    start = 1700000000 // 60 * 60
+    candlesticks = universe(args.symbols, args.history, start)
+    test = ForwardTest(
+        import_module(f"ladon.strategies.{args.strategy}"),
+        candlesticks,
+        report_every=0,
+    )
+    test.warm_up()
+
+    server = KlineServer(period=args.period, bar=args.ticks, start=start)
+    async with server.serve() as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        stream = KlineStream(
+            f"ws://localhost:{port}",
+            lambda symbol, interval: f"{symbol.lower()}@kline_{interval}",
+            empty_backfill,
+            candlesticks,
+            on_close=test.on_close,
+        )
+        clock = asyncio.ensure_future(server.clock())
+        task = asyncio.ensure_future(stream.run())
+        await asyncio.sleep(args.seconds)
+        await stream.stop()
+        await task
+        clock.cancel()
+
+    print(f"{args.symbols} symbols, {args.strategy}")
+    print(test.report())
+    print(f"  message latency: {stream.latency}")
+    print(f"  message processing: {stream.processing}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--history", type=int, default=1500)
+    parser.add_argument("--strategy", default="multima")
+    parser.add_argument("--period", type=float, default=0.05)
+    parser.add_argument("--ticks", type=int, default=10, help="updates per bar")
+    parser.add_argument("--seconds", type=float, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Compare the loop/convolve strategy kernels with ladon.indicators
+import argparse
+import time
+
+import numpy as np
+
+from ladon import indicators
+
+
+def old_bb_zscore(closes, window, period):
+    bb_ma = np.array(
+        [np.convolve(c, np.ones(period), mode="valid") / period for c in closes]
+    )
+    bb_std = np.array(
+        [
+            np.std(closes[:, i - period : i], axis=1)
+            for i in range(period, window + period)
+        ]
+    ).T
+    return np.divide(
+        closes[:, period - 1 :] - bb_ma,
+        bb_std,
+        out=np.zeros((len(closes), window)),
+        where=bb_std != 0,
+    )
+
+
+def new_bb_zscore(closes, window, period):
+    return indicators.rolling_zscore(closes, period)[:, period - 1 :]
+
+
+def old_ma(closes, window, length):
+    return np.array(
+        [np.convolve(c, np.ones(length), mode="valid") / length for c in closes]
+    )
+
+
+def new_ma(closes, window, length):
+    return indicators.rolling_mean(closes, length)[:, length - 1 :]
+
+
+def timed(func, *args):
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+def streaming(closes, period):
+    # Feed the bars one at a time and check against the batch kernel
+    indicator = indicators.RollingZScore(period, shape=closes.shape[:1])
+    start_time = time.perf_counter()
+    result = np.array([indicator.update(bar) for bar in closes.T]).T
+    elapsed = time.perf_counter() - start_time
+    expected = indicators.rolling_zscore(closes, period)
+    diff = np.nanmax(np.abs(result - expected))
+    print(
+        f"streaming zscore period={period}: {1e6 * elapsed / closes.shape[1]:.1f}us "
+        f"per bar, max abs diff {diff:.2e}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--window", type=int, default=5000)
+    parser.add_argument("--periods", type=int, nargs="+", default=[20, 80, 320, 1280])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for period in args.periods:
+        closes = 100 * np.exp(
+            np.cumsum(
+                rng.normal(0, 0.01, (args.symbols, args.window + period - 1)), axis=1
+            )
+        )
+        for label, old, new in [
+            ("ma", old_ma, new_ma),
+            ("bb zscore", old_bb_zscore, new_bb_zscore),
+        ]:
+            expected, old_time = timed(old, closes, args.window, period)
+            result, new_time = timed(new, closes, args.window, period)
+            print(
+                f"{label} period={period}: old {old_time:.3f}s, new {new_time:.3f}s "
+                f"({old_time / new_time:.0f}x), "
+                f"max abs diff {np.max(np.abs(result - expected)):.2e}"
+            )
+        streaming(closes, period)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Compare candlestick ingest throughput with the default connection settings
+# and per-call commits against ingest mode with bulk() transactions
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ladon.database import SqliteDatabase
+
+
+def batches(rows, batch_size, symbols=100):
+    rng = np.random.default_rng(0)
+    bars = rows // symbols
+    for symbol in range(symbols):
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+        for start in range(0, bars, batch_size):
+            yield f"SYM{symbol}USDT", {
+                1500000000
+                + 60
+                * i: (
+                    c,
+                    c * 1.01,
+                    c * 0.99,
+                    c,
+                    10.0,
+                    10 * c,
+                    [(1500000000 + 60 * i) * 1000, str(c), str(c * 1.01)],
+                )
+                for i, c in enumerate(
+                    closes[start : start + batch_size].tolist(), start
+                )
+            }
+
+
+def ingest(filename, rows, batch_size, ingest_mode, raw_data, transaction_rows):
+    db = SqliteDatabase(filename, ingest=ingest_mode, raw_data=raw_data)
+    start_time = time.perf_counter()
+    if transaction_rows is None:
+        for symbol, data in batches(rows, batch_size):
+            db.add_candlesticks("binance", symbol, "1m", data)
+    else:
+        pending = iter(batches(rows, batch_size))
+        done = False
+        while not done:
+            with db.bulk():
+                for _ in range(max(transaction_rows // batch_size, 1)):
+                    item = next(pending, None)
+                    if item is None:
+                        done = True
+                        break
+                    db.add_candlesticks("binance", item[0], "1m", item[1])
+    elapsed = time.perf_counter() - start_time
+    size = sum(
+        os.path.getsize(path)
+        for path in (filename, filename + "-wal")
+        if os.path.exists(path)
+    )
+    del db
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--transaction-rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    runs = [
+        ("default, commit per call, json", False, "json", None),
+        ("ingest, bulk, json", True, "json", args.transaction_rows),
+        ("ingest, bulk, compact", True, "compact", args.transaction_rows),
+        ("ingest, bulk, no raw data", True, None, args.transaction_rows),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for i, (label, ingest_mode, raw_data, transaction_rows) in enumerate(runs):
+            elapsed, size = ingest(
+                os.path.join(directory, f"ladon{i}.db"),
+                args.rows,
+                args.batch_size,
+                ingest_mode,
+                raw_data,
+                transaction_rows,
+            )
+            print(
+                f"{label}: {elapsed:.2f}s ({args.rows / elapsed:.0f} rows/s, "
+                f"{size / args.rows:.0f} bytes/row)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# Local stand-in for the exchange combined kline streams, plus a benchmark of
+# KlineStream message handling against it
+import argparse
+import asyncio
+import json
+import time
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import websockets
+
+from ladon.base import INTERVALS_MAP, Candlestick
+from ladon.providers.stream import KlineStream
+
+
+class KlineServer(object):
+    # Sends one update per stream every `period` seconds. Bars open from
+    # `start` and last `bar` updates, the last one flagged closed.
+    # Connections are dropped after `drop_after` messages to exercise
+    # reconnects. Prices only depend on the symbol and tick, so klines()
+    # can answer REST backfills with the bars a stream would have seen.
+    def __init__(
+        self, interval="1m", period=0.1, bar=10, drop_after=None, seed=0, start=0
+    ):
+        self.interval = interval
+        self.start = start
+        self.period = period
+        self.bar = bar
+        self.drop_after = drop_after
+        self.seed = seed
+        self.sent = 0
+        self.connections = 0
+        self.tick = 0
+
+    def kline(self, symbol, tick):
+        open_time = (
+            self.start + (tick // self.bar) * INTERVALS_MAP[self.interval]
+        ) * 1000
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), tick])
+        price = 100 + rng.normal()
+        return {
+            "e": "kline",
+            "E": int(time.time() * 1000),
+            "s": symbol,
+            "k": {
+                "t": open_time,
+                "T": open_time + INTERVALS_MAP[self.interval] * 1000 - 1,
+                "s": symbol,
+                "i": self.interval,
+                "o": "100.0",
+                "c": f"{price:.4f}",
+                "h": f"{max(price, 100.0) + 1:.4f}",
+                "l": f"{min(price, 100.0) - 1:.4f}",
+                "v": "10.0",
+                "q": "1000.0",
+                "x": tick % self.bar == self.bar - 1,
+            },
+        }
+
+    def klines(self, symbol, start_time):
+        # REST rows of the bars opened at or after start_time (seconds) up to
+        # the current tick, each as of its latest tick
+        seconds = INTERVALS_MAP[self.interval]
+        first = max(0, -(-(start_time - self.start) // seconds))
+        rows = []
+        for index in range(first, self.tick // self.bar + 1):
+            tick = min(self.tick, (index + 1) * self.bar - 1)
+            k = self.kline(symbol, tick)["k"]
+            rows.append(
+                [k["t"], k["o"], k["h"], k["l"], k["c"], k["v"], k["T"], k["q"]]
+            )
+        return rows
+
+    async def handler(self, websocket):
+        self.connections += 1
+        streams = parse_qs(urlparse(websocket.request.path).query)["streams"][0]
+        symbols = [stream.split("@")[0].upper() for stream in streams.split("/")]
+        sent = 0
+        try:
+            while True:
+                tick = self.tick
+                for symbol, stream in zip(symbols, streams.split("/")):
+                    data = self.kline(symbol, tick)
+                    await websocket.send(json.dumps({"stream": stream, "data": data}))
+                    self.sent += 1
+                    sent += 1
+                    if self.drop_after is not None and sent >= self.drop_after:
+                        return
+                await asyncio.sleep(self.period)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def clock(self, until=None):
+        while until is None or self.tick < until:
+            await asyncio.sleep(self.period)
+            self.tick += 1
+
+    async def backfill(self, symbol, interval, start_time):
+        yield self.klines(symbol, start_time)
+
+    def serve(self, host="localhost", port=0):
+        return websockets.serve(self.handler, host, port)
+
+
+async def run(args):
+    server = KlineServer(period=args.period, drop_after=args.drop_after)
+    closed = []
+    candlesticks = {
+        f"SYM{i}USDT": Candlestick(f"SYM{i}USDT") for i in range(args.symbols)
+    }
+    async with server.serve() as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        stream = KlineStream(
+            f"ws://localhost:{port}",
+            lambda symbol, interval: f"{symbol.lower()}@kline_{interval}",
+            server.backfill,
+            candlesticks,
+            on_close=lambda symbol, open_time: closed.append((symbol, open_time)),
+            max_streams=args.max_streams,
+        )
+        clock = asyncio.ensure_future(server.clock())
+        task = asyncio.ensure_future(stream.run())
+        await asyncio.sleep(args.seconds)
+        await stream.stop()
+        await task
+        clock.cancel()
+
+    print(f"{server.sent} messages over {server.connections} connections")
+    print(f"{len(closed)} bars closed, {stream.reconnects} reconnects")
+    print(f"latency: {stream.latency}")
+    print(f"processing: {stream.processing}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--max-streams", type=int, default=200)
+    parser.add_argument("--period", type=float, default=0.1)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--drop-after", type=int)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
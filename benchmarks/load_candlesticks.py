@@ -0,0 +1,68 @@
+# Compare per-symbol and single-query candlestick loading on a synthetic database
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ladon.database import SqliteDatabase
+
+
+def populate(db, symbols, bars, interval="1m"):
+    rng = np.random.default_rng(0)
+    for symbol in symbols:
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+        db.add_candlesticks(
+            "binance",
+            symbol,
+            interval,
+            {
+                1500000000 + 60 * i: (c, c * 1.01, c * 0.99, c, 10.0, 10 * c, [])
+                for i, c in enumerate(closes.tolist())
+            },
+        )
+
+
+def timed(func):
+    start_time = time.perf_counter()
+    func()
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--bars", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    with tempfile.TemporaryDirectory() as directory:
+        db = SqliteDatabase(os.path.join(directory, "ladon.db"))
+        populate(db, symbols, args.bars)
+        rows = args.symbols * args.bars
+
+        loaders = {
+            "per-symbol": lambda: [
+                db.get_candlesticks_array("binance", s, "1m") for s in symbols
+            ],
+            "single query": lambda: db.get_candlesticks_arrays(
+                "binance", "1m", symbols
+            ),
+        }
+        # Interleaved after a warm-up read, so the page cache favours neither
+        loaders["single query"]()
+        times = {label: [] for label in loaders}
+        for _ in range(args.repeat):
+            for label, loader in loaders.items():
+                times[label].append(timed(loader))
+        for label, elapsed in times.items():
+            print(
+                f"{label}: best {min(elapsed):.3f}s "
+                f"({rows / min(elapsed):.0f} rows/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
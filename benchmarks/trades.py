@@ -0,0 +1,93 @@
+# Bytes per trade, append throughput and range read throughput of the trades
+# table for each trade compression
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ladon.database import TRADE_COMPRESSIONS, SqliteDatabase
+
+# id, ts, px and qty are 8 bytes each once read back
+TRADE_BYTES = 32
+
+
+def trades(count, seed=0):
+    # A busy symbol: prices on a 0.01 tick, lot sized quantities and a few
+    # trades per millisecond at peaks
+    rng = np.random.default_rng(seed)
+    ticks = np.cumsum(rng.choice([-1, 0, 1], count, p=[0.3, 0.4, 0.3]))
+    return {
+        "id": np.arange(1_000_000_000, 1_000_000_000 + count, dtype=np.int64),
+        "ts": 1_700_000_000_000 + np.cumsum(rng.geometric(0.02, count) - 1),
+        "px": np.round(30000 + ticks * 0.01, 2),
+        "qty": np.round(rng.lognormal(-5, 1.5, count), 5) + 0.00001,
+    }
+
+
+def run(filename, data, batch_size, compression, reads):
+    db = SqliteDatabase(filename, ingest=True, trade_compression=compression)
+    count = len(data["id"])
+    start_time = time.perf_counter()
+    with db.bulk():
+        for start in range(0, count, batch_size):
+            db.add_trades(
+                "binance",
+                "BTCUSDT",
+                {
+                    field: column[start : start + batch_size]
+                    for field, column in data.items()
+                },
+            )
+    write = time.perf_counter() - start_time
+    db.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(filename)
+
+    first, last = data["ts"][0] // 1000, data["ts"][-1] // 1000
+    rng = np.random.default_rng(1)
+    start_time = time.perf_counter()
+    read = db.get_trades("binance", "BTCUSDT")
+    full = time.perf_counter() - start_time
+    assert all(np.array_equal(read[field], data[field]) for field in data)
+
+    start_time = time.perf_counter()
+    rows = 0
+    for _ in range(reads):
+        start = int(rng.integers(first, last))
+        rows += len(db.get_trades("binance", "BTCUSDT", start, start + 3600)["id"])
+    ranges = time.perf_counter() - start_time
+    del db
+    return write, size, full, rows, ranges
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trades", type=int, default=10_000_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=100)
+    args = parser.parse_args()
+
+    data = trades(args.trades)
+    hours = (data["ts"][-1] - data["ts"][0]) / 3_600_000
+    print(f"{args.trades} trades over {hours:.1f} hours")
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in TRADE_COMPRESSIONS:
+            write, size, full, rows, ranges = run(
+                os.path.join(directory, f"{compression}.db"),
+                data,
+                args.batch_size,
+                compression,
+                args.reads,
+            )
+            megabytes = args.trades * TRADE_BYTES / 1e6
+            print(
+                f"{compression}: {size / args.trades:.2f} bytes/trade, "
+                f"append {args.trades / write:.0f} trades/s, "
+                f"full read {megabytes / full:.0f} MB/s, "
+                f"1h ranges {rows * TRADE_BYTES / 1e6 / ranges:.0f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 import argparse
 import asyncio
 import logging
+from datetime import datetime, timezone
 
 from .backtest import backtest
-from .fetch import fetch
+from .database import migrate
+from .execution import QUOTE_ASSET, REBALANCE_BAND, trade
+from .fetch import fetch, fetch_trades
+from .forwardtest import forwardtest
+from .rollup import rollup_all, rollup_intervals
+from .sweep import parse_space, sweep
 
 
 def main():
@@ -36,8 +42,73 @@ def main():
     parser_fetch.add_argument(
         "-s", "--symbols", help="symbols to fetch (default: all)", nargs="*"
     )
+    parser_fetch.add_argument(
+        "-c",
+        "--concurrency",
+        help="symbols fetched at once (default: %(default)s)",
+        type=int,
+        default=4,
+    )
+    parser_fetch.add_argument(
+        "--queue-size",
+        help="pages buffered for the database writer (default: %(default)s)",
+        type=int,
+        default=64,
+    )
+    parser_fetch.add_argument(
+        "--raw-data",
+        help="how to keep the raw kline payload (default: %(default)s)",
+        choices=["json", "compact", "none"],
+        default="json",
+    )
+    parser_fetch.add_argument(
+        "--rollup",
+        help="build every coarser interval from the fetched 1m candlesticks",
+        action="store_true",
+    )
+    parser_fetch.add_argument(
+        "--trades",
+        help="fetch aggregate trades instead of candlesticks",
+        action="store_true",
+    )
+    parser_fetch.add_argument(
+        "--since",
+        help="fetch trades from this date when none are stored (ISO date, UTC, "
+        "default: a day ago)",
+        type=timestamp,
+    )
+    parser_fetch.add_argument(
+        "--trade-compression",
+        help="how trade chunks are packed (default: %(default)s)",
+        choices=["zlib", "none"],
+        default="zlib",
+    )
     parser_fetch.set_defaults(func=fetch_main)
 
+    # Rollup subcommand
+    parser_rollup = subparsers.add_parser(
+        "rollup", help="Build coarser intervals from stored 1m candlesticks"
+    )
+    parser_rollup.add_argument(
+        "-p", "--provider", help="historical data provider", required=True
+    )
+    parser_rollup.add_argument(
+        "-i",
+        "--intervals",
+        help="intervals to build (default: all)",
+        nargs="*",
+        choices=rollup_intervals(),
+    )
+    parser_rollup.add_argument(
+        "-s", "--symbols", help="symbols to roll up (default: all)", nargs="*"
+    )
+    parser_rollup.add_argument(
+        "--since",
+        help="also rebuild buckets from this date on (ISO date, UTC)",
+        type=timestamp,
+    )
+    parser_rollup.set_defaults(func=rollup_main)
+
     # Backtest subcommand
     parser_backtest = subparsers.add_parser(
         "backtest", help="Backtest strategy using historical data"
@@ -55,8 +126,72 @@ def main():
     parser_backtest.add_argument(
         "-s", "--symbols", help="symbols to include (default: all)", nargs="*"
     )
+    parser_backtest.add_argument(
+        "--no-cache",
+        help="read candlesticks from the database instead of the local cache",
+        action="store_true",
+    )
+    parser_backtest.add_argument(
+        "-e",
+        "--event-driven",
+        help="feed the strategy bar by bar through on_bar instead of step",
+        action="store_true",
+    )
+    parser_backtest.add_argument(
+        "--verify",
+        help="check that on_bar and step produce the same weights",
+        action="store_true",
+    )
+    parser_backtest.add_argument(
+        "--start", help="first bar to include (ISO date, UTC)", type=timestamp
+    )
+    parser_backtest.add_argument(
+        "--end", help="last bar to include (ISO date, UTC)", type=timestamp
+    )
     parser_backtest.set_defaults(func=backtest_main)
 
+    # Sweep subcommand
+    parser_sweep = subparsers.add_parser(
+        "sweep", help="Backtest strategy over a grid of parameters"
+    )
+    parser_sweep.add_argument(
+        "-p", "--provider", help="Exchange provider name", required=True
+    )
+    parser_sweep.add_argument(
+        "-i",
+        "--interval",
+        help="candlesticks interval (default: %(default)s)",
+        default="1d",
+    )
+    parser_sweep.add_argument("-t", "--strategy", help="strategy to use", required=True)
+    parser_sweep.add_argument(
+        "-s", "--symbols", help="symbols to include (default: all)", nargs="*"
+    )
+    parser_sweep.add_argument(
+        "-g",
+        "--grid",
+        help="parameter values, e.g. fast_length=[10,20] slow_length=[100,200]",
+        nargs="+",
+        required=True,
+    )
+    parser_sweep.add_argument(
+        "-r",
+        "--random",
+        help="sample this many random combinations instead of the full grid",
+        type=int,
+    )
+    parser_sweep.add_argument("--seed", help="random search seed", type=int)
+    parser_sweep.add_argument(
+        "-j", "--jobs", help="worker processes (default: all cores)", type=int
+    )
+    parser_sweep.add_argument(
+        "-o",
+        "--output",
+        help="results file, .csv or .db for SQLite (default: %(default)s)",
+        default="sweep.csv",
+    )
+    parser_sweep.set_defaults(func=sweep_main)
+
     # Forward test subcommand
     parser_forwardtest = subparsers.add_parser(
         "forwardtest", help="Forward test strategy using data provider"
@@ -67,6 +202,27 @@ def main():
     parser_forwardtest.add_argument(
         "-p", "--provider", help="Exchange provider name", required=True
     )
+    parser_forwardtest.add_argument(
+        "-i",
+        "--interval",
+        help="candlesticks interval (default: %(default)s)",
+        default="1m",
+    )
+    parser_forwardtest.add_argument(
+        "--symbols", help="symbols to include (default: all)", nargs="*"
+    )
+    parser_forwardtest.add_argument(
+        "--history",
+        help="bars loaded from the database to warm up (default: %(default)s)",
+        type=int,
+        default=1000,
+    )
+    parser_forwardtest.add_argument(
+        "--fee",
+        help="simulated fee per unit of turnover (default: %(default)s)",
+        type=float,
+        default=0.0,
+    )
     parser_forwardtest.set_defaults(func=forwardtest_main)
 
     # Trade subcommand
@@ -77,8 +233,53 @@ def main():
     parser_trade.add_argument(
         "-p", "--provider", help="Exchange provider name", required=True
     )
+    parser_trade.add_argument(
+        "-i",
+        "--interval",
+        help="candlesticks interval (default: %(default)s)",
+        default="1m",
+    )
+    parser_trade.add_argument(
+        "--symbols",
+        help="symbols to trade, all in one quote asset (default: all in --quote)",
+        nargs="*",
+    )
+    parser_trade.add_argument(
+        "--quote",
+        help="quote asset of the default symbols (default: %(default)s)",
+        default=QUOTE_ASSET,
+    )
+    parser_trade.add_argument(
+        "--history",
+        help="bars loaded from the database to warm up (default: %(default)s)",
+        type=int,
+        default=1000,
+    )
+    parser_trade.add_argument(
+        "--band",
+        help="skip orders below this fraction of equity (default: %(default)s)",
+        type=float,
+        default=REBALANCE_BAND,
+    )
     parser_trade.set_defaults(func=trade_main)
 
+    # Migrate subcommand
+    parser_migrate = subparsers.add_parser(
+        "migrate", help="Upgrade the database to the current schema"
+    )
+    parser_migrate.add_argument(
+        "-d",
+        "--database",
+        help="database file (default: %(default)s)",
+        default="ladon.db",
+    )
+    parser_migrate.add_argument(
+        "--no-vacuum",
+        help="skip reclaiming the space freed by the migration",
+        action="store_true",
+    )
+    parser_migrate.set_defaults(func=migrate_main)
+
     args = parser.parse_args()
     logging.basicConfig(
         level=[logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG][
@@ -91,12 +292,50 @@ def main():
         parser.print_usage()
 
 
+def timestamp(date):
+    date = datetime.fromisoformat(date)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp())
+
+
 def fetch_main(args):
     provider = args.provider
     interval = args.interval
     symbols = list(map(str.upper, args.symbols)) if args.symbols else None
 
-    asyncio.run(fetch(provider, interval, symbols))
+    if args.trades:
+        asyncio.run(
+            fetch_trades(
+                provider,
+                symbols,
+                since=args.since,
+                concurrency=args.concurrency,
+                queue_size=args.queue_size,
+                trade_compression=(
+                    None if args.trade_compression == "none" else args.trade_compression
+                ),
+            )
+        )
+        return
+
+    asyncio.run(
+        fetch(
+            provider,
+            interval,
+            symbols,
+            concurrency=args.concurrency,
+            queue_size=args.queue_size,
+            raw_data=None if args.raw_data == "none" else args.raw_data,
+            build_rollups=args.rollup,
+        )
+    )
+
+
+def rollup_main(args):
+    symbols = list(map(str.upper, args.symbols)) if args.symbols else None
+
+    rollup_all(args.provider, symbols, args.intervals or None, args.since)
 
 
 def backtest_main(args):
@@ -105,15 +344,77 @@ def backtest_main(args):
     strategy = args.strategy
     symbols = list(map(str.upper, args.symbols)) if args.symbols else None
 
-    backtest(provider, interval, strategy, symbols)
+    backtest(
+        provider,
+        interval,
+        strategy,
+        symbols,
+        cache=not args.no_cache,
+        event_driven=args.event_driven,
+        verify=args.verify,
+        start=args.start,
+        end=args.end,
+    )
+
+
+def sweep_main(args):
+    symbols = list(map(str.upper, args.symbols)) if args.symbols else None
+
+    sweep(
+        args.provider,
+        args.interval,
+        args.strategy,
+        parse_space(args.grid),
+        args.output,
+        symbols=symbols,
+        samples=args.random,
+        seed=args.seed,
+        jobs=args.jobs,
+    )
 
 
 def forwardtest_main(args):
-    raise NotImplementedError("Backtesting not implemented yet!")
+    symbols = list(map(str.upper, args.symbols)) if args.symbols else None
+
+    try:
+        asyncio.run(
+            forwardtest(
+                args.provider,
+                args.interval,
+                args.strategy,
+                symbols,
+                history=args.history,
+                fee=args.fee,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
 
 
 def trade_main(args):
-    raise NotImplementedError("Live trading not implemented yet!")
+    symbols = list(map(str.upper, args.symbols)) if args.symbols else None
+
+    try:
+        asyncio.run(
+            trade(
+                args.provider,
+                args.interval,
+                args.strategy,
+                symbols,
+                history=args.history,
+                band=args.band,
+                quote=args.quote.upper(),
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+def migrate_main(args):
+    if migrate(args.database, vacuum=not args.no_vacuum):
+        print(f"Migrated {args.database}")
+    else:
+        print(f"{args.database} is up to date")
 
 
 if __name__ == "__main__":
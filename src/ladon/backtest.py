@@ -1,99 +1,171 @@
 import logging
+import time
 from importlib import import_module
 
 import matplotlib.pyplot as plt
 import numpy as np
 
-from ladon.base import Candlestick
+from ladon import engine, metrics
+from ladon.base import Candlestick, Panel, as_panel
+from ladon.cache import CandleCache
 from ladon.database import SqliteDatabase
 
 logger = logging.getLogger(__name__)
 
 
-def load(symbol, data):
-    candlestick = Candlestick(symbol)
-    for line in data:
-        candlestick.append_candlestick(
-            {
-                "id": line[0] // 1000,
-                "o": float(line[1]),
-                "h": float(line[2]),
-                "l": float(line[3]),
-                "c": float(line[4]),
-                "v": float(line[5]),
-            }
+def load_array(symbol, array):
+    # Same filtering as Candlestick.append_candlestick
+    return Candlestick.from_array(symbol, array[np.all(array[:, 1:] != 0, axis=1)])
+
+
+def symbol_names(database, provider_name, symbols=None):
+    info = database.get_provider_info(provider_name)
+    return [
+        symbol["symbol"]
+        for symbol in info["symbols"]
+        if symbols is None or symbol["symbol"] in symbols
+    ]
+
+
+# Rows of a time sorted array with start <= time <= end
+def time_window(array, start=None, end=None):
+    times = array[:, 0]
+    return array[
+        (0 if start is None else np.searchsorted(times, start)) : (
+            len(array) if end is None else np.searchsorted(times, end, side="right")
         )
-    return candlestick
+    ]
 
 
-def load_all(database, provider_name, period, symbols=None):
+def load_all(database, provider_name, period, symbols=None, start=None, end=None):
     candlesticks = []
 
-    info = database.get_provider_info(provider_name)
-    for symbol in info["symbols"]:
-        if symbols is None or symbol["symbol"] in symbols:
-            candles = database.get_candlesticks(provider_name, symbol["symbol"], period)
-            if len(candles) > 0:
-                candlesticks.append(load(symbol["symbol"], candles))
+    names = symbol_names(database, provider_name, symbols)
+
+    start_time = time.perf_counter()
+    arrays = database.get_candlesticks_arrays(
+        provider_name, period, names, start=start, end=end
+    )
+    elapsed = time.perf_counter() - start_time
+    rows = sum(len(array) for array in arrays.values())
+    logger.info(
+        f"Loaded {rows} candlesticks for {len(arrays)} symbols in {elapsed:.2f}s "
+        f"({rows / max(elapsed, 1e-9):.0f} rows/s)"
+    )
+
+    for name in names:
+        if name in arrays:
+            candlesticks.append(load_array(name, arrays[name]))
 
     return candlesticks
 
 
-def returns(candlesticks, window):
-    closes = np.array(
-        [candle.close(slice(-window - 1, None)) for candle in candlesticks]
+def load_cached(
+    database, cache, provider_name, period, symbols=None, start=None, end=None
+):
+    candlesticks = []
+
+    start_time = time.perf_counter()
+    for name in symbol_names(database, provider_name, symbols):
+        array = time_window(
+            cache.load(database, provider_name, period, name), start, end
+        )
+        if len(array) > 0:
+            candlesticks.append(Candlestick.from_array(name, array, copy=False))
+    logger.info(
+        f"Opened {len(candlesticks)} cached symbols in "
+        f"{time.perf_counter() - start_time:.2f}s"
     )
+
+    return candlesticks
+
+
+def returns(candlesticks, window):
+    closes = as_panel(candlesticks).close(slice(-window - 1, None))
     return np.diff(closes, axis=1) / closes[:, :-1]
 
 
 def shift(arr, num, fill_value=np.nan):
     result = np.empty_like(arr)
     if num > 0:
-        result[:, :num] = fill_value
-        result[:, num:] = arr[:, :-num]
+        result[..., :num] = fill_value
+        result[..., num:] = arr[..., :-num]
     elif num < 0:
-        result[:, num:] = fill_value
-        result[:, :num] = arr[:, -num:]
+        result[..., num:] = fill_value
+        result[..., :num] = arr[..., -num:]
     else:
         result[:] = arr
     return result
 
 
-def load_candlesticks(provider_name, period, symbols=None):
+def load_candlesticks(
+    provider_name, period, symbols=None, cache=True, start=None, end=None
+):
     db = SqliteDatabase()
-    candlesticks = load_all(db, provider_name, period, symbols)
+    if cache:
+        candlesticks = load_cached(
+            db, CandleCache(), provider_name, period, symbols, start, end
+        )
+    else:
+        candlesticks = load_all(db, provider_name, period, symbols, start, end)
     if len(candlesticks) == 0:
         raise Exception(f"No data found for {' '.join(symbols)}")
     return candlesticks
 
 
+# weights may be (symbols, time) or (strategies, symbols, time) to score many
+# weight sets at once
 def calc_returns(candlesticks, weights, window):
     symbols_returns = returns(candlesticks, window)
-    strategy_returns = np.nansum(symbols_returns * shift(weights, 1, 0), axis=0)[1:]
-    cumulative_returns = np.cumprod(1 + strategy_returns) - 1
-    drawdown = 1 - (1 + cumulative_returns) / [
-        np.max(1 + cumulative_returns[: i + 1])
-        for i in range(cumulative_returns.shape[0])
-    ]
+    weighted_returns = symbols_returns * shift(weights, 1, 0)
+    strategy_returns = np.nansum(weighted_returns, axis=-2)[..., 1:]
+    cumulative_returns = metrics.cumulative_returns(strategy_returns)
+    drawdown = metrics.drawdown(strategy_returns)
     return strategy_returns, cumulative_returns, drawdown
 
 
-def backtest(provider_name, period, strategy_name, symbols=None):
+def backtest(
+    provider_name,
+    period,
+    strategy_name,
+    symbols=None,
+    cache=True,
+    event_driven=False,
+    verify=False,
+    start=None,
+    end=None,
+):
     strategy = import_module(f"ladon.strategies.{strategy_name}")
-    candlesticks = load_candlesticks(provider_name, period, symbols)
+    panel = Panel.from_candlesticks(
+        load_candlesticks(provider_name, period, symbols, cache, start, end)
+    )
+
+    window = len(panel.times)
 
-    window = max(len(candle) for candle in candlesticks)
+    if event_driven:
+        weights = engine.run(strategy, panel, window)
+    else:
+        weights = strategy.step(panel, window=window)
 
-    weights = strategy.step(candlesticks, window=window)
+    if verify:
+        matches, max_difference = engine.verify(strategy, panel, window)
+        print(f"Event-driven matches step(): {matches} (max diff {max_difference})")
 
     strategy_returns, cumulative_returns, drawdown = calc_returns(
-        candlesticks, weights, window
+        panel, weights, window
     )
 
-    print(f"Cumulative returns: {cumulative_returns[-1]}")
-    print(f"Sharpe ratio: {np.average(strategy_returns) / np.std(strategy_returns)}")
-    print(f"Ideal leverage: {np.average(strategy_returns) / np.var(strategy_returns)}")
-    print(f"Max drawdown: {np.max(drawdown)}")
+    report = metrics.summary(strategy_returns, period, weights[..., 1:])
+    print(f"Cumulative returns: {report['cumulative_returns']}")
+    print(f"Annualized returns: {report['annualized_returns']}")
+    print(f"Sharpe ratio: {report['sharpe']}")
+    print(f"Sortino ratio: {report['sortino']}")
+    print(f"Calmar ratio: {report['calmar']}")
+    print(f"Ideal leverage: {report['ideal_leverage']}")
+    print(f"Max drawdown: {report['max_drawdown']}")
+    print(f"Max drawdown duration: {report['max_drawdown_duration']} bars")
+    print(f"Turnover: {report['turnover']} per bar")
+    print(f"Exposure: {report['exposure']}")
 
     plt.plot(cumulative_returns)
     plt.plot(drawdown)
@@ -16,45 +16,180 @@ INTERVALS_MAP = {
     "3d": 3 * 24 * 60 * 60,
     "1w": 7 * 24 * 60 * 60,
 }
+# Exchange weekly klines open on Monday, the epoch was a Thursday
+INTERVAL_OFFSETS = {"1w": 4 * 24 * 60 * 60}
+
+
+# Aggregate (time, o, h, l, c, v, v2) rows into `sampling` seconds buckets
+# starting at `offset` past the epoch, forward filling empty buckets with the
+# previous close and zero volume unless fill is False.
+def resample_array(array, sampling, offset=0, fill=True):
+    if len(array) == 0:
+        return np.empty((0, 7))
+
+    buckets = (array[:, 0] - offset) // sampling
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.append(starts[1:], len(array)) - 1
+
+    result = np.empty((len(starts), 7))
+    result[:, 0] = buckets[starts] * sampling + offset
+    result[:, 1] = array[starts, 1]
+    result[:, 2] = np.maximum.reduceat(array[:, 2], starts)
+    result[:, 3] = np.minimum.reduceat(array[:, 3], starts)
+    result[:, 4] = array[ends, 4]
+    result[:, 5:] = np.add.reduceat(array[:, 5:], starts, axis=0)
+
+    index = (buckets[starts] - buckets[0]).astype(np.intp)
+    if not fill or index[-1] + 1 == len(result):
+        return result
+
+    present = np.zeros(index[-1] + 1, dtype=bool)
+    present[index] = True
+    filled = np.empty((len(present), 7))
+    filled[:, 0] = (buckets[0] + np.arange(len(present))) * sampling + offset
+    filled[:, 1:5] = result[np.cumsum(present) - 1, 4:5]
+    filled[:, 5:] = 0
+    filled[index, 1:] = result[:, 1:]
+    return filled
 
 
 class Candlestick(object):
+    INITIAL_CAPACITY = 256
+
     def __init__(self, symbol, sampling=None, max_history=None, init=None):
         self.symbol = symbol
         self.sampling = sampling
-        self.data = {}  # (time, open, high, low, close, volume, quote volume)
-        self.sorted_times = []
         self.max_history = max_history
+        # Columnar storage: an int64 time index plus the np_array rows
+        # (time, open, high, low, close, volume, quote volume) as float64.
+        # With max_history set the columns are a ring buffer where every row is
+        # written twice (at pos and pos + max_history) so the live window is
+        # always a contiguous slice.
+        capacity = self.INITIAL_CAPACITY if max_history is None else 2 * max_history
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty((capacity, 7))
+        self._start = 0
+        self._size = 0
+        # How often np_array got a new row, a row patched in place or a rebuild
+        self.array_stats = {"append": 0, "update": 0, "rebuild": 0}
+        self._resampled = {}
         if init is not None:
             for candle in init:
                 self.append_candlestick(candle)
-        self._array = None
+
+    @classmethod
+    def from_array(cls, symbol, array, sampling=None, max_history=None, copy=True):
+        # array holds (time, o, h, l, c, v, v2) rows sorted by unique time.
+        # Without copy the array (e.g. a memmap) becomes the row storage
+        # until the first append outgrows it; empty arrays are always copied
+        # so appends have capacity to grow from.
+        candlestick = cls(symbol, sampling=sampling, max_history=max_history)
+        if max_history is not None:
+            array = array[-max_history:]
+        if copy or max_history is not None or len(array) == 0:
+            candlestick._reset(array[:, 0].astype(np.int64), array)
+        else:
+            candlestick._times = array[:, 0].astype(np.int64)
+            candlestick._values = array
+            candlestick._size = len(array)
+        return candlestick
 
     def resample(self, sampling):
-        if self.sampling != sampling:
-            self.sampling = sampling
-            self._array = None
+        self.sampling = sampling
 
-    def update_candlestick(self, data):
-        if "v2" not in data:
-            data["v2"] = data["v"] * data["c"]
-        if any(data[i] == 0 for i in ["o", "h", "l", "c", "v", "v2"]):
-            return
+    def _resampled_array(self):
+        array = self._resampled.get(self.sampling)
+        if array is None:
+            array = resample_array(self._values_view(), self.sampling)
+            array.flags.writeable = False
+            self._resampled[self.sampling] = array
+        return array
 
-        if data["id"] in self.data:
-            self.data[data["id"]] = (
-                data["id"],
-                data["o"],
-                data["h"],
-                data["l"],
-                data["c"],
-                data["v"],
-                data["v2"],
-            )
+    def _times_view(self):
+        return self._times[self._start : self._start + self._size]
+
+    def _values_view(self):
+        return self._values[self._start : self._start + self._size]
+
+    def _row(self, i):
+        return (
+            int(self._times[self._start + i]),
+            *self._values[self._start + i, 1:].tolist(),
+        )
+
+    def _write(self, i, time, values):
+        pos = self._start + i
+        if self.max_history is not None:
+            pos %= self.max_history
+            self._times[pos + self.max_history] = time
+            self._values[pos + self.max_history, 0] = time
+            self._values[pos + self.max_history, 1:] = values
+        self._times[pos] = time
+        self._values[pos, 0] = time
+        self._values[pos, 1:] = values
+
+    def _reset(self, times, values):
+        size = len(times)
+        if self.max_history is not None:
+            mirror = slice(self.max_history, self.max_history + size)
+            self._times[:size] = self._times[mirror] = times
+            self._values[:size] = self._values[mirror] = values
+        else:
+            capacity = max(len(self._times), self.INITIAL_CAPACITY)
+            while capacity < size:
+                capacity *= 2
+            if capacity != len(self._times):
+                self._times = np.empty(capacity, dtype=np.int64)
+                self._values = np.empty((capacity, 7))
+            self._times[:size] = times
+            self._values[:size] = values
+        self._start = 0
+        self._size = size
+        self.array_stats["rebuild"] += 1
+
+    def _push(self, time, values):
+        if self.max_history is not None:
+            if self._size == self.max_history:
+                self._start = (self._start + 1) % self.max_history
+            else:
+                self._size += 1
+        else:
+            if self._size == len(self._times):
+                self._times = np.concatenate((self._times, np.empty_like(self._times)))
+                self._values = np.concatenate(
+                    (self._values, np.empty_like(self._values))
+                )
+            self._size += 1
+        self._write(self._size - 1, time, values)
+        self.array_stats["append"] += 1
+
+    def _insert(self, i, time, values):
+        times = np.insert(self._times_view(), i, time)
+        values = np.insert(self._values_view(), i, (time, *values), axis=0)
+        if self.max_history is not None and len(times) > self.max_history:
+            times, values = times[1:], values[1:]
+        self._reset(times, values)
+
+    def _find(self, time):
+        if self._size == 0 or time > self._times[self._start + self._size - 1]:
+            return self._size, False
+        times = self._times_view()
+        i = int(np.searchsorted(times, time))
+        return i, i < self._size and times[i] == time
+
+    def _set(self, time, values):
+        i, exists = self._find(time)
+        if exists:
+            self._write(i, time, values)
+            self.array_stats["update"] += 1
+        elif i == self._size:
+            self._push(time, values)
         else:
-            self.append_candlestick(data)
+            self._insert(i, time, values)
+        self._resampled.clear()
 
-        self._array = None
+    def update_candlestick(self, data):
+        self.append_candlestick(data)
 
     def append_candlestick(self, data):
         if "v2" not in data:
@@ -62,122 +197,107 @@ class Candlestick(object):
         if any(data[i] == 0 for i in ["o", "h", "l", "c", "v", "v2"]):
             return
 
-        if data["id"] not in self.data:
-            self.sorted_times.append(data["id"])
-            if (
-                len(self.sorted_times) > 1
-                and self.sorted_times[-1] < self.sorted_times[-2]
-            ):
-                self.sorted_times.sort()
-
-        self.data[data["id"]] = (
+        self._set(
             data["id"],
-            data["o"],
-            data["h"],
-            data["l"],
-            data["c"],
-            data["v"],
-            data["v2"],
+            (data["o"], data["h"], data["l"], data["c"], data["v"], data["v2"]),
         )
 
-        if self.max_history is not None and len(self.data) > self.max_history:
-            del self.data[self.sorted_times[0]]
-            self.sorted_times.pop(0)
-
-        self._array = None
-
-    def append_trade(self, data):
-        if data["ts"] // 1000 not in self.data:
-            self.sorted_times.append(data["ts"] // 1000)
-            if (
-                len(self.sorted_times) > 1
-                and self.sorted_times[-1] < self.sorted_times[-2]
-            ):
-                self.sorted_times.sort()
-
-        self.data[data["ts"] // 1000] = (
-            data["ts"] // 1000.0,
-            data["px"],
-            data["px"],
-            data["px"],
-            data["px"],
-            data["qty"],
-            data["qty"] * data["px"],
+    def append_trade(self, data, interval="1m"):
+        self.append_trades(
+            np.array([data["ts"]]),
+            np.array([data["px"]]),
+            np.array([data["qty"]]),
+            interval,
         )
 
-        if self.max_history is not None and len(self.data) > self.max_history:
-            del self.data[self.sorted_times[0]]
-            self.sorted_times.pop(0)
+    def append_trades(self, ts, px, qty, interval="1m"):
+        # Fold trades (ts in milliseconds) into `interval` bars. Bars already
+        # held keep their open and take the trades as later ones, so a bar in
+        # progress can be fed batch after batch.
+        if interval not in INTERVALS_MAP:
+            raise ValueError(
+                f"Interval '{interval}' not valid ({', '.join(INTERVALS_MAP.keys())})"
+            )
+        if len(ts) == 0:
+            return
+        ts, px, qty = np.asarray(ts), np.asarray(px, float), np.asarray(qty, float)
+        if np.any(ts[1:] < ts[:-1]):
+            order = np.argsort(ts, kind="stable")
+            ts, px, qty = ts[order], px[order], qty[order]
+
+        sampling = INTERVALS_MAP[interval]
+        offset = INTERVAL_OFFSETS.get(interval, 0)
+        buckets = (ts // 1000 - offset) // sampling
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.append(starts[1:], len(ts)) - 1
 
-        self._array = None
+        times = buckets[starts].astype(np.int64) * sampling + offset
+        bars = np.empty((len(starts), 6))
+        bars[:, 0] = px[starts]
+        bars[:, 1] = np.maximum.reduceat(px, starts)
+        bars[:, 2] = np.minimum.reduceat(px, starts)
+        bars[:, 3] = px[ends]
+        bars[:, 4] = np.add.reduceat(qty, starts)
+        bars[:, 5] = np.add.reduceat(qty * px, starts)
+
+        held = self._times_view()
+        i = np.searchsorted(held, times)
+        exists = i < len(held)
+        exists[exists] = held[i[exists]] == times[exists]
+        if np.any(exists):
+            old = self._values_view()[i[exists], 1:]
+            bars[exists, 0] = old[:, 0]
+            bars[exists, 1] = np.maximum(bars[exists, 1], old[:, 1])
+            bars[exists, 2] = np.minimum(bars[exists, 2], old[:, 2])
+            bars[exists, 4:] += old[:, 4:]
+
+        for time, values in zip(times.tolist(), bars):
+            self._set(time, values)
 
     def __getitem__(self, key):
         if self.sampling is None:
-            keys = self.sorted_times[key]
+            if type(key) == slice:
+                return [self._row(i) for i in range(*key.indices(self._size))]
+            return self._row(range(self._size)[key])
+        else:
+            rows = self._resampled_array()[key]
             return (
-                [self.data[k] for k in keys] if type(keys) == list else self.data[keys]
+                [self._sampled_row(row) for row in rows]
+                if rows.ndim == 2
+                else self._sampled_row(rows)
             )
-        else:
-            return list(iter(self))[key]
 
     def __len__(self):
-        if self.sampling is None or len(self.data) == 0:
-            return len(self.data)
+        if self.sampling is None:
+            return self._size
         else:
-            return (
-                self.sorted_times[-1] // self.sampling
-                - self.sorted_times[0] // self.sampling
-            )
+            return len(self._resampled_array())
+
+    def _iter_rows(self):
+        for time, values in zip(
+            self._times_view().tolist(), self._values_view()[:, 1:].tolist()
+        ):
+            yield (time, *values)
 
     def __iter__(self):
         if self.sampling is None:
-            yield from (self.data[t] for t in self.sorted_times)
+            yield from self._iter_rows()
         else:
-            initial_time = int(self.sorted_times[0] // self.sampling) * self.sampling
-            next_time = initial_time + self.sampling
-            current_candle = list(self.data[self.sorted_times[0]])
-            current_candle[0] = initial_time
-            i = 0
-            while i < len(self.sorted_times) - 1:
-                if (
-                    self.data[self.sorted_times[i + 1]][0] >= next_time
-                    and self.data[self.sorted_times[i + 1]][0]
-                    < next_time + self.sampling
-                ):
-                    yield current_candle
-                    i += 1
-                    current_candle = list(self.data[self.sorted_times[i]])
-                    current_candle[0] = next_time
-                    next_time += self.sampling
-                elif (
-                    self.data[self.sorted_times[i + 1]][0] >= next_time + self.sampling
-                ):
-                    yield current_candle
-                    current_candle[0] = next_time
-                    current_candle[1] = current_candle[4]
-                    current_candle[2] = current_candle[4]
-                    current_candle[3] = current_candle[4]
-                    current_candle[5] = 0
-                    current_candle[6] = 0
-                    next_time += self.sampling
-                else:
-                    i += 1
-                    data = self.data[self.sorted_times[i]]
-                    current_candle[2] = max(current_candle[2], data[2])
-                    current_candle[3] = min(current_candle[3], data[3])
-                    current_candle[4] = data[4]
-                    current_candle[5] += data[5]
-                    current_candle[6] += data[6]
-
-            yield current_candle
+            for row in self._resampled_array():
+                yield self._sampled_row(row)
+
+    @staticmethod
+    def _sampled_row(row):
+        return [int(row[0]), *row[1:].tolist()]
 
     @property
     def np_array(self):
-        if len(self.data) == 0:
-            self._array = np.empty((0, 7))
-        elif self._array is None:
-            self._array = np.array(self)
-        return self._array
+        if self.sampling is None:
+            # Zero-copy view of the row storage, kept up to date by the writers
+            array = self._values_view()
+            array.flags.writeable = False
+            return array
+        return self._resampled_array()
 
     def _nanpadl_slice(self, key, series):
         key = key if type(key) == slice else (slice(None) if key is None else key)
@@ -211,3 +331,83 @@ class Candlestick(object):
 
     def vol2(self, key=None):
         return self._nanpadl_slice(key, 6)
+
+
+class Panel(object):
+    FIELDS = ("open", "high", "low", "close", "vol", "vol2")
+
+    def __init__(self, symbols, times, data, padding=0):
+        self.symbols = symbols
+        self.times = times
+        # (fields, symbols, padding + times) with NaN for missing bars; the
+        # first `padding` columns are all NaN so lookbacks reaching before
+        # the first bar can still be served as views.
+        self._data = data
+        self._padding = padding
+
+    @classmethod
+    def from_candlesticks(cls, candlesticks):
+        arrays = [candle.np_array for candle in candlesticks]
+        times = np.unique(np.concatenate([a[:, 0] for a in arrays] + [[]]))
+        data = np.full((len(cls.FIELDS), len(arrays), len(times)), np.nan)
+        for i, array in enumerate(arrays):
+            data[:, i, np.searchsorted(times, array[:, 0])] = array[:, 1:].T
+        return cls(
+            [candle.symbol for candle in candlesticks], times.astype(np.int64), data
+        )
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def shape(self):
+        return len(self.symbols), len(self.times)
+
+    @property
+    def data(self):
+        return self._data
+
+    @property
+    def padding(self):
+        return self._padding
+
+    def reserve(self, padding):
+        if padding > self._padding:
+            data = np.full(self._data.shape[:2] + (padding + len(self.times),), np.nan)
+            data[:, :, padding:] = self._data[:, :, self._padding :]
+            self._data = data
+            self._padding = padding
+
+    def _field(self, index, key):
+        key = slice(None) if key is None else key
+        padding = 0
+        if type(key) == slice and key.start is not None:
+            padding = max(-key.start - len(self.times), 0)
+            self.reserve(padding)
+        view = self._data[index, :, self._padding - padding :][:, key]
+        view.flags.writeable = False
+        return view
+
+    def open(self, key=None):
+        return self._field(0, key)
+
+    def high(self, key=None):
+        return self._field(1, key)
+
+    def low(self, key=None):
+        return self._field(2, key)
+
+    def close(self, key=None):
+        return self._field(3, key)
+
+    def vol(self, key=None):
+        return self._field(4, key)
+
+    def vol2(self, key=None):
+        return self._field(5, key)
+
+
+def as_panel(candlesticks):
+    if isinstance(candlesticks, Panel):
+        return candlesticks
+    return Panel.from_candlesticks(candlesticks)
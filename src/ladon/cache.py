@@ -0,0 +1,72 @@
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "ladon_cache"
+
+
+# One raw float64 file of (time, o, h, l, c, v, v2) rows per
+# provider/interval/symbol, opened with np.memmap so repeated backtests share
+# the page cache instead of re-reading SQLite.
+class CandleCache(object):
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, provider, interval, symbol):
+        return os.path.join(self.directory, provider, interval, f"{symbol}.bin")
+
+    def _open(self, path):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty((0, 7))
+        return np.memmap(path, dtype=np.float64, mode="c").reshape(-1, 7)
+
+    def _rewrite(self, path, array):
+        # Readers may still map the old file, so never truncate it in place
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        os.replace(path + ".tmp", path)
+
+    def invalidate(self, provider, interval, symbol, since=None):
+        path = self._path(provider, interval, symbol)
+        array = self._open(path)
+        if since is None:
+            if os.path.exists(path):
+                os.remove(path)
+        elif len(array) > 0 and since < array[-1, 0]:
+            self._rewrite(path, array[: np.searchsorted(array[:, 0], since)])
+
+    def load(self, database, provider, interval, symbol):
+        path = self._path(provider, interval, symbol)
+        array = self._open(path)
+        last_time = int(array[-1, 0]) if len(array) > 0 else None
+
+        # The last cached bar may have been in progress, so re-read it as well
+        new = database.get_candlesticks_array(
+            provider, symbol, interval, start=last_time
+        )
+        new = new[np.all(new[:, 1:] != 0, axis=1)]
+        if last_time is None:
+            if len(new) == 0:
+                return array
+            self._rewrite(path, new)
+            logger.debug(f"Cached {len(new)} new candlesticks for {symbol}")
+            return self._open(path)
+
+        # Refetched older rows go through invalidate(), so only the last
+        # cached bar can differ here: patch it in place and append the rest
+        last, new = new[new[:, 0] == last_time], new[new[:, 0] > last_time]
+        patch = len(last) > 0 and not np.array_equal(last[0], array[-1])
+        if not patch and len(new) == 0:
+            return array
+        with open(path, "r+b") as f:
+            if patch:
+                f.seek((len(array) - 1) * last.nbytes)
+                f.write(last.tobytes())
+            f.seek(0, os.SEEK_END)
+            f.write(new.tobytes())
+        logger.debug(f"Cached {len(new)} new candlesticks for {symbol}")
+        return self._open(path)
@@ -1,35 +1,366 @@
+import asyncio
 import json
+import logging
+import queue
 import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# How the raw provider payload is kept in the data column: as is ("json"),
+# without whitespace ("compact") or not at all (None, stored as JSON null).
+RAW_DATA_FORMATS = ("json", "compact", None)
+
+# How trade segments are packed: zlib compressed or raw
+TRADE_COMPRESSIONS = ("zlib", None)
+# Seconds of a symbol's trades stored per row
+TRADE_CHUNK = 3600
+
+INGEST_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # 256 MiB
+    "PRAGMA mmap_size=1073741824",  # 1 GiB
+)
+
+# Bumped (and given a step in MIGRATIONS) on every schema change; stored in
+# PRAGMA user_version. Version 0 is the original name keyed layout.
+SCHEMA_VERSION = 3
+
+# Tables added by each schema version, SCHEMA is their concatenation
+SCHEMA_V1 = (
+    "CREATE TABLE providers ("
+    "id INTEGER PRIMARY KEY,"
+    "name TEXT UNIQUE NOT NULL,"
+    "info JSON NOT NULL)",
+    "CREATE TABLE symbols ("
+    "id INTEGER PRIMARY KEY,"
+    "provider_id INTEGER NOT NULL REFERENCES providers(id),"
+    "name TEXT NOT NULL,"
+    "UNIQUE (provider_id, name))",
+    # Clustered on the columns every query filters on, so a symbol's history
+    # is one contiguous range read in timestamp order
+    "CREATE TABLE candlesticks ("
+    "provider_id INTEGER NOT NULL REFERENCES providers(id),"
+    "interval TEXT NOT NULL,"
+    "symbol_id INTEGER NOT NULL REFERENCES symbols(id),"
+    "timestamp INTEGER NOT NULL,"
+    "open REAL NOT NULL,"
+    "high REAL NOT NULL,"
+    "low REAL NOT NULL,"
+    "close REAL NOT NULL,"
+    "volume REAL NOT NULL,"
+    "quote_volume REAL,"
+    "data JSON NOT NULL,"
+    "PRIMARY KEY (provider_id, interval, symbol_id, timestamp)"
+    ") WITHOUT ROWID",
+)
+
+SCHEMA_V2 = (
+    # Every gap before scanned_until has already been refetched once, so gap
+    # scans can resume from there
+    "CREATE TABLE coverage ("
+    "provider_id INTEGER NOT NULL REFERENCES providers(id),"
+    "interval TEXT NOT NULL,"
+    "symbol_id INTEGER NOT NULL REFERENCES symbols(id),"
+    "scanned_until INTEGER NOT NULL,"
+    "PRIMARY KEY (provider_id, interval, symbol_id)"
+    ") WITHOUT ROWID",
+)
+
+SCHEMA_V3 = (
+    # A symbol's trades in TRADE_CHUNK seconds chunks (chunk is the start),
+    # each one or more segments of consecutive trades with the id, ts, px
+    # and qty columns packed into data. A rowid table since WITHOUT ROWID
+    # only suits small rows.
+    "CREATE TABLE trades ("
+    "provider_id INTEGER NOT NULL REFERENCES providers(id),"
+    "symbol_id INTEGER NOT NULL REFERENCES symbols(id),"
+    "chunk INTEGER NOT NULL,"
+    "first_id INTEGER NOT NULL,"
+    "last_id INTEGER NOT NULL,"
+    "count INTEGER NOT NULL,"
+    "compression TEXT,"
+    "data BLOB NOT NULL,"
+    "UNIQUE (provider_id, symbol_id, chunk, first_id))",
+)
+
+SCHEMA = SCHEMA_V1 + SCHEMA_V2 + SCHEMA_V3
+
+
+SYMBOL_FILTER = (
+    "provider_id=:provider_id AND interval=:interval AND symbol_id=:symbol_id"
+)
+TRADE_FILTER = "provider_id=:provider_id AND symbol_id=:symbol_id"
+
+
+def _time_range(start, end):
+    where = ""
+    if start is not None:
+        where += " AND timestamp >= :start"
+    if end is not None:
+        where += " AND timestamp <= :end"
+    return where
+
+
+def _pack_trades(trades, compression):
+    # The four columns back to back as 8 byte values, ids and timestamps as
+    # deltas. Tick sized prices and lot sized quantities repeat often enough
+    # that fast zlib gets about 6 bytes per trade.
+    columns = np.empty((4, len(trades["id"])), dtype=np.int64)
+    columns[0] = np.diff(trades["id"], prepend=0)
+    columns[1] = np.diff(trades["ts"], prepend=0)
+    columns[2] = np.asarray(trades["px"], dtype=np.float64).view(np.int64)
+    columns[3] = np.asarray(trades["qty"], dtype=np.float64).view(np.int64)
+    if compression is None:
+        return columns.tobytes()
+    return zlib.compress(columns.tobytes(), 1)
+
+
+def _unpack_trades(data, count, compression):
+    if compression is not None:
+        data = zlib.decompress(data)
+    columns = np.frombuffer(data, dtype=np.int64).reshape(4, count)
+    return {
+        "id": np.cumsum(columns[0]),
+        "ts": np.cumsum(columns[1]),
+        "px": columns[2].view(np.float64),
+        "qty": columns[3].view(np.float64),
+    }
+
+
+def concat_trades(parts):
+    # Join id, ts, px and qty arrays, empty ones if there are no parts
+    if len(parts) == 0:
+        return {
+            "id": np.empty(0, dtype=np.int64),
+            "ts": np.empty(0, dtype=np.int64),
+            "px": np.empty(0),
+            "qty": np.empty(0),
+        }
+    return {
+        field: np.concatenate([part[field] for part in parts]) for field in parts[0]
+    }
+
+
+class SchemaError(Exception):
+    pass
+
+
+def _migrate_names_to_ids(c):
+    c.execute("DROP INDEX IF EXISTS candlestick_timestamp_idx")
+    c.execute("ALTER TABLE candlesticks RENAME TO candlesticks_v0")
+    c.execute("ALTER TABLE providers RENAME TO providers_v0")
+    for statement in SCHEMA_V1:
+        c.execute(statement)
+    c.execute("INSERT INTO providers (name, info) SELECT name, info FROM providers_v0")
+    c.execute(
+        "INSERT OR IGNORE INTO providers (name, info) "
+        "SELECT DISTINCT provider, '{}' FROM candlesticks_v0"
+    )
+    c.execute(
+        "INSERT INTO symbols (provider_id, name) "
+        "SELECT DISTINCT p.id, c.symbol FROM candlesticks_v0 c "
+        "JOIN providers p ON p.name = c.provider ORDER BY p.id, c.symbol"
+    )
+    c.execute(
+        "INSERT INTO candlesticks "
+        "SELECT p.id, c.interval, s.id, c.timestamp, c.open, c.high, c.low, "
+        "c.close, c.volume, c.quote_volume, c.data FROM candlesticks_v0 c "
+        "JOIN providers p ON p.name = c.provider "
+        "JOIN symbols s ON s.provider_id = p.id AND s.name = c.symbol "
+        "ORDER BY p.id, c.interval, s.id, c.timestamp"
+    )
+    c.execute("DROP TABLE candlesticks_v0")
+    c.execute("DROP TABLE providers_v0")
+
+
+def _add_coverage(c):
+    for statement in SCHEMA_V2:
+        c.execute(statement)
+
+
+def _add_trades(c):
+    for statement in SCHEMA_V3:
+        c.execute(statement)
+
+
+# MIGRATIONS[n] upgrades a version n database to version n + 1
+MIGRATIONS = [_migrate_names_to_ids, _add_coverage, _add_trades]
+
+
+def schema_version(connection):
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0:
+        tables = connection.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type='table'"
+        ).fetchone()[0]
+        if tables == 0:
+            return None
+    return version
+
+
+def migrate(filename="ladon.db", vacuum=True):
+    connection = sqlite3.connect(filename, isolation_level=None)
+    try:
+        version = schema_version(connection)
+        if version is None or version == SCHEMA_VERSION:
+            return False
+        if version > SCHEMA_VERSION:
+            raise SchemaError(
+                f"{filename} has schema version {version}, newer than "
+                f"supported version {SCHEMA_VERSION}"
+            )
+        c = connection.cursor()
+        c.execute("BEGIN")
+        try:
+            for step in range(version, SCHEMA_VERSION):
+                logger.info(f"Migrating {filename} to schema version {step + 1}")
+                MIGRATIONS[step](c)
+            c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+        if vacuum:
+            c.execute("VACUUM")
+        return True
+    finally:
+        connection.close()
 
 
 class SqliteDatabase(object):
-    def __init__(self, filename="ladon.db"):
+    def __init__(
+        self,
+        filename="ladon.db",
+        ingest=False,
+        raw_data="json",
+        trade_compression="zlib",
+    ):
+        if raw_data not in RAW_DATA_FORMATS:
+            raise ValueError(f"Unknown raw data format {raw_data!r}")
+        if trade_compression not in TRADE_COMPRESSIONS:
+            raise ValueError(f"Unknown trade compression {trade_compression!r}")
+        self.raw_data = raw_data
+        self.trade_compression = trade_compression
+        self._bulk = 0
         self.connection = sqlite3.connect(filename)
+        self._ids = {}
         c = self.connection.cursor()
-        c.execute(
-            "CREATE TABLE IF NOT EXISTS providers ("
-            "name TEXT UNIQUE NOT NULL,"
-            "info JSON NOT NULL)"
-        )
-        c.execute(
-            "CREATE TABLE IF NOT EXISTS candlesticks ("
-            "timestamp INTEGER NOT NULL,"
-            "symbol TEXT NOT NULL,"
-            "interval TEXT NOT NULL,"
-            "provider TEXT NOT NULL REFERENCES providers(name),"
-            "open REAL NOT NULL,"
-            "high REAL NOT NULL,"
-            "low REAL NOT NULL,"
-            "close REAL NOT NULL,"
-            "volume REAL NOT NULL,"
-            "quote_volume REAL,"
-            "data JSON NOT NULL,"
-            "PRIMARY KEY (timestamp, symbol, interval, provider))"
-        )
-        c.execute(
-            "CREATE INDEX IF NOT EXISTS candlestick_timestamp_idx "
-            "ON candlesticks (timestamp)"
-        )
+        if ingest:
+            for pragma in INGEST_PRAGMAS:
+                c.execute(pragma)
+
+        version = schema_version(self.connection)
+        if version is None:
+            for statement in SCHEMA:
+                c.execute(statement)
+            c.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self.connection.commit()
+        elif version != SCHEMA_VERSION:
+            self.connection.close()
+            raise SchemaError(
+                f"{filename} has schema version {version}, expected "
+                f"{SCHEMA_VERSION}; run `ladon migrate` to upgrade it"
+            )
+
+    @contextmanager
+    def bulk(self):
+        # Group writes into one transaction; commits inside are deferred to
+        # the outermost bulk() and everything is rolled back on error.
+        self._bulk += 1
+        try:
+            yield self
+        except BaseException:
+            self._bulk -= 1
+            if self._bulk == 0:
+                self.connection.rollback()
+                self._ids.clear()
+            raise
+        self._bulk -= 1
+        if self._bulk == 0:
+            self.connection.commit()
+
+    def _commit(self):
+        if self._bulk == 0:
+            self.connection.commit()
+
+    def _provider_id(self, name, create=False):
+        key = (name,)
+        if key not in self._ids:
+            c = self.connection.cursor()
+            if create:
+                c.execute(
+                    "INSERT INTO providers (name, info) VALUES (:name, '{}') "
+                    "ON CONFLICT (name) DO NOTHING",
+                    {"name": name},
+                )
+            c.execute("SELECT id from providers where name=:name", {"name": name})
+            row = c.fetchone()
+            if row is None:
+                return None
+            self._ids[key] = row[0]
+        return self._ids[key]
+
+    def _symbol_id(self, provider_id, name, create=False):
+        key = (provider_id, name)
+        if key not in self._ids:
+            c = self.connection.cursor()
+            params = {"provider_id": provider_id, "name": name}
+            if create:
+                c.execute(
+                    "INSERT INTO symbols (provider_id, name) "
+                    "VALUES (:provider_id, :name) "
+                    "ON CONFLICT (provider_id, name) DO NOTHING",
+                    params,
+                )
+            c.execute(
+                "SELECT id from symbols where provider_id=:provider_id AND name=:name",
+                params,
+            )
+            row = c.fetchone()
+            if row is None:
+                return None
+            self._ids[key] = row[0]
+        return self._ids[key]
+
+    def _key(self, provider, symbol, interval, create=False):
+        # Query parameters identifying a symbol's candlesticks, None if the
+        # provider or symbol was never stored
+        provider_id = self._provider_id(provider, create)
+        if provider_id is None:
+            return None
+        symbol_id = self._symbol_id(provider_id, symbol, create)
+        if symbol_id is None:
+            return None
+        return {
+            "provider_id": provider_id,
+            "interval": interval,
+            "symbol_id": symbol_id,
+        }
+
+    def _dumps(self, data):
+        if self.raw_data is None:
+            return "null"
+        if self.raw_data == "compact":
+            return json.dumps(data, separators=(",", ":"))
+        return json.dumps(data)
+
+    @staticmethod
+    def _loads(row):
+        # Rows stored without raw data fall back to a kline shaped list built
+        # from the typed columns: [open time (ms), o, h, l, c, v, None, qv]
+        data = json.loads(row[0])
+        if data is None:
+            timestamp, o, h, l, c, v, qv = row[1:]
+            data = [timestamp * 1000, o, h, l, c, v, None, qv]
+        return data
 
     def get_provider_info(self, name):
         c = self.connection.cursor()
@@ -40,87 +371,87 @@ class SqliteDatabase(object):
     def set_provider_info(self, name, info):
         c = self.connection.cursor()
         c.execute(
-            "INSERT OR REPLACE INTO providers VALUES (:name, :info)",
+            "INSERT INTO providers (name, info) VALUES (:name, :info) "
+            "ON CONFLICT (name) DO UPDATE SET info=excluded.info",
             {"name": name, "info": json.dumps(info)},
         )
-        self.connection.commit()
+        self._commit()
 
     def add_candlestick(
         self, provider, symbol, interval, timestamp, o, h, l, c, v, qv, data
     ):
+        key = self._key(provider, symbol, interval, create=True)
         c = self.connection.cursor()
         c.execute(
             "INSERT OR REPLACE INTO candlesticks VALUES "
-            "(:timestamp, :symbol, :interval, :provider, "
+            "(:provider_id, :interval, :symbol_id, :timestamp, "
             ":open, :high, :low, :close, :volume, :quote_volume, :data)",
             {
+                **key,
                 "timestamp": timestamp,
-                "symbol": symbol,
-                "interval": interval,
-                "provider": provider,
                 "open": o,
                 "high": h,
                 "low": l,
                 "close": c,
                 "volume": v,
                 "quote_volume": qv,
-                "data": json.dumps(data),
+                "data": self._dumps(data),
             },
         )
-        self.connection.commit()
+        self._commit()
 
     def add_candlesticks(self, provider, symbol, interval, timestamped_data):
+        key = self._key(provider, symbol, interval, create=True)
         values = [
             {
+                **key,
                 "timestamp": timestamp,
-                "symbol": symbol,
-                "interval": interval,
-                "provider": provider,
                 "open": o,
                 "high": h,
                 "low": l,
                 "close": c,
                 "volume": v,
                 "quote_volume": qv,
-                "data": json.dumps(data),
+                "data": self._dumps(data),
             }
             for timestamp, (o, h, l, c, v, qv, data) in timestamped_data.items()
         ]
         c = self.connection.cursor()
         c.executemany(
             "INSERT OR REPLACE INTO candlesticks VALUES "
-            "(:timestamp, :symbol, :interval, :provider, "
+            "(:provider_id, :interval, :symbol_id, :timestamp, "
             ":open, :high, :low, :close, :volume, :quote_volume, :data)",
             values,
         )
-        self.connection.commit()
+        self._commit()
 
     def get_candlestick(self, provider, symbol, interval, timestamp=None, extract=None):
-        col_spec = "data" if extract is None else f"json_extract(data, '{extract}')"
+        col_spec = (
+            "data, timestamp, open, high, low, close, volume, quote_volume"
+            if extract is None
+            else f"json_extract(data, '{extract}')"
+        )
+
+        key = self._key(provider, symbol, interval)
+        if key is None:
+            return None
 
         c = self.connection.cursor()
         if timestamp is not None:
             c.execute(
-                f"SELECT {col_spec} from candlesticks where "
-                "timestamp=:timestamp AND symbol=:symbol AND "
-                "interval=:interval AND provider=:provider",
-                {
-                    "timestamp": timestamp,
-                    "symbol": symbol,
-                    "interval": interval,
-                    "provider": provider,
-                },
+                f"SELECT {col_spec} from candlesticks where {SYMBOL_FILTER} "
+                "AND timestamp=:timestamp",
+                {**key, "timestamp": timestamp},
             )
         else:
             c.execute(
-                f"SELECT {col_spec} from candlesticks where "
-                "symbol=:symbol AND interval=:interval AND provider=:provider "
+                f"SELECT {col_spec} from candlesticks where {SYMBOL_FILTER} "
                 "ORDER BY timestamp DESC LIMIT 1",
-                {"symbol": symbol, "interval": interval, "provider": provider},
+                key,
             )
         result = c.fetchone()
         return (
-            (json.loads(result[0]) if extract is None else result[0])
+            (self._loads(result) if extract is None else result[0])
             if result is not None
             else None
         )
@@ -128,31 +459,363 @@ class SqliteDatabase(object):
     def get_candlesticks(
         self, provider, symbol, interval, start=None, end=None, extract=None
     ):
-        col_spec = "data" if extract is None else f"json_extract(data, '{extract}')"
-        interval_filter = []
-        if start:
-            interval_filter.push("interval >= :start")
-        if end:
-            interval_filter.push("interval <= :end")
-        interval_filter = (
-            ("AND " + " AND ".join(interval_filter)) if len(interval_filter) > 0 else ""
+        col_spec = (
+            "data, timestamp, open, high, low, close, volume, quote_volume"
+            if extract is None
+            else f"json_extract(data, '{extract}')"
+        )
+        key = self._key(provider, symbol, interval)
+        if key is None:
+            return []
+
+        c = self.connection.cursor()
+        c.execute(
+            f"SELECT {col_spec} from candlesticks where {SYMBOL_FILTER}"
+            f"{_time_range(start, end)} ORDER BY timestamp",
+            {**key, "start": start, "end": end},
         )
+        result = c.fetchall()
+        return [(self._loads(r) if extract is None else r[0]) for r in result]
+
+    def iter_candlesticks(
+        self, provider, symbol, interval, start=None, end=None, chunk_size=65536
+    ):
+        # Yields (time, o, h, l, c, v, v2) arrays of at most chunk_size rows
+        key = self._key(provider, symbol, interval)
+        if key is None:
+            return
 
         c = self.connection.cursor()
         c.execute(
-            f"SELECT {col_spec} from candlesticks where "
-            "symbol=:symbol AND interval=:interval AND "
-            f"provider=:provider {interval_filter} ORDER BY TIMESTAMP",
+            "SELECT timestamp, open, high, low, close, volume, "
+            "COALESCE(quote_volume, volume * close) from candlesticks "
+            f"where {SYMBOL_FILTER}{_time_range(start, end)} ORDER BY timestamp",
+            {**key, "start": start, "end": end},
+        )
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if len(rows) == 0:
+                break
+            yield np.array(rows, dtype=np.float64)
+
+    def get_timestamps(self, provider, symbol, interval, start=None, end=None):
+        key = self._key(provider, symbol, interval)
+        if key is None:
+            return np.empty(0, dtype=np.int64)
+
+        c = self.connection.cursor()
+        c.execute(
+            f"SELECT timestamp from candlesticks where {SYMBOL_FILTER}"
+            f"{_time_range(start, end)} ORDER BY timestamp",
+            {**key, "start": start, "end": end},
+        )
+        return np.fromiter((t for t, in c), dtype=np.int64)
+
+    def get_coverage(self, provider, symbol, interval):
+        key = self._key(provider, symbol, interval)
+        if key is None:
+            return None
+
+        c = self.connection.cursor()
+        c.execute(f"SELECT scanned_until from coverage where {SYMBOL_FILTER}", key)
+        result = c.fetchone()
+        return result[0] if result is not None else None
+
+    def set_coverage(self, provider, symbol, interval, scanned_until):
+        c = self.connection.cursor()
+        c.execute(
+            "INSERT OR REPLACE INTO coverage VALUES "
+            "(:provider_id, :interval, :symbol_id, :scanned_until)",
             {
-                "start": start,
+                **self._key(provider, symbol, interval, create=True),
+                "scanned_until": scanned_until,
+            },
+        )
+        self._commit()
+
+    def add_trades(self, provider, symbol, trades):
+        # trades maps id, ts (ms), px and qty to arrays. Trades newer than a
+        # chunk's last stored id are appended as a new segment; anything else
+        # merges the chunk into a single segment, keeping one trade per id.
+        if len(trades["id"]) == 0:
+            return
+        if np.any(np.diff(trades["id"]) < 0):
+            order = np.argsort(trades["id"], kind="stable")
+            trades = {field: column[order] for field, column in trades.items()}
+        key = self._key(provider, symbol, None, create=True)
+        chunks = trades["ts"] // 1000 // TRADE_CHUNK * TRADE_CHUNK
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(chunks)) + 1))
+        ends = np.append(starts[1:], len(chunks))
+
+        c = self.connection.cursor()
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            chunk = int(chunks[start])
+            part = {field: column[start:end] for field, column in trades.items()}
+            params = {**key, "chunk": chunk}
+            c.execute(
+                f"SELECT MAX(last_id) from trades where {TRADE_FILTER} "
+                "AND chunk=:chunk",
+                params,
+            )
+            last_id = c.fetchone()[0]
+            if last_id is not None and part["id"][0] <= last_id:
+                c.execute(
+                    f"SELECT count, compression, data from trades where "
+                    f"{TRADE_FILTER} AND chunk=:chunk ORDER BY first_id",
+                    params,
+                )
+                part = concat_trades(
+                    [_unpack_trades(data, n, compression) for n, compression, data in c]
+                    + [part]
+                )
+                _, index = np.unique(part["id"], return_index=True)
+                part = {field: column[index] for field, column in part.items()}
+                c.execute(
+                    f"DELETE from trades where {TRADE_FILTER} AND chunk=:chunk",
+                    params,
+                )
+            c.execute(
+                "INSERT INTO trades VALUES (:provider_id, :symbol_id, :chunk, "
+                ":first_id, :last_id, :count, :compression, :data)",
+                {
+                    **params,
+                    "first_id": int(part["id"][0]),
+                    "last_id": int(part["id"][-1]),
+                    "count": len(part["id"]),
+                    "compression": self.trade_compression,
+                    "data": _pack_trades(part, self.trade_compression),
+                },
+            )
+        self._commit()
+
+    def get_trades(self, provider, symbol, start=None, end=None):
+        # Trades with start <= ts // 1000 <= end as id, ts, px and qty arrays
+        key = self._key(provider, symbol, None)
+        if key is None:
+            return concat_trades([])
+        where = TRADE_FILTER
+        if start is not None:
+            where += " AND chunk >= :first_chunk"
+        if end is not None:
+            where += " AND chunk <= :end"
+
+        c = self.connection.cursor()
+        c.execute(
+            f"SELECT count, compression, data from trades where {where} "
+            "ORDER BY chunk, first_id",
+            {
+                **key,
+                "first_chunk": (
+                    None if start is None else start // TRADE_CHUNK * TRADE_CHUNK
+                ),
                 "end": end,
-                "symbol": symbol,
-                "interval": interval,
-                "provider": provider,
             },
         )
-        result = c.fetchall()
-        return [(json.loads(r[0]) if extract is None else r[0]) for r in result]
+        trades = concat_trades(
+            [_unpack_trades(data, count, compression) for count, compression, data in c]
+        )
+        seconds = trades["ts"] // 1000
+        first = 0 if start is None else np.searchsorted(seconds, start)
+        last = len(seconds) if end is None else np.searchsorted(seconds, end, "right")
+        return {field: column[first:last] for field, column in trades.items()}
+
+    def get_last_trade_id(self, provider, symbol):
+        key = self._key(provider, symbol, None)
+        if key is None:
+            return None
+
+        c = self.connection.cursor()
+        c.execute(
+            f"SELECT last_id from trades where {TRADE_FILTER} "
+            "ORDER BY chunk DESC, first_id DESC LIMIT 1",
+            key,
+        )
+        result = c.fetchone()
+        return result[0] if result is not None else None
+
+    def get_candlesticks_array(
+        self, provider, symbol, interval, start=None, end=None, chunk_size=65536
+    ):
+        key = self._key(provider, symbol, interval)
+        if key is None:
+            return np.empty((0, 7))
+        params = {**key, "start": start, "end": end}
+        where = SYMBOL_FILTER + _time_range(start, end)
+
+        c = self.connection.cursor()
+        c.execute(f"SELECT COUNT(*) from candlesticks where {where}", params)
+        array = np.empty((c.fetchone()[0], 7))
+
+        c.execute(
+            "SELECT timestamp, open, high, low, close, volume, "
+            "COALESCE(quote_volume, volume * close) from candlesticks "
+            f"where {where} ORDER BY timestamp",
+            params,
+        )
+        size = 0
+        while True:
+            rows = c.fetchmany(chunk_size)
+            if len(rows) == 0:
+                break
+            if size + len(rows) > len(array):
+                array = np.concatenate((array, np.empty((len(rows), 7))))
+            array[size : size + len(rows)] = rows
+            size += len(rows)
+        return array[:size]
+
+    def get_candlesticks_arrays(
+        self, provider, interval, symbols=None, start=None, end=None
+    ):
+        provider_id = self._provider_id(provider)
+        if provider_id is None:
+            return {}
+        params = {
+            "provider_id": provider_id,
+            "interval": interval,
+            "start": start,
+            "end": end,
+        }
+        where = "provider_id=:provider_id AND interval=:interval"
+        if symbols is not None:
+            ids = [self._symbol_id(provider_id, symbol) for symbol in symbols]
+            ids = [i for i in ids if i is not None]
+            params.update({f"symbol{i}": symbol_id for i, symbol_id in enumerate(ids)})
+            where += " AND symbol_id IN ({})".format(
+                ", ".join(f":symbol{i}" for i in range(len(ids)))
+            )
+        where += _time_range(start, end)
+
+        # The count only sizes the arrays. Rows are grouped by the symbol_id
+        # read along with them, so bars committed by a concurrent writer in
+        # between can never end up under the wrong symbol.
+        c = self.connection.cursor()
+        c.execute(f"SELECT COUNT(*) from candlesticks where {where}", params)
+        capacity = c.fetchone()[0]
+        ids = np.empty(capacity, dtype=np.int64)
+        array = np.empty((capacity, 7))
+
+        c.execute(
+            "SELECT symbol_id, timestamp, open, high, low, close, volume, "
+            "COALESCE(quote_volume, volume * close) from candlesticks "
+            f"where {where} ORDER BY symbol_id, timestamp",
+            params,
+        )
+        size = 0
+        while True:
+            # Small batches keep the row tuples in cache
+            rows = c.fetchmany(4096)
+            if len(rows) == 0:
+                break
+            if size + len(rows) > len(array):
+                ids = np.concatenate((ids, np.empty(len(rows), dtype=np.int64)))
+                array = np.concatenate((array, np.empty((len(rows), 7))))
+            rows = np.array(rows)
+            ids[size : size + len(rows)] = rows[:, 0]
+            array[size : size + len(rows)] = rows[:, 1:]
+            size += len(rows)
+        if size == 0:
+            return {}
+        ids, array = ids[:size], array[:size]
+
+        c.execute(
+            "SELECT id, name from symbols where provider_id=:provider_id",
+            {"provider_id": provider_id},
+        )
+        names = dict(c.fetchall())
+        starts = np.flatnonzero(np.diff(ids)) + 1
+        return {
+            names[symbol_id]: part
+            for symbol_id, part in zip(
+                ids[np.append(0, starts)].tolist(), np.split(array, starts)
+            )
+        }
 
     def __del__(self):
         self.connection.close()
+
+
+class DatabaseWriter(threading.Thread):
+    # Owns its own connection and commits queued add_candlesticks and
+    # add_trades calls in batches of about `batch_rows` rows. The bounded
+    # queue makes producers wait instead of piling pages up in memory.
+    def __init__(
+        self,
+        filename="ladon.db",
+        queue_size=64,
+        batch_rows=100000,
+        raw_data="json",
+        trade_compression="zlib",
+    ):
+        super().__init__(daemon=True)
+        self.filename = filename
+        self.raw_data = raw_data
+        self.trade_compression = trade_compression
+        self.batch_rows = batch_rows
+        self.queue = queue.Queue(queue_size)
+        self.callbacks = []
+        self.error = None
+
+    async def put(self, provider, symbol, interval, timestamped_data):
+        if self.error is not None:
+            raise self.error
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.queue.put, (provider, symbol, interval, timestamped_data)
+        )
+
+    async def put_trades(self, provider, symbol, trades):
+        # Queued without an interval, which marks them as trades
+        await self.put(provider, symbol, None, trades)
+
+    def on_commit(self, callback):
+        # callback(provider, symbol, interval, first_timestamp) once committed
+        self.callbacks.append(callback)
+
+    @staticmethod
+    def _rows(item):
+        return len(item[3]) if item[2] is not None else len(item[3]["id"])
+
+    def _flush(self, database, pending):
+        with database.bulk():
+            for provider, symbol, interval, data in pending:
+                if interval is None:
+                    database.add_trades(provider, symbol, data)
+                else:
+                    database.add_candlesticks(provider, symbol, interval, data)
+        for provider, symbol, interval, data in pending:
+            if interval is None:
+                continue
+            for callback in self.callbacks:
+                callback(provider, symbol, interval, min(data))
+
+    def run(self):
+        database = SqliteDatabase(
+            self.filename,
+            ingest=True,
+            raw_data=self.raw_data,
+            trade_compression=self.trade_compression,
+        )
+        pending = []
+        rows = 0
+        while True:
+            item = self.queue.get()
+            if item is not None and self._rows(item) > 0:
+                pending.append(item)
+                rows += self._rows(item)
+            if self.error is None and (
+                item is None or rows >= self.batch_rows or self.queue.empty()
+            ):
+                try:
+                    self._flush(database, pending)
+                except Exception as e:
+                    logger.exception("Database writer failed")
+                    self.error = e
+                pending = []
+                rows = 0
+            if item is None:
+                break
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.queue.put, None)
+        await asyncio.get_running_loop().run_in_executor(None, self.join)
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,63 @@
+# Event-driven runner for strategies implementing the incremental contract:
+#   state = strategy.init_state(symbols, **params)
+#   weights = strategy.on_bar(state, bar)
+# where bar is a (len(Panel.FIELDS), symbols) array for one timestamp.
+# Strategies with indicators may split on_bar into
+#   strategy.update_indicators(state, bar)
+#   weights = strategy.target_weights(state)
+# so the two stages can be timed separately.
+import logging
+
+import numpy as np
+
+from ladon.base import as_panel
+
+logger = logging.getLogger(__name__)
+
+
+def supports(strategy):
+    return hasattr(strategy, "init_state") and hasattr(strategy, "on_bar")
+
+
+def run(strategy, candlesticks, window=None, **params):
+    panel = as_panel(candlesticks)
+    length = len(panel.times)
+    if window is None:
+        window = length
+
+    state = strategy.init_state(panel.symbols, **params)
+    data = panel.data[:, :, panel.padding :]
+    weights = np.empty((len(panel), window))
+    # Bars before the first timestamp are all NaN, like the batch padding
+    missing = np.full(data.shape[:2], np.nan)
+    for i in range(min(0, length - window), length):
+        bar_weights = strategy.on_bar(state, data[:, :, i] if i >= 0 else missing)
+        if i >= length - window:
+            weights[:, i - length + window] = bar_weights
+    return weights
+
+
+def replay(strategy, state, candlesticks):
+    # Feed every bar of candlesticks into an existing state, e.g. to warm it
+    # up from history, returning the last weights
+    panel = as_panel(candlesticks)
+    data = panel.data[:, :, panel.padding :]
+    weights = np.zeros(len(panel))
+    for i in range(data.shape[2]):
+        weights = strategy.on_bar(state, data[:, :, i])
+    return weights
+
+
+def verify(strategy, candlesticks, window=None, rtol=1e-6, atol=1e-9, **params):
+    panel = as_panel(candlesticks)
+    expected = strategy.step(panel, window=window, **params)
+    weights = run(strategy, panel, window, **params)
+    difference = np.abs(weights - expected)
+    max_difference = np.nanmax(difference, initial=0)
+    matches = np.allclose(weights, expected, rtol=rtol, atol=atol, equal_nan=True)
+    if not matches:
+        logger.warning(
+            f"Event-driven weights differ from step(): max difference "
+            f"{max_difference}"
+        )
+    return matches, max_difference
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import math
+import time
+from importlib import import_module
+
+import numpy as np
+
+from ladon import engine
+from ladon.base import INTERVALS_MAP
+from ladon.database import SqliteDatabase
+from ladon.forwardtest import ForwardTest, load_universe
+from ladon.latency import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Position changes worth less than this fraction of equity are not traded
+REBALANCE_BAND = 0.005
+# Quote asset of the symbols traded when none are given
+QUOTE_ASSET = "USDT"
+# Bars between account refreshes, fills are tracked locally in between
+SYNC_EVERY = 60
+
+
+def _min_notional(filters):
+    # Spot uses NOTIONAL (or the older MIN_NOTIONAL), futures MIN_NOTIONAL
+    for name, key in (
+        ("NOTIONAL", "minNotional"),
+        ("MIN_NOTIONAL", "minNotional"),
+        ("MIN_NOTIONAL", "notional"),
+    ):
+        if key in filters.get(name, {}):
+            return float(filters[name][key])
+    return 0.0
+
+
+def lot_filters(info, symbols):
+    # Quantity steps and minimum order notionals aligned with symbols
+    filters = {
+        s["symbol"]: {f["filterType"]: f for f in s["filters"]} for s in info["symbols"]
+    }
+    steps = np.array([float(filters[s]["LOT_SIZE"]["stepSize"]) for s in symbols])
+    min_notional = np.array([_min_notional(filters[s]) for s in symbols])
+    return steps, min_notional
+
+
+def quote_asset(info, symbols):
+    # Weights, prices and equity are only comparable in a single quote asset
+    quotes = {s["symbol"]: s["quoteAsset"] for s in info["symbols"]}
+    assets = sorted({quotes[symbol] for symbol in symbols})
+    if len(assets) != 1:
+        raise ValueError(f"Symbols must share one quote asset, got {assets}")
+    return assets[0]
+
+
+def _quantity(quantity, step):
+    return f"{quantity:.{max(0, -math.floor(math.log10(step)))}f}"
+
+
+def order_diffs(
+    symbols,
+    weights,
+    quantities,
+    prices,
+    equity,
+    steps,
+    min_notional,
+    band=REBALANCE_BAND,
+):
+    # Market orders moving `quantities` towards `weights` of `equity`
+    priced = np.isfinite(prices) & (prices > 0)
+    targets = np.zeros(len(symbols))
+    np.divide(np.nan_to_num(weights) * equity, prices, out=targets, where=priced)
+    diffs = np.trunc((targets - quantities) / steps) * steps
+    notional = np.abs(diffs) * np.where(priced, prices, 0)
+    trade = priced & (notional >= np.maximum(min_notional, band * equity))
+    return [
+        {
+            "symbol": symbols[i],
+            "side": "BUY" if diffs[i] > 0 else "SELL",
+            "quantity": _quantity(abs(diffs[i]), steps[i]),
+        }
+        for i in np.flatnonzero(trade)
+    ]
+
+
+# Turns weight vectors into orders on `provider`. rebalance() only replaces
+# the pending orders, so rebalances arriving faster than orders can be sent
+# are coalesced into the latest one. run() sends whatever is pending in
+# batches of provider.MAX_BATCH_ORDERS, the provider client holding the
+# order rate limits and the keep-alive connections. Orders in flight count
+# as filled when diffing so they are never sent twice.
+class Executor(object):
+    def __init__(self, provider, info, symbols, band=REBALANCE_BAND):
+        self.provider = provider
+        self.info = info
+        self.symbols = symbols
+        self.band = band
+        self.quote = quote_asset(info, symbols)
+        self.steps, self.min_notional = lot_filters(info, symbols)
+        self.equity = None
+        self.quantities = np.zeros(len(symbols))
+        self.in_flight = np.zeros(len(symbols))
+        self.latency = LatencyStats()
+        self.sent = 0
+        self.failed = 0
+        self._index = {symbol: i for i, symbol in enumerate(symbols)}
+        self._pending = {}
+        self._wakeup = asyncio.Event()
+
+    async def sync(self, prices):
+        account = await self.provider.portfolio(self.info, self.symbols, prices)
+        if account is not None:
+            self.equity, quantities = account
+            self.quantities = quantities - self.in_flight
+
+    def rebalance(self, weights, prices):
+        if self.equity is None:
+            logger.warning("No account snapshot yet, skipping rebalance")
+            return
+        orders = order_diffs(
+            self.symbols,
+            weights,
+            self.quantities + self.in_flight,
+            prices,
+            self.equity,
+            self.steps,
+            self.min_notional,
+            self.band,
+        )
+        self._pending = {order["symbol"]: order for order in orders}
+        if self._pending:
+            self._wakeup.set()
+
+    def _signed(self, order):
+        quantity = float(order["quantity"])
+        return quantity if order["side"] == "BUY" else -quantity
+
+    async def run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            orders = list(self._pending.values())
+            self._pending = {}
+            size = self.provider.MAX_BATCH_ORDERS
+            await asyncio.gather(
+                *(self._send(orders[i : i + size]) for i in range(0, len(orders), size))
+            )
+
+    async def _send(self, batch):
+        for order in batch:
+            self.in_flight[self._index[order["symbol"]]] += self._signed(order)
+        start_time = time.perf_counter()
+        try:
+            results = await self.provider.place_orders(batch)
+        except Exception as e:
+            logger.warning(f"Orders failed: {e!r}")
+            results = [{"msg": repr(e)}] * len(batch)
+        self.latency.add_since(start_time)
+
+        for order, result in zip(batch, results):
+            i = self._index[order["symbol"]]
+            self.in_flight[i] -= self._signed(order)
+            if "orderId" not in result:
+                self.failed += 1
+                logger.warning(
+                    f"{order['side']} {order['quantity']} {order['symbol']} "
+                    f"failed: {result.get('msg')}"
+                )
+                continue
+            self.sent += 1
+            filled = float(result.get("executedQty", 0))
+            self.quantities[i] += filled if order["side"] == "BUY" else -filled
+
+    def report(self):
+        return (
+            f"  orders: {self.sent} sent, {self.failed} failed\n"
+            f"  order round trip: {self.latency}"
+        )
+
+
+async def trade(
+    provider_name,
+    interval,
+    strategy_name,
+    symbols=None,
+    history=1000,
+    band=REBALANCE_BAND,
+    sync_every=SYNC_EVERY,
+    quote=QUOTE_ASSET,
+    **params,
+):
+    provider = import_module(f"ladon.providers.{provider_name}")
+    strategy = import_module(f"ladon.strategies.{strategy_name}")
+    if not engine.supports(strategy):
+        raise ValueError(f"Strategy {strategy_name} has no on_bar")
+
+    # Also registers the exchange ORDERS limits on the provider client
+    info = await provider.exchange_info()
+    if symbols is None:
+        symbols = [
+            symbol["symbol"]
+            for symbol in info["symbols"]
+            if symbol.get("status") == "TRADING" and symbol["quoteAsset"] == quote
+        ]
+    executor = Executor(provider, info, symbols, band)
+    db = SqliteDatabase()
+    candlesticks = load_universe(db, provider_name, interval, symbols, history)
+    seconds = INTERVALS_MAP[interval]
+
+    def on_weights(open_time, weights):
+        # Bars replayed by a backfill after a reconnect are too late to trade
+        if time.time() - open_time > 2 * seconds:
+            return
+        prices = test.portfolio.closes
+        executor.rebalance(weights, prices)
+        if test.bars % sync_every == 0:
+            asyncio.ensure_future(executor.sync(prices))
+
+    test = ForwardTest(strategy, candlesticks, on_weights=on_weights, **params)
+    test.warm_up()
+    await executor.sync(test.portfolio.closes)
+    if executor.equity is None:
+        raise RuntimeError("Could not read the account")
+
+    stream = provider.kline_stream(candlesticks, interval, on_close=test.on_close)
+    worker = asyncio.ensure_future(executor.run())
+    try:
+        await stream.run()
+    finally:
+        worker.cancel()
+        await stream.stop()
+        await provider.close()
+        print(test.report())
+        print(executor.report())
@@ -1,16 +1,46 @@
 import asyncio
 import logging
+import time
 from importlib import import_module
 
-from ladon.database import SqliteDatabase
+import numpy as np
+
+from ladon import gaps
+from ladon.cache import CandleCache
+from ladon.database import TRADE_CHUNK, DatabaseWriter, SqliteDatabase, concat_trades
+from ladon.rollup import SOURCE_INTERVAL, rollup
 
 logger = logging.getLogger(__name__)
 
 
-async def fetch(provider_name, interval="1d", symbols=None):
+async def fetch(
+    provider_name,
+    interval="1d",
+    symbols=None,
+    concurrency=4,
+    queue_size=64,
+    raw_data="json",
+    build_rollups=False,
+):
+    if build_rollups and interval != SOURCE_INTERVAL:
+        raise ValueError(
+            f"Rollups are built from {SOURCE_INTERVAL} candlesticks, not {interval}"
+        )
+
     provider = import_module(f"ladon.providers.{provider_name}")
 
-    db = SqliteDatabase()
+    db = SqliteDatabase(ingest=True)
+    cache = CandleCache()
+    writer = DatabaseWriter(queue_size=queue_size, raw_data=raw_data)
+    writer.on_commit(
+        lambda provider, symbol, interval, since: cache.invalidate(
+            provider, interval, symbol, since=since
+        )
+    )
+    writer.start()
+    semaphore = asyncio.Semaphore(concurrency)
+    start_times = {}
+    failures = {}
 
     info = await provider.exchange_info()
     db.set_provider_info(provider_name, info)
@@ -22,8 +52,10 @@ async def fetch(provider_name, interval="1d", symbols=None):
         )
 
     async def fetch_until_end(symbol):
-        symbol["klines"] = []
+        async with semaphore:
+            await fetch_symbol(symbol)
 
+    async def fetch_symbol(symbol):
         last_kline = db.get_candlestick(provider_name, symbol["symbol"], interval)
         if last_kline is not None:
             start_time = last_kline[0] // 1000
@@ -32,27 +64,126 @@ async def fetch(provider_name, interval="1d", symbols=None):
         else:
             start_time = 1483228800  # 2017
 
-        logger.info(
-            f"Fetching {symbol['symbol']}, starting@{start_time}..."
-        )
-        new_klines = await provider.continuousKlines(
-            symbol["symbol"],
-            None, #symbol["contractType"],
-            interval=interval,
-            start_time=start_time,
-            limit=1000,
-            fetch_all=True,
-        )
+        # Holes left by failed requests of earlier runs, then everything new
+        ranges = gaps.scan(db, provider_name, symbol["symbol"], interval)
+        ranges.append((start_time, None))
+        start_times[symbol["symbol"]] = ranges[0][0]
+        failures[symbol["symbol"]] = []
+
+        for start, end in ranges:
+            logger.info(
+                f"Fetching {symbol['symbol']}, starting@{start}"
+                + (f" until {end}..." if end is not None else "...")
+            )
+            # Pages go straight to the writer thread; the bounded queue keeps
+            # memory flat no matter how much history a symbol has.
+            async for page in provider.continuousKlines(
+                symbol["symbol"],
+                None,  # symbol["contractType"],
+                interval=interval,
+                start_time=start,
+                end_time=end,
+                limit=1000,
+                fetch_all=True,
+                failures=failures[symbol["symbol"]],
+            ):
+                await writer.put(
+                    provider_name,
+                    symbol["symbol"],
+                    interval,
+                    {
+                        k[0] // 1000: (k[1], k[2], k[3], k[4], k[5], k[7], k)
+                        for k in page
+                    },
+                )
+
+    try:
+        await asyncio.gather(*map(fetch_until_end, info["symbols"]))
+    finally:
+        await writer.close()
+        await provider.close()
+
+    for symbol, failed in failures.items():
+        gaps.update_coverage(db, provider_name, symbol, interval, failed)
+
+    if build_rollups:
+        for symbol, start_time in start_times.items():
+            rollup(db, provider_name, symbol, since=start_time, cache=cache)
+
+
+def trade_arrays(page):
+    return {
+        "id": np.array([t["a"] for t in page], dtype=np.int64),
+        "ts": np.array([t["T"] for t in page], dtype=np.int64),
+        "px": np.array([float(t["p"]) for t in page]),
+        "qty": np.array([float(t["q"]) for t in page]),
+    }
+
+
+def split_trades(trades, timestamp):
+    # Trades before timestamp (ms) and the rest
+    split = np.searchsorted(trades["ts"], timestamp)
+    return (
+        {field: column[:split] for field, column in trades.items()},
+        {field: column[split:] for field, column in trades.items()},
+    )
 
-        db.add_candlesticks(
-            provider_name,
-            symbol["symbol"],
-            interval,
-            {k[0] // 1000: (k[1], k[2], k[3], k[4], k[5], k[7], k) for k in new_klines},
+
+async def fetch_trades(
+    provider_name,
+    symbols=None,
+    since=None,
+    concurrency=4,
+    queue_size=64,
+    trade_compression="zlib",
+):
+    provider = import_module(f"ladon.providers.{provider_name}")
+
+    db = SqliteDatabase(ingest=True)
+    writer = DatabaseWriter(queue_size=queue_size, trade_compression=trade_compression)
+    writer.start()
+    semaphore = asyncio.Semaphore(concurrency)
+    if since is None:
+        since = int(time.time()) - 24 * 60 * 60
+
+    info = await provider.exchange_info()
+    db.set_provider_info(provider_name, info)
+
+    if symbols is not None:
+        logger.info(f"Filtering symbols {symbols}")
+        info["symbols"] = list(
+            filter(lambda s: s["symbol"] in symbols, info["symbols"])
         )
 
-        return True
+    async def fetch_until_end(symbol):
+        async with semaphore:
+            await fetch_symbol(symbol["symbol"])
+
+    async def fetch_symbol(symbol):
+        last_id = db.get_last_trade_id(provider_name, symbol)
+        if last_id is not None:
+            logger.info(f"Fetching {symbol} trades from id {last_id + 1}...")
+            pages = provider.aggTrades(symbol, from_id=last_id + 1, fetch_all=True)
+        else:
+            logger.info(f"Fetching {symbol} trades, starting@{since}...")
+            pages = provider.aggTrades(symbol, start_time=since, fetch_all=True)
 
-    await asyncio.gather(*map(fetch_until_end, info["symbols"]))
+        # Trades are held back until their chunk is complete so every chunk
+        # is written once, not rewritten for each page
+        buffered = []
+        async for page in pages:
+            buffered.append(trade_arrays(page))
+            last_chunk = buffered[-1]["ts"][-1] // 1000 // TRADE_CHUNK * TRADE_CHUNK
+            if buffered[0]["ts"][0] >= last_chunk * 1000:
+                continue
+            complete, rest = split_trades(concat_trades(buffered), last_chunk * 1000)
+            await writer.put_trades(provider_name, symbol, complete)
+            buffered = [rest] if len(rest["id"]) > 0 else []
+        if buffered:
+            await writer.put_trades(provider_name, symbol, concat_trades(buffered))
 
-    await provider.close()
+    try:
+        await asyncio.gather(*map(fetch_until_end, info["symbols"]))
+    finally:
+        await writer.close()
+        await provider.close()
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from importlib import import_module
+
+import numpy as np
+
+from ladon import engine
+from ladon.base import INTERVALS_MAP, Candlestick, Panel
+from ladon.database import SqliteDatabase
+from ladon.latency import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+CLOSE = Panel.FIELDS.index("close")
+STAGES = ("ingest", "indicators", "strategy", "rebalance", "total")
+# Seconds to wait for the closes of slow symbols before stepping without them
+CLOSE_DEADLINE = 2.0
+
+
+def load_universe(database, provider_name, interval, symbols, history):
+    start = int(time.time()) - history * INTERVALS_MAP[interval]
+    arrays = database.get_candlesticks_arrays(
+        provider_name, interval, symbols, start=start
+    )
+    candlesticks = {}
+    for symbol in symbols:
+        array = arrays.get(symbol, np.empty((0, 7)))
+        # Same filtering as Candlestick.append_candlestick
+        array = array[np.all(array[:, 1:] != 0, axis=1)]
+        candlesticks[symbol] = Candlestick.from_array(
+            symbol, array, max_history=history
+        )
+    return candlesticks
+
+
+# Simulated fills at bar closes, paying `fee` per unit of turnover
+class Portfolio(object):
+    def __init__(self, symbols, fee=0.0):
+        self.fee = fee
+        self.weights = np.zeros(len(symbols))
+        self.closes = np.full(len(symbols), np.nan)
+        self.equity = 1.0
+        self.turnover = 0.0
+
+    def mark(self, closes):
+        returns = closes / self.closes - 1
+        pnl = np.nansum(self.weights * returns)
+        self.equity *= 1 + pnl
+        self.closes = np.where(np.isnan(closes), self.closes, closes)
+        return pnl
+
+    def rebalance(self, weights):
+        weights = np.nan_to_num(weights)
+        turnover = np.sum(np.abs(weights - self.weights))
+        self.equity *= 1 - self.fee * turnover
+        self.turnover += turnover
+        self.weights = weights
+
+
+# Steps a strategy over a live universe of Candlesticks. on_close is meant to
+# be the kline stream callback: once every symbol closed a bar (or
+# CLOSE_DEADLINE passed) the bar is assembled, fed to the strategy and the
+# simulated portfolio rebalanced, timing each stage. on_weights(open_time,
+# weights) is called with every new weight vector.
+class ForwardTest(object):
+    def __init__(
+        self,
+        strategy,
+        candlesticks,
+        fee=0.0,
+        close_deadline=CLOSE_DEADLINE,
+        report_every=60,
+        on_weights=None,
+        **params,
+    ):
+        self.strategy = strategy
+        self.on_weights = on_weights
+        self.candlesticks = candlesticks
+        self.symbols = list(candlesticks)
+        self.close_deadline = close_deadline
+        self.report_every = report_every
+        self.state = strategy.init_state(self.symbols, **params)
+        self.portfolio = Portfolio(self.symbols, fee)
+        self.stats = {stage: LatencyStats() for stage in STAGES}
+        self.last_bar = None
+        self.bars = 0
+        self._pending = {}
+
+    def warm_up(self):
+        panel = Panel.from_candlesticks(list(self.candlesticks.values()))
+        if len(panel.times) == 0:
+            return
+        weights = engine.replay(self.strategy, self.state, panel)
+        self.portfolio.closes = np.array(
+            [
+                candle.np_array[-1, 4] if len(candle.np_array) > 0 else np.nan
+                for candle in self.candlesticks.values()
+            ]
+        )
+        self.portfolio.rebalance(weights)
+        self.last_bar = int(panel.times[-1])
+        logger.info(f"Warmed up on {len(panel.times)} bars of {len(panel)} symbols")
+
+    def on_close(self, symbol, open_time):
+        if self.last_bar is not None and open_time <= self.last_bar:
+            return
+        closed = self._pending.get(open_time)
+        if closed is None:
+            closed = self._pending[open_time] = set()
+            asyncio.get_running_loop().call_later(
+                self.close_deadline, self.step, open_time
+            )
+        closed.add(symbol)
+        if len(closed) == len(self.symbols):
+            self.step(open_time)
+
+    def _bar(self, open_time):
+        bar = np.full((len(Panel.FIELDS), len(self.symbols)), np.nan)
+        for i, symbol in enumerate(self.symbols):
+            array = self.candlesticks[symbol].np_array
+            # Usually the last row, unless the next bar already started
+            row = len(array) - 1
+            if row >= 0 and array[row, 0] != open_time:
+                row = np.searchsorted(array[:, 0], open_time)
+            if row < len(array) and array[row, 0] == open_time:
+                bar[:, i] = array[row, 1:]
+        return bar
+
+    def step(self, open_time):
+        if self.last_bar is not None and open_time <= self.last_bar:
+            return None
+        closed = self._pending.pop(open_time, ())
+        for stale in [t for t in self._pending if t < open_time]:
+            del self._pending[stale]
+        self.last_bar = open_time
+
+        start_time = time.perf_counter()
+        bar = self._bar(open_time)
+        ingested = time.perf_counter()
+        if hasattr(self.strategy, "update_indicators"):
+            self.strategy.update_indicators(self.state, bar)
+            updated = time.perf_counter()
+            weights = self.strategy.target_weights(self.state)
+        else:
+            updated = ingested
+            weights = self.strategy.on_bar(self.state, bar)
+        decided = time.perf_counter()
+        pnl = self.portfolio.mark(bar[CLOSE])
+        self.portfolio.rebalance(weights)
+        end_time = time.perf_counter()
+
+        for stage, elapsed in zip(
+            STAGES,
+            (
+                ingested - start_time,
+                updated - ingested,
+                decided - updated,
+                end_time - decided,
+                end_time - start_time,
+            ),
+        ):
+            self.stats[stage].add(elapsed * 1000)
+
+        self.bars += 1
+        logger.debug(
+            f"Bar {open_time}: {len(closed)}/{len(self.symbols)} closed, "
+            f"pnl {pnl:+.5f}, equity {self.portfolio.equity:.5f}, "
+            f"{(end_time - start_time) * 1000:.3f}ms"
+        )
+        if self.report_every and self.bars % self.report_every == 0:
+            logger.info(self.report())
+        if self.on_weights is not None:
+            self.on_weights(open_time, weights)
+        return weights
+
+    def report(self):
+        lines = [
+            f"{self.bars} bars, equity {self.portfolio.equity:.5f}, "
+            f"turnover {self.portfolio.turnover:.3f}"
+        ]
+        for stage in STAGES:
+            lines.append(f"  {stage}: {self.stats[stage]}")
+        return "\n".join(lines)
+
+
+async def forwardtest(
+    provider_name,
+    interval,
+    strategy_name,
+    symbols=None,
+    history=1000,
+    fee=0.0,
+    **params,
+):
+    provider = import_module(f"ladon.providers.{provider_name}")
+    strategy = import_module(f"ladon.strategies.{strategy_name}")
+    if not engine.supports(strategy):
+        raise ValueError(f"Strategy {strategy_name} has no on_bar")
+
+    db = SqliteDatabase()
+    if symbols is None:
+        info = db.get_provider_info(provider_name)
+        symbols = [symbol["symbol"] for symbol in info["symbols"]]
+    candlesticks = load_universe(db, provider_name, interval, symbols, history)
+
+    test = ForwardTest(strategy, candlesticks, fee, **params)
+    test.warm_up()
+    stream = provider.kline_stream(candlesticks, interval, on_close=test.on_close)
+    try:
+        await stream.run()
+    finally:
+        await stream.stop()
+        await provider.close()
+        print(test.report())
+        print(f"  message latency: {stream.latency}")
+        print(f"  message processing: {stream.processing}")
@@ -0,0 +1,43 @@
+import logging
+
+import numpy as np
+
+from ladon.base import INTERVALS_MAP
+
+logger = logging.getLogger(__name__)
+
+
+# (first, last) missing timestamp of every hole in a sorted series of bars
+# spaced `step` seconds apart
+def find_gaps(timestamps, step):
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    index = np.flatnonzero(np.diff(timestamps) > step)
+    return np.column_stack((timestamps[index] + step, timestamps[index + 1] - step))
+
+
+def scan(database, provider, symbol, interval):
+    # Only bars from the coverage watermark on are read; the bar at the
+    # watermark itself is included so a hole right after it is still found
+    scanned_until = database.get_coverage(provider, symbol, interval)
+    timestamps = database.get_timestamps(
+        provider, symbol, interval, start=scanned_until
+    )
+    step = INTERVALS_MAP[interval]
+    gaps = find_gaps(timestamps, step)
+    if len(gaps) > 0:
+        missing = int(np.sum((gaps[:, 1] - gaps[:, 0]) // step + 1))
+        logger.info(f"{symbol} {interval}: {missing} bars missing in {len(gaps)} gaps")
+    return [(int(start), int(end)) for start, end in gaps.tolist()]
+
+
+# Advance the watermark over everything stored, or only up to the last bar
+# before the first range that could not be fetched so it is scanned again
+def update_coverage(database, provider, symbol, interval, failed=()):
+    scanned_until = database.get_coverage(provider, symbol, interval)
+    timestamps = database.get_timestamps(
+        provider, symbol, interval, start=scanned_until
+    )
+    if len(failed) > 0:
+        timestamps = timestamps[timestamps < min(start for start, _ in failed)]
+    if len(timestamps) > 0:
+        database.set_coverage(provider, symbol, interval, int(timestamps[-1]))
@@ -0,0 +1,254 @@
+# Batched indicators over arrays shaped (..., time), e.g. (symbols, time).
+# Values are aligned to the end of their window; the first window - 1 bars and
+# any window containing a NaN are NaN.
+from collections import deque
+
+import numpy as np
+
+
+def _windowed_sum(x, window):
+    csum = np.cumsum(x, axis=-1)
+    result = np.empty(x.shape)
+    result[..., : window - 1] = np.nan
+    result[..., window - 1] = csum[..., window - 1]
+    np.subtract(csum[..., window:], csum[..., :-window], out=result[..., window:])
+    return result
+
+
+def rolling_sum(x, window):
+    x = np.asarray(x, dtype=np.float64)
+    if window > x.shape[-1]:
+        return np.full(x.shape, np.nan)
+
+    nans = np.isnan(x)
+    if not nans.any():
+        return _windowed_sum(x, window)
+    result = _windowed_sum(np.where(nans, 0, x), window)
+    result[_windowed_sum(nans, window) != 0] = np.nan
+    return result
+
+
+def rolling_mean(x, window):
+    return rolling_sum(x, window) / window
+
+
+def rolling_var(x, window, ddof=0):
+    x = np.asarray(x, dtype=np.float64)
+    # Shift by a per row reference to limit cancellation in the sums
+    with np.errstate(all="ignore"):
+        reference = np.nanmean(x, axis=-1, keepdims=True)
+    shifted = x - np.nan_to_num(reference)
+    mean = rolling_mean(shifted, window)
+    var = rolling_mean(shifted * shifted, window) - mean * mean
+    return np.maximum(var, 0) * (window / (window - ddof))
+
+
+def rolling_std(x, window, ddof=0):
+    return np.sqrt(rolling_var(x, window, ddof))
+
+
+def rolling_zscore(x, window):
+    # Zero where the window is flat, like a Bollinger band of width 0
+    std = rolling_std(x, window)
+    return np.divide(
+        x - rolling_mean(x, window),
+        std,
+        out=np.zeros(std.shape),
+        where=std != 0,
+    )
+
+
+def _rolling_extreme(x, window, func):
+    # van Herk/Gil-Werman: prefix and suffix extremes over blocks of `window`
+    x = np.asarray(x, dtype=np.float64)
+    length = x.shape[-1]
+    if window > length:
+        return np.full(x.shape, np.nan)
+
+    blocks = -(-length // window)
+    padded = np.full(x.shape[:-1] + (blocks * window,), np.nan)
+    padded[..., :length] = x
+    padded = padded.reshape(x.shape[:-1] + (blocks, window))
+    prefix = func.accumulate(padded, axis=-1).reshape(x.shape[:-1] + (-1,))
+    suffix = np.flip(
+        func.accumulate(np.flip(padded, axis=-1), axis=-1), axis=-1
+    ).reshape(x.shape[:-1] + (-1,))
+
+    result = np.full(x.shape, np.nan)
+    result[..., window - 1 :] = func(
+        suffix[..., : length - window + 1], prefix[..., window - 1 : length]
+    )
+    return result
+
+
+def rolling_max(x, window):
+    return _rolling_extreme(x, window, np.maximum)
+
+
+def rolling_min(x, window):
+    return _rolling_extreme(x, window, np.minimum)
+
+
+def ema(x, span=None, alpha=None):
+    # NaN inputs give NaN outputs and leave the average untouched
+    x = np.asarray(x, dtype=np.float64)
+    alpha = 2 / (span + 1) if alpha is None else alpha
+    result = np.full(x.shape, np.nan)
+    current = np.full(x.shape[:-1], np.nan)
+    for i in range(x.shape[-1]):
+        value = x[..., i]
+        valid = ~np.isnan(value)
+        current = np.where(
+            valid,
+            np.where(np.isnan(current), value, current + alpha * (value - current)),
+            current,
+        )
+        result[..., i] = np.where(valid, current, np.nan)
+    return result
+
+
+# Streaming counterparts, fed one bar at a time as a scalar or a vector across
+# symbols, with the same NaN and alignment rules as the batch functions above.
+class RollingSum(object):
+    def __init__(self, window, shape=()):
+        self.window = window
+        self._values = np.zeros((window,) + shape)
+        self._nans = np.zeros((window,) + shape, dtype=bool)
+        self._sum = np.zeros(shape)
+        self._nan_count = np.zeros(shape, dtype=np.int64)
+        self._count = 0
+        self.value = np.full(shape, np.nan)
+
+    def update(self, x):
+        pos = self._count % self.window
+        nans = np.isnan(x)
+        x = np.where(nans, 0, x)
+        self._sum += x - self._values[pos]
+        self._nan_count += nans.astype(np.int64) - self._nans[pos]
+        self._values[pos] = x
+        self._nans[pos] = nans
+        self._count += 1
+        if pos == self.window - 1:
+            # Resync once per window so rounding errors do not pile up
+            self._sum = np.sum(self._values, axis=0)
+
+        self.value = np.where(
+            (self._count < self.window) | (self._nan_count > 0), np.nan, self._sum
+        )
+        return self.value
+
+
+class RollingMean(RollingSum):
+    def update(self, x):
+        self.value = super().update(x) / self.window
+        return self.value
+
+
+class RollingVar(object):
+    def __init__(self, window, shape=(), ddof=0):
+        self.window = window
+        self.ddof = ddof
+        self._reference = np.full(shape, np.nan)
+        self._mean = RollingMean(window, shape)
+        self._mean_sq = RollingMean(window, shape)
+        self.value = np.full(shape, np.nan)
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        # Shift by the first value seen to limit cancellation, like rolling_var
+        self._reference = np.where(np.isnan(self._reference), x, self._reference)
+        shifted = x - self._reference
+        mean = self._mean.update(shifted)
+        mean_sq = self._mean_sq.update(shifted * shifted)
+        self.value = np.maximum(mean_sq - mean * mean, 0) * (
+            self.window / (self.window - self.ddof)
+        )
+        return self.value
+
+
+class RollingStd(RollingVar):
+    def update(self, x):
+        self.value = np.sqrt(super().update(x))
+        return self.value
+
+
+class RollingZScore(object):
+    def __init__(self, window, shape=()):
+        self._mean = RollingMean(window, shape)
+        self._std = RollingStd(window, shape)
+        self.value = np.full(shape, np.nan)
+
+    def update(self, x):
+        mean = self._mean.update(x)
+        std = self._std.update(x)
+        self.value = np.divide(
+            x - mean, std, out=np.zeros(np.shape(std)), where=std != 0
+        )
+        return self.value
+
+
+class EMA(object):
+    def __init__(self, span=None, alpha=None, shape=()):
+        self.alpha = 2 / (span + 1) if alpha is None else alpha
+        self._current = np.full(shape, np.nan)
+        self.value = np.full(shape, np.nan)
+
+    def update(self, x):
+        valid = ~np.isnan(x)
+        self._current = np.where(
+            valid,
+            np.where(
+                np.isnan(self._current),
+                x,
+                self._current + self.alpha * (x - self._current),
+            ),
+            self._current,
+        )
+        self.value = np.where(valid, self._current, np.nan)
+        return self.value
+
+
+class _RollingExtreme(object):
+    # Monotonic deque of (bar index, value) per element
+    def __init__(self, window, shape=()):
+        self.window = window
+        self.shape = shape
+        self._deques = [deque() for _ in range(int(np.prod(shape)))]
+        self._last_nan = np.full(int(np.prod(shape)), -window)
+        self._count = 0
+        self.value = np.full(shape, np.nan)
+
+    def update(self, x):
+        index = self._count
+        values = np.ravel(x).tolist()
+        result = np.empty(len(values))
+        for i, value in enumerate(values):
+            queue = self._deques[i]
+            if value != value:
+                self._last_nan[i] = index
+            else:
+                while queue and not self._keep(queue[-1][1], value):
+                    queue.pop()
+                queue.append((index, value))
+            while queue and queue[0][0] <= index - self.window:
+                queue.popleft()
+            result[i] = queue[0][1] if queue else np.nan
+        self._count += 1
+
+        result[self._last_nan > index - self.window] = np.nan
+        if self._count < self.window:
+            result[:] = np.nan
+        self.value = result.reshape(self.shape)
+        return self.value
+
+
+class RollingMax(_RollingExtreme):
+    @staticmethod
+    def _keep(old, new):
+        return old > new
+
+
+class RollingMin(_RollingExtreme):
+    @staticmethod
+    def _keep(old, new):
+        return old < new
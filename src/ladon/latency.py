@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+
+
+# Running latency statistics in milliseconds over the last `size` samples,
+# kept in a preallocated ring so recording stays O(1) on hot paths
+class LatencyStats(object):
+    def __init__(self, size=100000):
+        self._samples = np.empty(size)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, milliseconds):
+        self._samples[self.count % len(self._samples)] = milliseconds
+        self.count += 1
+        if milliseconds > self.max:
+            self.max = milliseconds
+
+    def add_since(self, start_time):
+        # start_time from time.perf_counter()
+        self.add((time.perf_counter() - start_time) * 1000)
+
+    def samples(self):
+        return self._samples[: min(self.count, len(self._samples))]
+
+    def summary(self):
+        samples = self.samples()
+        if len(samples) == 0:
+            return {"count": 0}
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        return {
+            "count": self.count,
+            "mean": float(np.mean(samples)),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": self.max,
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        if summary["count"] == 0:
+            return "no samples"
+        return (
+            f"n={summary['count']} mean={summary['mean']:.2f}ms "
+            f"p50={summary['p50']:.2f}ms p90={summary['p90']:.2f}ms "
+            f"p99={summary['p99']:.2f}ms max={summary['max']:.2f}ms"
+        )
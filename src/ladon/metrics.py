@@ -0,0 +1,132 @@
+# Performance metrics over returns shaped (..., time), e.g. (strategies, time),
+# and weights shaped (..., symbols, time).
+import numpy as np
+
+from ladon.base import INTERVALS_MAP
+from ladon.indicators import rolling_mean, rolling_std, rolling_sum
+
+YEAR = 365 * 24 * 60 * 60
+
+
+def periods_per_year(interval):
+    return YEAR / INTERVALS_MAP[interval]
+
+
+def _divide(a, b):
+    a, b = np.broadcast_arrays(a, b)
+    return np.divide(a, b, out=np.full(a.shape, np.nan), where=b != 0)
+
+
+def cumulative_returns(returns):
+    return np.cumprod(1 + returns, axis=-1) - 1
+
+
+def drawdown(returns):
+    equity = np.cumprod(1 + returns, axis=-1)
+    return 1 - equity / np.maximum.accumulate(equity, axis=-1)
+
+
+def drawdown_duration(returns):
+    # Bars elapsed since the last equity high
+    dd = drawdown(returns)
+    index = np.broadcast_to(np.arange(dd.shape[-1]), dd.shape)
+    last_peak = np.maximum.accumulate(np.where(dd > 0, 0, index), axis=-1)
+    return index - last_peak
+
+
+def max_drawdown(returns):
+    return np.max(drawdown(returns), axis=-1)
+
+
+def max_drawdown_duration(returns):
+    return np.max(drawdown_duration(returns), axis=-1)
+
+
+def annualized_return(returns, periods):
+    total = np.prod(1 + returns, axis=-1)
+    return np.power(total, periods / returns.shape[-1]) - 1
+
+
+def sharpe(returns, periods):
+    return _divide(np.mean(returns, axis=-1), np.std(returns, axis=-1)) * np.sqrt(
+        periods
+    )
+
+
+def sortino(returns, periods):
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2, axis=-1))
+    return _divide(np.mean(returns, axis=-1), downside) * np.sqrt(periods)
+
+
+def calmar(returns, periods):
+    return _divide(annualized_return(returns, periods), max_drawdown(returns))
+
+
+def turnover(weights):
+    # Sum of absolute weight changes across symbols per bar
+    return np.nansum(np.abs(np.diff(weights, axis=-1, prepend=0)), axis=-2)
+
+
+def exposure(weights):
+    # Gross exposure per bar
+    return np.nansum(np.abs(weights), axis=-2)
+
+
+def rolling_sharpe(returns, window, periods):
+    return _divide(
+        rolling_mean(returns, window), rolling_std(returns, window)
+    ) * np.sqrt(periods)
+
+
+def rolling_sortino(returns, window, periods):
+    downside = np.sqrt(rolling_mean(np.minimum(returns, 0) ** 2, window))
+    return _divide(rolling_mean(returns, window), downside) * np.sqrt(periods)
+
+
+def rolling_max_drawdown(returns, window):
+    equity = np.cumprod(1 + returns, axis=-1)
+    result = np.full(equity.shape, np.nan)
+    if window > equity.shape[-1]:
+        return result
+
+    # Walk the sliding windows in blocks to bound the temporaries' size
+    windows = np.lib.stride_tricks.sliding_window_view(equity, window, axis=-1)
+    step = max(1, 2**20 // window)
+    for start in range(0, windows.shape[-2], step):
+        block = windows[..., start : start + step, :]
+        result[..., window - 1 + start : window - 1 + start + block.shape[-2]] = np.max(
+            1 - block / np.maximum.accumulate(block, axis=-1), axis=-1
+        )
+    return result
+
+
+def rolling_calmar(returns, window, periods):
+    log_total = rolling_sum(np.log1p(returns), window)
+    annualized = np.expm1(log_total * periods / window)
+    return _divide(annualized, rolling_max_drawdown(returns, window))
+
+
+def rolling_turnover(weights, window):
+    return rolling_mean(turnover(weights), window)
+
+
+def rolling_exposure(weights, window):
+    return rolling_mean(exposure(weights), window)
+
+
+def summary(returns, interval, weights=None):
+    periods = periods_per_year(interval)
+    result = {
+        "cumulative_returns": np.prod(1 + returns, axis=-1) - 1,
+        "annualized_returns": annualized_return(returns, periods),
+        "sharpe": sharpe(returns, periods),
+        "sortino": sortino(returns, periods),
+        "calmar": calmar(returns, periods),
+        "ideal_leverage": _divide(np.mean(returns, axis=-1), np.var(returns, axis=-1)),
+        "max_drawdown": max_drawdown(returns),
+        "max_drawdown_duration": max_drawdown_duration(returns),
+    }
+    if weights is not None:
+        result["turnover"] = np.mean(turnover(weights), axis=-1)
+        result["exposure"] = np.mean(exposure(weights), axis=-1)
+    return result
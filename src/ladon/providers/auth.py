@@ -0,0 +1,25 @@
+import hashlib
+import hmac
+import os
+import time
+from urllib.parse import urlencode
+
+RECV_WINDOW = 5000
+
+
+# API credentials come from <PREFIX>_API_KEY and <PREFIX>_API_SECRET
+def credentials(prefix):
+    key = os.environ.get(f"{prefix}_API_KEY")
+    secret = os.environ.get(f"{prefix}_API_SECRET")
+    if key is None or secret is None:
+        raise RuntimeError(f"Set {prefix}_API_KEY and {prefix}_API_SECRET to trade")
+    return key, secret
+
+
+def signed_query(params, secret):
+    # HMAC SHA256 signed query string for SIGNED endpoints
+    query = urlencode(
+        {**params, "timestamp": int(time.time() * 1000), "recvWindow": RECV_WINDOW}
+    )
+    signature = hmac.new(secret.encode(), query.encode(), hashlib.sha256).hexdigest()
+    return f"{query}&signature={signature}"
@@ -1,94 +1,31 @@
-import asyncio
+import json
 import logging
-from datetime import datetime
 
 import httpx
+import numpy as np
 
 from ladon.base import INTERVALS_MAP
+from ladon.providers.auth import credentials, signed_query
+from ladon.providers.pagination import first_agg_trade_id, iter_id_pages, iter_pages
+from ladon.providers.ratelimit import RateLimitedAsyncClient
+from ladon.providers.stream import MAX_STREAMS, KlineStream
 
 logger = logging.getLogger(__name__)
 
-BASE_URL = "https://fapi.binance.com"
-
-
-class RateLimitedAsyncClient(httpx.AsyncClient):
-    RATE_LIMIT_THRESHOLD = 0.9
-    PERIOD_MAP = {60: "1m"}
+DEFAULT_KLINES_LIMIT = 500
+MAX_AGG_TRADES_LIMIT = 1000
+MAX_BATCH_ORDERS = 5
+CREDENTIALS = "BINANCE"
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.rate_limits = {}
-        self.lock = asyncio.Lock()
+BASE_URL = "https://fapi.binance.com"
+STREAM_URL = "wss://fstream.binance.com"
 
-    def add_rate_limit(self, total_weight, period):
-        self.rate_limits[period] = {
-            "total_weight": total_weight,
-            "reset_time": period * (datetime.now().timestamp() // period),
-            "current_count": 0,
-        }
 
-    def check_rate_limit(self, period, count):
-        current_count = self.rate_limits[period]["current_count"]
-        if count and count > current_count:
-            logger.warning(f"Used weight mismatch: {count} > {current_count}")
-            self.rate_limits[period]["current_count"] = count
-        return current_count
-
-    async def get(self, *args, weight=1, **kwargs):
-        while True:
-            rate_limit_wait = 0
-            async with self.lock:
-                for period, limit in self.rate_limits.items():
-                    elapsed_time = datetime.now().timestamp() - limit["reset_time"]
-
-                    if elapsed_time > period:
-                        limit["current_count"] = 0
-                        limit["reset_time"] = period * (
-                            datetime.now().timestamp() // period
-                        )
-
-                    logger.debug(f"{args} {self.rate_limits}")
-
-                    if (
-                        limit["current_count"] + weight
-                        >= RateLimitedAsyncClient.RATE_LIMIT_THRESHOLD
-                        * limit["total_weight"]
-                    ):
-                        rate_limit_wait = max(
-                            rate_limit_wait,
-                            period - datetime.now().timestamp() % period,
-                        )
-                    else:
-                        limit["current_count"] += weight
-
-            if rate_limit_wait == 0:
-                break
-            else:
-                logger.warning(
-                    f"Rate limit almost reached, waiting {int(rate_limit_wait)}s..."
-                )
-                await asyncio.sleep(rate_limit_wait)
-
-        response = await super().get(*args, **kwargs)
-
-        if response.status_code == 429:
-            logger.warning(f"Rate limit reached!")
-
-        for period, limit in self.rate_limits.items():
-            used_weight = int(
-                response.headers[
-                    f"x-mbx-used-weight-{RateLimitedAsyncClient.PERIOD_MAP[period]}"
-                ]
-            )
-            self.check_rate_limit(period, used_weight)
-            logger.debug(
-                f"Used weight({RateLimitedAsyncClient.PERIOD_MAP[period]}): "
-                f"{used_weight}/{limit['total_weight']}"
-            )
-        return response
-
-
-client = RateLimitedAsyncClient(timeout=None)
+# Kept alive between requests so orders skip the TCP and TLS handshakes
+client = RateLimitedAsyncClient(
+    timeout=None,
+    limits=httpx.Limits(max_keepalive_connections=16, keepalive_expiry=120),
+)
 
 
 async def close():
@@ -100,16 +37,7 @@ async def exchange_info():
 
     response = await client.get(BASE_URL + "/fapi/v1/exchangeInfo", weight=1)
 
-    rate_limits = response.json()["rateLimits"]
-    for limit in rate_limits:
-        if limit["rateLimitType"] == "REQUEST_WEIGHT":
-            client.add_rate_limit(
-                limit["limit"],
-                limit["intervalNum"] * {"MINUTE": 60, "SECOND": 1}[limit["interval"]],
-            )
-        elif limit["rateLimitType"] == "ORDERS":
-            # TODO
-            pass
+    client.set_rate_limits(response.json()["rateLimits"])
 
     return response.json()
 
@@ -122,6 +50,8 @@ async def continuousKlines(
     end_time=None,
     limit=None,
     fetch_all=False,
+    concurrency=8,
+    failures=None,
 ):
     if interval not in INTERVALS_MAP:
         raise ValueError(
@@ -129,10 +59,8 @@ async def continuousKlines(
         )
 
     interval_seconds = INTERVALS_MAP[interval]
-    klines = []
 
-    while True:
-        logger.debug(f"{pair} klines: {len(klines)}")
+    async def fetch_page(start_time, end_time):
         params = {
             "pair": pair,
             "contractType": contract,
@@ -149,22 +77,151 @@ async def continuousKlines(
             BASE_URL + "/fapi/v1/continuousKlines", params=params, weight=10
         )
         if response.status_code != 200:
-            break
-
-        response = response.json()
-        klines += response
-
-        if (
-            not fetch_all
-            or start_time is None
-            or len(response) < limit
-            or (
-                end_time is not None
-                and (response[-1][0] // 1000 + interval_seconds > end_time)
-            )
-        ):
-            break
-        else:
-            start_time = response[-1][0] // 1000 + interval_seconds
-
-    return klines
+            logger.warning(f"{pair} klines: HTTP {response.status_code}")
+            return None
+        return response.json()
+
+    if not fetch_all or start_time is None:
+        page = await fetch_page(start_time, end_time)
+        if page is None and failures is not None:
+            failures.append((start_time, end_time))
+        if page:
+            yield page
+        return
+
+    async for page in iter_pages(
+        fetch_page,
+        start_time,
+        end_time,
+        interval_seconds,
+        limit or DEFAULT_KLINES_LIMIT,
+        concurrency,
+        failures,
+    ):
+        yield page
+
+
+async def aggTrades(
+    symbol,
+    from_id=None,
+    start_time=None,
+    limit=MAX_AGG_TRADES_LIMIT,
+    fetch_all=False,
+    concurrency=8,
+):
+    # Pages of aggregate trades ({"a": id, "p": price, "q": qty, "T": time
+    # in ms, ...}) from from_id, or from the first trade at or after
+    # start_time. With fetch_all every trade up to the latest is fetched.
+    async def fetch_page(from_id=None, start_time=None, end_time=None, limit=limit):
+        params = {"symbol": symbol, "limit": limit}
+        if from_id is not None:
+            params.update(fromId=from_id)
+        if start_time is not None:
+            params.update(startTime=int(start_time * 1000))
+        if end_time is not None:
+            params.update(endTime=int(end_time * 1000))
+
+        response = await client.get(
+            BASE_URL + "/fapi/v1/aggTrades", params=params, weight=20
+        )
+        if response.status_code != 200:
+            logger.warning(f"{symbol} aggTrades: HTTP {response.status_code}")
+            return None
+        return response.json()
+
+    if from_id is None and start_time is not None:
+        from_id = await first_agg_trade_id(fetch_page, start_time)
+        if from_id is None:
+            return
+
+    if not fetch_all:
+        page = await fetch_page(from_id)
+        if page:
+            yield page
+        return
+
+    latest = await fetch_page(limit=1)
+    if not latest:
+        return
+    async for page in iter_id_pages(
+        fetch_page, from_id or 0, latest[-1]["a"], limit, concurrency
+    ):
+        yield page
+
+
+def kline_stream(
+    candlesticks,
+    interval="1m",
+    on_close=None,
+    url=None,
+    max_streams=MAX_STREAMS,
+    contract="PERPETUAL",
+):
+    return KlineStream(
+        url or STREAM_URL,
+        lambda symbol, interval: (
+            f"{symbol.lower()}_{contract.lower()}@continuousKline_{interval}"
+        ),
+        lambda symbol, interval, start_time: continuousKlines(
+            symbol, contract, interval, start_time=start_time, fetch_all=True
+        ),
+        candlesticks,
+        interval,
+        on_close,
+        max_streams,
+    )
+
+
+async def _signed(method, path, params, weight=1, orders=0):
+    key, secret = credentials(CREDENTIALS)
+    return await client.request(
+        method,
+        BASE_URL + path,
+        headers={"X-MBX-APIKEY": key},
+        sign=lambda: signed_query(params, secret),
+        weight=weight,
+        orders=orders,
+    )
+
+
+def _json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {"code": response.status_code, "msg": response.text}
+
+
+async def portfolio(info, symbols, prices):
+    # Margin balance and signed position sizes aligned with symbols
+    response = await _signed("GET", "/fapi/v2/account", {}, weight=5)
+    if response.status_code != 200:
+        logger.warning(f"Account: HTTP {response.status_code} {response.text}")
+        return None
+    account = response.json()
+    positions = {
+        position["symbol"]: float(position["positionAmt"])
+        for position in account["positions"]
+    }
+    quantities = np.array([positions.get(symbol, 0.0) for symbol in symbols])
+    return float(account["totalMarginBalance"]), quantities
+
+
+async def place_orders(orders):
+    # Market orders given as {"symbol", "side", "quantity"}, at most
+    # MAX_BATCH_ORDERS sent in a single request
+    orders = [
+        {**order, "type": "MARKET", "newOrderRespType": "RESULT"} for order in orders
+    ]
+    if len(orders) == 1:
+        response = await _signed("POST", "/fapi/v1/order", orders[0], orders=1)
+        return [_json(response)]
+
+    response = await _signed(
+        "POST",
+        "/fapi/v1/batchOrders",
+        {"batchOrders": json.dumps(orders)},
+        weight=5,
+        orders=len(orders),
+    )
+    results = _json(response)
+    return results if isinstance(results, list) else [results] * len(orders)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PageChecker(object):
+    # Drops klines already seen and logs gaps between consecutive pages
+    def __init__(self, interval_seconds):
+        self.interval_ms = interval_seconds * 1000
+        self.last_open_time = None
+        self.gaps = 0
+
+    def check(self, page):
+        if self.last_open_time is not None:
+            page = [kline for kline in page if kline[0] > self.last_open_time]
+        for kline in page:
+            if (
+                self.last_open_time is not None
+                and kline[0] - self.last_open_time != self.interval_ms
+            ):
+                self.gaps += 1
+                logger.debug(
+                    f"Gap in klines: {self.last_open_time // 1000}-{kline[0] // 1000}"
+                )
+            self.last_open_time = kline[0]
+        return page
+
+
+async def iter_pages(
+    fetch_page,
+    start_time,
+    end_time,
+    interval_seconds,
+    limit,
+    concurrency=8,
+    failures=None,
+):
+    # fetch_page(start_time, end_time) returns a list of klines, or None when
+    # the request failed. The first page is fetched alone to find where the
+    # data actually starts, then the rest of the range is split in pages of
+    # `limit` bars. Up to `concurrency` pages are fetched ahead while pages
+    # are yielded in order. The (start, end) of failed pages are appended to
+    # `failures` if given.
+    first = await fetch_page(start_time, end_time)
+    if first is None:
+        if failures is not None:
+            failures.append((start_time, end_time))
+        return
+    checker = PageChecker(interval_seconds)
+    if len(first) > 0:
+        yield checker.check(first)
+    if len(first) < limit:
+        return
+
+    end_time = time.time() if end_time is None else end_time
+    page_seconds = limit * interval_seconds
+    boundaries = [
+        (start, min(start + page_seconds - interval_seconds, end_time))
+        for start in range(
+            first[-1][0] // 1000 + interval_seconds, int(end_time) + 1, page_seconds
+        )
+    ]
+    logger.debug(f"Fetching {len(boundaries)} pages, {concurrency} at a time")
+
+    async def checked_fetch(start, end):
+        page = await fetch_page(start, end)
+        if page is None:
+            logger.warning(f"Missing klines page {start}-{end}")
+            if failures is not None:
+                failures.append((start, end))
+        return page or []
+
+    pending = deque()
+    try:
+        for start, end in boundaries:
+            if len(pending) >= concurrency:
+                page = checker.check(await pending.popleft())
+                if len(page) > 0:
+                    yield page
+            pending.append(asyncio.ensure_future(checked_fetch(start, end)))
+        while pending:
+            page = checker.check(await pending.popleft())
+            if len(page) > 0:
+                yield page
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if checker.gaps > 0:
+        logger.warning(f"{checker.gaps} gaps in klines")
+
+
+async def iter_id_pages(fetch_page, from_id, last_id, limit, concurrency=8):
+    # fetch_page(from_id) returns up to `limit` records with consecutive ids
+    # starting at from_id, or None when the request failed. Pages up to
+    # last_id are fetched `concurrency` ahead and yielded in order, stopping
+    # at the first failed page so the caller can resume from the last id it
+    # got.
+    async def checked_fetch(page_id):
+        page = await fetch_page(page_id)
+        if page is None:
+            logger.warning(f"Missing page from id {page_id}, stopping")
+        return page
+
+    pending = deque()
+    try:
+        for page_id in range(from_id, last_id + 1, limit):
+            if len(pending) >= concurrency:
+                page = await pending.popleft()
+                if page is None:
+                    return
+                if len(page) > 0:
+                    yield page
+            pending.append(asyncio.ensure_future(checked_fetch(page_id)))
+        while pending:
+            page = await pending.popleft()
+            if page is None:
+                return
+            if len(page) > 0:
+                yield page
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def first_agg_trade_id(fetch_page, start_time):
+    # Id of the first aggregate trade at or after start_time, None if there
+    # is none or a request failed. fetch_page(from_id, start_time, end_time,
+    # limit) is the provider aggTrades request, which only searches an hour
+    # past startTime, so quiet hours are stepped over one at a time.
+    first = await fetch_page(from_id=0, limit=1)
+    if first is None or len(first) == 0:
+        return None
+    if first[0]["T"] >= start_time * 1000:
+        return first[0]["a"]
+    while start_time < time.time():
+        page = await fetch_page(
+            start_time=start_time, end_time=start_time + 3600 - 0.001, limit=1
+        )
+        if page is None:
+            return None
+        if len(page) > 0:
+            return page[0]["a"]
+        start_time += 3600
+    return None
@@ -0,0 +1,216 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {
+    "SECOND": (1, "s"),
+    "MINUTE": (60, "m"),
+    "HOUR": (3600, "h"),
+    "DAY": (86400, "d"),
+}
+HEADERS = {
+    "REQUEST_WEIGHT": "x-mbx-used-weight-{}",
+    "ORDERS": "x-mbx-order-count-{}",
+}
+
+
+class TokenBucket(object):
+    def __init__(self, limit, period, header=None, threshold=0.9):
+        self.limit = limit
+        self.period = period
+        self.header = header
+        self.capacity = threshold * limit
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost):
+        self._refill()
+        cost = min(cost, self.capacity)
+        return 0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost):
+        self.tokens -= cost
+
+    def reconcile(self, used):
+        # The server count is authoritative, never hold more than it allows
+        self._refill()
+        if used > self.capacity - self.tokens:
+            logger.debug(f"Used {used}/{self.limit} on {self.header}")
+            self.tokens = self.capacity - used
+
+
+class WindowCounter(object):
+    # Order limits are counted in fixed windows aligned to the epoch, a token
+    # bucket would let a burst plus its refill through within one window
+    def __init__(self, limit, period, header=None, threshold=0.9):
+        self.limit = limit
+        self.period = period
+        self.header = header
+        self.capacity = threshold * limit
+        self.window = 0
+        self.used = 0
+
+    def _roll(self):
+        window = int(time.time() // self.period)
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+    def wait_time(self, cost):
+        self._roll()
+        if self.used + min(cost, self.capacity) <= self.capacity:
+            return 0
+        return (self.window + 1) * self.period - time.time()
+
+    def take(self, cost):
+        self.used += cost
+
+    def reconcile(self, used):
+        self._roll()
+        if used > self.used:
+            logger.debug(f"Used {used}/{self.limit} on {self.header}")
+            self.used = used
+
+
+class RateLimitedAsyncClient(httpx.AsyncClient):
+    # Token buckets per exchange rate limit, a cap on requests in flight that
+    # halves on 429/418 and grows back by one per `concurrency` successes, and
+    # a global pause honouring Retry-After. Throttled requests are retried;
+    # for signed ones `sign` returns the query string and is called again on
+    # every attempt, as a retry after a pause would be outside recvWindow.
+    RATE_LIMIT_THRESHOLD = 0.9
+    MAX_RETRIES = 5
+
+    def __init__(self, *args, max_concurrency=16, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = {}
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.blocked_until = 0
+        self.lock = asyncio.Lock()
+        self.condition = asyncio.Condition()
+
+    def add_rate_limit(self, limit_type, limit, interval, interval_num=1):
+        seconds, letter = INTERVALS[interval]
+        header = HEADERS.get(limit_type)
+        bucket = WindowCounter if limit_type == "ORDERS" else TokenBucket
+        self.buckets[(limit_type, interval_num * seconds)] = bucket(
+            limit,
+            interval_num * seconds,
+            header.format(f"{interval_num}{letter}") if header else None,
+            RateLimitedAsyncClient.RATE_LIMIT_THRESHOLD,
+        )
+
+    def set_rate_limits(self, rate_limits):
+        for limit in rate_limits:
+            self.add_rate_limit(
+                limit["rateLimitType"],
+                limit["limit"],
+                limit["interval"],
+                limit["intervalNum"],
+            )
+
+    def _cost(self, limit_type, weight, orders):
+        return {"REQUEST_WEIGHT": weight, "RAW_REQUESTS": 1, "ORDERS": orders}.get(
+            limit_type, 0
+        )
+
+    async def _acquire_tokens(self, weight, orders):
+        while True:
+            async with self.lock:
+                costs = {
+                    key: self._cost(key[0], weight, orders) for key in self.buckets
+                }
+                wait = max(
+                    [self.blocked_until - time.monotonic()]
+                    + [
+                        self.buckets[key].wait_time(cost)
+                        for key, cost in costs.items()
+                        if cost > 0
+                    ]
+                )
+                if wait <= 0:
+                    for key, cost in costs.items():
+                        self.buckets[key].take(cost)
+                    return
+            if wait > 1:
+                logger.warning(f"Rate limit almost reached, waiting {wait:.1f}s...")
+            await asyncio.sleep(wait)
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def _reconcile(self, headers):
+        for bucket in self.buckets.values():
+            if bucket.header is not None and bucket.header in headers:
+                bucket.reconcile(int(headers[bucket.header]))
+
+    async def _adapt(self, throttled):
+        async with self.condition:
+            if throttled:
+                self.concurrency = max(1, self.concurrency // 2)
+                self.successes = 0
+            elif self.concurrency < self.max_concurrency:
+                self.successes += 1
+                if self.successes >= self.concurrency:
+                    self.concurrency += 1
+                    self.successes = 0
+                    self.condition.notify_all()
+
+    async def request(
+        self, method, url, *args, weight=1, orders=0, sign=None, **kwargs
+    ):
+        for _ in range(RateLimitedAsyncClient.MAX_RETRIES):
+            await self._acquire_tokens(weight, orders)
+            async with self._slot():
+                target = url if sign is None else f"{url}?{sign()}"
+                response = await super().request(method, target, *args, **kwargs)
+            self._reconcile(response.headers)
+
+            throttled = response.status_code in (418, 429)
+            await self._adapt(throttled)
+            if not throttled:
+                break
+
+            retry_after = float(response.headers.get("Retry-After", 60))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            logger.warning(
+                f"Rate limit reached (HTTP {response.status_code}), pausing "
+                f"{retry_after:.0f}s with concurrency {self.concurrency}"
+            )
+        return response
+
+    async def get(self, url, *args, weight=1, **kwargs):
+        return await self.request("GET", url, *args, weight=weight, **kwargs)
+
+    async def post(self, url, *args, weight=1, orders=0, **kwargs):
+        return await self.request(
+            "POST", url, *args, weight=weight, orders=orders, **kwargs
+        )
+
+    async def delete(self, url, *args, weight=1, orders=0, **kwargs):
+        return await self.request(
+            "DELETE", url, *args, weight=weight, orders=orders, **kwargs
+        )
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+import websockets
+
+from ladon.latency import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Streams per connection, the exchanges accept up to 1024
+MAX_STREAMS = 200
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 60
+
+
+def rest_update(kline):
+    return {
+        "id": kline[0] // 1000,
+        "o": float(kline[1]),
+        "h": float(kline[2]),
+        "l": float(kline[3]),
+        "c": float(kline[4]),
+        "v": float(kline[5]),
+        "v2": float(kline[7]),
+    }
+
+
+def stream_update(kline):
+    return {
+        "id": kline["t"] // 1000,
+        "o": float(kline["o"]),
+        "h": float(kline["h"]),
+        "l": float(kline["l"]),
+        "c": float(kline["c"]),
+        "v": float(kline["v"]),
+        "v2": float(kline["q"]),
+    }
+
+
+# Keeps a dict of symbol -> Candlestick up to date from combined kline
+# streams, `max_streams` symbols per connection. Providers supply
+# stream_name(symbol, interval) and backfill(symbol, interval, start_time),
+# an async iterator of REST kline pages. After every (re)connect the bars
+# since the last one held are backfilled before live updates are read, so a
+# disconnect never leaves a hole. on_close(symbol, open_time) is called once
+# per completed bar.
+class KlineStream(object):
+    def __init__(
+        self,
+        url,
+        stream_name,
+        backfill,
+        candlesticks,
+        interval="1m",
+        on_close=None,
+        max_streams=MAX_STREAMS,
+    ):
+        self.url = url
+        self.stream_name = stream_name
+        self.backfill = backfill
+        self.candlesticks = candlesticks
+        self.interval = interval
+        self.on_close = on_close
+        self.max_streams = max_streams
+        # Exchange event time to applied (includes clock offset), and time
+        # spent handling each message
+        self.latency = LatencyStats()
+        self.processing = LatencyStats()
+        self.reconnects = 0
+        self._closed = {}
+        self._running = False
+        self._websockets = set()
+
+    async def run(self):
+        symbols = list(self.candlesticks)
+        self._running = True
+        await asyncio.gather(
+            *(
+                self._connection(symbols[i : i + self.max_streams])
+                for i in range(0, len(symbols), self.max_streams)
+            )
+        )
+
+    async def stop(self):
+        self._running = False
+        for websocket in list(self._websockets):
+            await websocket.close()
+
+    async def _connection(self, symbols):
+        url = f"{self.url}/stream?streams=" + "/".join(
+            self.stream_name(symbol, self.interval) for symbol in symbols
+        )
+        delay = RECONNECT_DELAY
+        while self._running:
+            try:
+                async with websockets.connect(url) as websocket:
+                    self._websockets.add(websocket)
+                    try:
+                        await self._backfill(symbols)
+                        delay = RECONNECT_DELAY
+                        async for message in websocket:
+                            self._handle(message)
+                    finally:
+                        self._websockets.discard(websocket)
+            except (
+                OSError,
+                asyncio.TimeoutError,
+                httpx.TransportError,
+                websockets.exceptions.WebSocketException,
+            ) as e:
+                logger.warning(f"Kline stream error: {e!r}")
+            if self._running:
+                self.reconnects += 1
+                logger.info(f"Reconnecting {len(symbols)} streams in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, MAX_RECONNECT_DELAY)
+
+    async def _backfill(self, symbols):
+        async def backfill_symbol(symbol):
+            candlestick = self.candlesticks[symbol]
+            if len(candlestick.np_array) == 0:
+                return
+            start_time = int(candlestick.np_array[-1, 0])
+            now = time.time() * 1000
+            async for page in self.backfill(symbol, self.interval, start_time):
+                for kline in page:
+                    candlestick.update_candlestick(rest_update(kline))
+                    if kline[6] < now:
+                        self._bar_closed(symbol, kline[0] // 1000)
+
+        await asyncio.gather(*map(backfill_symbol, symbols))
+
+    def _bar_closed(self, symbol, open_time):
+        if open_time > self._closed.get(symbol, -1):
+            self._closed[symbol] = open_time
+            if self.on_close is not None:
+                self.on_close(symbol, open_time)
+
+    def _handle(self, message):
+        received = time.perf_counter()
+        data = json.loads(message)["data"]
+        # Continuous contract streams name the pair instead of the symbol
+        symbol = data["s"] if "s" in data else data["ps"]
+        candlestick = self.candlesticks.get(symbol)
+        if candlestick is None:
+            return
+
+        kline = data["k"]
+        candlestick.update_candlestick(stream_update(kline))
+        if kline["x"]:
+            self._bar_closed(symbol, kline["t"] // 1000)
+
+        self.latency.add(time.time() * 1000 - data["E"])
+        self.processing.add_since(received)
@@ -0,0 +1,125 @@
+import logging
+import time
+
+import numpy as np
+
+from ladon.base import INTERVAL_OFFSETS, INTERVALS_MAP, resample_array
+from ladon.cache import CandleCache
+from ladon.database import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+SOURCE_INTERVAL = "1m"
+
+
+def rollup_intervals():
+    source = INTERVALS_MAP[SOURCE_INTERVAL]
+    return [
+        interval
+        for interval, sampling in INTERVALS_MAP.items()
+        if sampling > source and sampling % source == 0
+    ]
+
+
+def bucket_start(timestamp, interval):
+    sampling = INTERVALS_MAP[interval]
+    offset = INTERVAL_OFFSETS.get(interval, 0)
+    return (timestamp - offset) // sampling * sampling + offset
+
+
+def _write(database, provider, symbol, interval, array):
+    database.add_candlesticks(
+        provider,
+        symbol,
+        interval,
+        {int(row[0]): (*row[1:], None) for row in array.tolist()},
+    )
+
+
+# Materialize every interval in `intervals` from the stored 1m candles of a
+# symbol. Only buckets from the last rolled one (which may have been partial)
+# or from the bucket holding `since` onwards are recomputed, and dropped from
+# `cache` if given. Returns the first rewritten bucket per interval.
+def rollup(
+    database,
+    provider,
+    symbol,
+    intervals=None,
+    since=None,
+    cache=None,
+    chunk_size=65536,
+):
+    intervals = rollup_intervals() if intervals is None else intervals
+
+    starts = {}
+    for interval in intervals:
+        last = database.get_candlestick(provider, symbol, interval)
+        start = last[0] // 1000 if last is not None else None
+        if start is not None and since is not None:
+            start = min(start, bucket_start(since, interval))
+        starts[interval] = start
+    if len(starts) == 0:
+        return {}
+
+    # The rows of each interval's last, possibly incomplete, bucket are held
+    # back and prepended to the next chunk
+    pending = {interval: np.empty((0, 7)) for interval in intervals}
+    first = {}
+    with database.bulk():
+        for chunk in database.iter_candlesticks(
+            provider,
+            symbol,
+            SOURCE_INTERVAL,
+            start=None if None in starts.values() else min(starts.values()),
+            chunk_size=chunk_size,
+        ):
+            for interval in intervals:
+                rows = chunk
+                if starts[interval] is not None:
+                    rows = chunk[np.searchsorted(chunk[:, 0], starts[interval]) :]
+                rows = np.concatenate((pending[interval], rows))
+                if len(rows) == 0:
+                    continue
+                array = resample_array(
+                    rows,
+                    INTERVALS_MAP[interval],
+                    offset=INTERVAL_OFFSETS.get(interval, 0),
+                    fill=False,
+                )
+                pending[interval] = rows[np.searchsorted(rows[:, 0], array[-1, 0]) :]
+                if len(array) > 1:
+                    first.setdefault(interval, int(array[0, 0]))
+                    _write(database, provider, symbol, interval, array[:-1])
+
+        for interval in intervals:
+            if len(pending[interval]) > 0:
+                array = resample_array(
+                    pending[interval],
+                    INTERVALS_MAP[interval],
+                    offset=INTERVAL_OFFSETS.get(interval, 0),
+                    fill=False,
+                )
+                first.setdefault(interval, int(array[0, 0]))
+                _write(database, provider, symbol, interval, array)
+
+    if cache is not None:
+        for interval, timestamp in first.items():
+            cache.invalidate(provider, interval, symbol, since=timestamp)
+    return first
+
+
+def rollup_all(provider_name, symbols=None, intervals=None, since=None):
+    database = SqliteDatabase(ingest=True)
+    cache = CandleCache()
+
+    if symbols is None:
+        info = database.get_provider_info(provider_name)
+        symbols = [symbol["symbol"] for symbol in info["symbols"]]
+
+    start_time = time.perf_counter()
+    for symbol in symbols:
+        first = rollup(database, provider_name, symbol, intervals, since, cache)
+        logger.debug(f"Rolled up {symbol} from {first}")
+    logger.info(
+        f"Rolled up {len(symbols)} symbols in {time.perf_counter() - start_time:.2f}s"
+    )
@@ -1,12 +1,17 @@
 # Simple Buy and Hold strategy
 import numpy as np
 
+from ladon.base import Panel, as_panel
+
+CLOSE = Panel.FIELDS.index("close")
+
 
 def step(candlesticks, window=None, **kwargs):
+    panel = as_panel(candlesticks)
     if window is None:
-        window = max(len(candlesticks[s]) for s in candlesticks)
+        window = len(panel.times)
 
-    closes = np.array([c.close(slice(-window, None)) for c in candlesticks])
+    closes = panel.close(slice(-window, None))
     weights = np.zeros_like(closes)
 
     weights[~np.isnan(closes)] = 1.0
@@ -17,3 +22,20 @@ def step(candlesticks, window=None, **kwargs):
     )
 
     return weights
+
+
+def lookback(**kwargs):
+    return 0
+
+
+def init_state(symbols, **kwargs):
+    return {}
+
+
+def on_bar(state, bar):
+    weights = np.zeros_like(bar[CLOSE])
+
+    weights[~np.isnan(bar[CLOSE])] = 1.0
+
+    total_sum = np.nansum(np.abs(weights))
+    return weights / total_sum if total_sum != 0 else np.zeros_like(weights)
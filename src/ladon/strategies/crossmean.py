@@ -1,19 +1,24 @@
 # Simple Cross sectional mean return strategy
 import numpy as np
 
+from ladon.base import Panel, as_panel
+
+CLOSE = Panel.FIELDS.index("close")
+
 
 def returns(candles, window, delta=1):
-    closes = np.array([kl.close(slice(-window - delta, None)) for kl in candles])
+    closes = as_panel(candles).close(slice(-window - delta, None))
     return (
         np.diff([closes[:, :-delta], closes[:, delta:]], axis=0)[0] / closes[:, :-delta]
     )
 
 
 def step(candlesticks, window=None):
+    panel = as_panel(candlesticks)
     if window is None:
-        window = max(len(candle) for candle in candlesticks)
+        window = len(panel.times)
 
-    all_rets = returns(candlesticks, window)
+    all_rets = returns(panel, window)
     index_rets = np.nanmean(all_rets, axis=0)
     weights = index_rets - all_rets
 
@@ -23,3 +28,23 @@ def step(candlesticks, window=None):
     )
 
     return weights
+
+
+def lookback():
+    # The close before the window, for the first return
+    return 1
+
+
+def init_state(symbols):
+    return {"closes": np.full(len(symbols), np.nan)}
+
+
+def on_bar(state, bar):
+    closes = bar[CLOSE]
+    all_rets = (closes - state["closes"]) / state["closes"]
+    state["closes"] = closes
+    index_rets = np.nanmean(all_rets)
+    weights = index_rets - all_rets
+
+    total_sum = np.nansum(np.abs(weights))
+    return weights / total_sum if total_sum != 0 else np.zeros_like(weights)
@@ -1,33 +1,20 @@
 # Simple MA Cross strategy
 import numpy as np
 
+from ladon import indicators
+from ladon.base import Panel, as_panel
+
+CLOSE = Panel.FIELDS.index("close")
+
 
 def step(candlesticks, fast_length=20, slow_length=200, window=None):
+    panel = as_panel(candlesticks)
     if window is None:
-        window = max(len(candle) for candle in candlesticks)
-    ma_fast = np.array(
-        [
-            np.convolve(
-                c.close(slice(-window - fast_length + 1, None)),
-                np.ones(fast_length),
-                mode="full",
-            )[:window]
-            / fast_length
-            for c in candlesticks
-        ]
-    )
-    ma_slow = np.array(
-        [
-            np.convolve(
-                c.close(slice(-window - slow_length + 1, None)),
-                np.ones(slow_length),
-                mode="full",
-            )[:window]
-            / slow_length
-            for c in candlesticks
-        ]
-    )
-    weights = np.ones((len(candlesticks), len(candlesticks[0]))) / len(candlesticks)
+        window = len(panel.times)
+    closes = panel.close(slice(-window - max(fast_length, slow_length) + 1, None))
+    ma_fast = indicators.rolling_mean(closes, fast_length)[:, -window:]
+    ma_slow = indicators.rolling_mean(closes, slow_length)[:, -window:]
+    weights = np.ones((len(panel), window)) / len(panel)
     weights[ma_fast < ma_slow] = 0.0
 
     # Normalize weights
@@ -39,3 +26,35 @@ def step(candlesticks, fast_length=20, slow_length=200, window=None):
     )
 
     return weights
+
+
+def lookback(fast_length=20, slow_length=200):
+    return max(fast_length, slow_length) - 1
+
+
+def init_state(symbols, fast_length=20, slow_length=200):
+    return {
+        "ma_fast": indicators.RollingMean(fast_length, shape=(len(symbols),)),
+        "ma_slow": indicators.RollingMean(slow_length, shape=(len(symbols),)),
+    }
+
+
+def update_indicators(state, bar):
+    state["ma_fast"].update(bar[CLOSE])
+    state["ma_slow"].update(bar[CLOSE])
+
+
+def target_weights(state):
+    ma_fast = state["ma_fast"].value
+    ma_slow = state["ma_slow"].value
+    weights = np.ones(len(ma_fast)) / len(ma_fast)
+    weights[ma_fast < ma_slow] = 0.0
+
+    # Normalize weights
+    total_sum = np.sum(weights)
+    return weights / total_sum if total_sum != 0 else np.zeros_like(weights)
+
+
+def on_bar(state, bar):
+    update_indicators(state, bar)
+    return target_weights(state)
@@ -1,25 +1,16 @@
 # Multi timeframe MA+BB strategy
 import numpy as np
 
+from ladon import indicators
+from ladon.base import Panel, as_panel
+
+CLOSE = Panel.FIELDS.index("close")
+
 
 def bb_zscore(candles, window, period):
     if period is not None:
-        closes = np.array([c.close(slice(-window - period + 1, None)) for c in candles])
-        bb_ma = np.array(
-            [np.convolve(c, np.ones(period), mode="valid") / period for c in closes]
-        )
-        bb_std = np.array(
-            [
-                np.std(closes[:, i - period : i], axis=1)
-                for i in range(period, window + period)
-            ]
-        ).T
-        zscore = np.divide(
-            closes[:, period - 1 :] - bb_ma,
-            bb_std,
-            out=np.zeros((len(candles), window)),
-            where=bb_std != 0,
-        )
+        closes = candles.close(slice(-window - period + 1, None))
+        zscore = indicators.rolling_zscore(closes, period)[:, period - 1 :]
     else:
         zscore = 0
 
@@ -33,13 +24,14 @@ def step(
     time_coef=0.8,
     window=None,
 ):
+    panel = as_panel(candlesticks)
     if window is None:
-        window = max(len(candle) for candle in candlesticks)
+        window = len(panel.times)
 
     partial_weights = []
     coef = 1.0
     for period in periods:
-        zscore = bb_zscore(candlesticks, window, period)
+        zscore = bb_zscore(panel, window, period)
         partial_weights.append(coef * (-1 * np.power(zscore, 3) + width_coef * zscore))
         coef *= time_coef
 
@@ -54,3 +46,49 @@ def step(
     )
 
     return weights
+
+
+def lookback(periods=[20, 80, 320, 1280], width_coef=4, time_coef=0.8):
+    # Bars before the window the longest z-score reaches back
+    return max((period - 1 for period in periods if period is not None), default=0)
+
+
+def init_state(symbols, periods=[20, 80, 320, 1280], width_coef=4, time_coef=0.8):
+    return {
+        "zscores": [
+            indicators.RollingZScore(period, shape=(len(symbols),))
+            for period in periods
+            if period is not None
+        ],
+        "width_coef": width_coef,
+        "time_coef": time_coef,
+    }
+
+
+def update_indicators(state, bar):
+    for indicator in state["zscores"]:
+        indicator.update(bar[CLOSE])
+
+
+def target_weights(state):
+    partial_weights = []
+    coef = 1.0
+    for indicator in state["zscores"]:
+        zscore = indicator.value
+        partial_weights.append(
+            coef * (-1 * np.power(zscore, 3) + state["width_coef"] * zscore)
+        )
+        coef *= state["time_coef"]
+
+    weights = np.nansum(partial_weights, axis=0)
+
+    weights[weights < 0] = 0
+
+    # Normalize weights
+    total_sum = np.sum(np.abs(weights))
+    return weights / total_sum if total_sum != 0 else np.zeros_like(weights)
+
+
+def on_bar(state, bar):
+    update_indicators(state, bar)
+    return target_weights(state)
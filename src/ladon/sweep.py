@@ -0,0 +1,189 @@
+import ast
+import csv
+import itertools
+import json
+import logging
+import random
+import sqlite3
+import time
+import warnings
+from importlib import import_module
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from ladon import metrics
+from ladon.backtest import calc_returns, load_candlesticks
+from ladon.base import Panel
+
+logger = logging.getLogger(__name__)
+
+# Per worker state, set up once by _attach
+_worker = {}
+
+
+def parse_space(specs):
+    # "name=[v1, v2, ...]" (or a single literal) for every parameter
+    space = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        values = ast.literal_eval(values)
+        space[name.strip()] = values if isinstance(values, list) else [values]
+    return space
+
+
+def combinations(space, samples=None, seed=None):
+    names = list(space)
+    if samples is None:
+        for values in itertools.product(*(space[name] for name in names)):
+            yield dict(zip(names, values))
+    else:
+        rng = random.Random(seed)
+        for _ in range(samples):
+            yield {name: rng.choice(space[name]) for name in names}
+
+
+def _probe_lookback(strategy, **params):
+    # Padding step() reserves on a one bar panel, for strategies that do not
+    # declare lookback()
+    panel = Panel(
+        ["PROBE"],
+        np.zeros(1, dtype=np.int64),
+        np.full((len(Panel.FIELDS), 1, 1), np.nan),
+    )
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        strategy.step(panel, window=1, **params)
+    return panel.padding
+
+
+def padding(strategy, param_sets):
+    # Bars before the first one that step() and calc_returns() read for any
+    # of the combinations. Reserved up front, since a worker reserving more
+    # would swap the shared panel data for a private copy.
+    if hasattr(strategy, "lookback"):
+        lookbacks = [strategy.lookback(**params) for params in param_sets]
+    else:
+        lookbacks = [_probe_lookback(strategy, **params) for params in param_sets]
+    return max([1] + lookbacks)
+
+
+def _attach(shm_name, shape, symbols, times, padding, strategy_name, interval):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _worker.update(
+        shm=shm,
+        panel=Panel(symbols, times, data, padding),
+        strategy=import_module(f"ladon.strategies.{strategy_name}"),
+        interval=interval,
+    )
+
+
+def _score(params):
+    panel = _worker["panel"]
+    window = len(panel.times)
+    weights = _worker["strategy"].step(panel, window=window, **params)
+    strategy_returns, _, _ = calc_returns(panel, weights, window)
+    report = metrics.summary(strategy_returns, _worker["interval"], weights[..., 1:])
+    return params, {name: float(value) for name, value in report.items()}
+
+
+class CsvResults(object):
+    def __init__(self, filename):
+        self.file = open(filename, "w", newline="")
+        self.writer = None
+
+    def write(self, params, report):
+        row = {name: json.dumps(value) for name, value in params.items()}
+        row.update(report)
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(row))
+            self.writer.writeheader()
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SqliteResults(object):
+    def __init__(self, filename, strategy):
+        self.strategy = strategy
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS sweep_results ("
+            "strategy TEXT NOT NULL,"
+            "params JSON NOT NULL,"
+            "report JSON NOT NULL)"
+        )
+
+    def write(self, params, report):
+        self.connection.execute(
+            "INSERT INTO sweep_results VALUES (:strategy, :params, :report)",
+            {
+                "strategy": self.strategy,
+                "params": json.dumps(params),
+                "report": json.dumps(report),
+            },
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def sweep(
+    provider_name,
+    period,
+    strategy_name,
+    space,
+    output,
+    symbols=None,
+    samples=None,
+    seed=None,
+    jobs=None,
+):
+    strategy = import_module(f"ladon.strategies.{strategy_name}")
+    param_sets = list(combinations(space, samples, seed))
+    panel = Panel.from_candlesticks(load_candlesticks(provider_name, period, symbols))
+    panel.reserve(padding(strategy, param_sets))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(panel.data.nbytes, 1))
+    try:
+        data = np.ndarray(panel.data.shape, dtype=np.float64, buffer=shm.buf)
+        data[:] = panel.data
+
+        if output.endswith(".db"):
+            results = SqliteResults(output, strategy_name)
+        else:
+            results = CsvResults(output)
+
+        start_time = time.perf_counter()
+        count = 0
+        with Pool(
+            jobs,
+            initializer=_attach,
+            initargs=(
+                shm.name,
+                data.shape,
+                panel.symbols,
+                panel.times,
+                panel.padding,
+                strategy_name,
+                period,
+            ),
+        ) as pool:
+            for scored, report in pool.imap_unordered(_score, param_sets):
+                results.write(scored, report)
+                count += 1
+                logger.info(f"{scored}: sharpe {report['sharpe']:.3f}")
+        results.close()
+
+        elapsed = time.perf_counter() - start_time
+        print(
+            f"Scored {count} combinations in {elapsed:.1f}s "
+            f"({3600 * count / max(elapsed, 1e-9):.0f}/h)"
+        )
+    finally:
+        shm.close()
+        shm.unlink()
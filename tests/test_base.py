@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+from ladon.base import Candlestick
+
+START = 1500000000
+
+
+def bar(time, close):
+    return {
+        "id": time,
+        "o": close,
+        "h": close + 1,
+        "l": close - 1,
+        "c": close,
+        "v": 2.0,
+        "v2": 2.0 * close,
+    }
+
+
+def reference(bars, max_history=None):
+    # The original dict of rows, dropping the oldest time once over max_history
+    rows = {}
+    for data in bars:
+        rows[data["id"]] = tuple(data[k] for k in ("id", "o", "h", "l", "c", "v", "v2"))
+        if max_history is not None and len(rows) > max_history:
+            del rows[min(rows)]
+    return [rows[time] for time in sorted(rows)]
+
+
+def bars(order, count=600, seed=0):
+    rng = np.random.default_rng(seed)
+    times = START + 60 * np.arange(count)
+    if order == "shuffled":
+        times = rng.permutation(times)
+    elif order == "duplicates":
+        # Mostly in order with late bars and repeats, like a websocket feed
+        times = np.concatenate((times, rng.choice(times, count // 4)))
+        times = times[np.argsort(np.arange(len(times)) + rng.normal(0, 20, len(times)))]
+    return [bar(int(t), 100.0 + i) for i, t in enumerate(times)]
+
+
+@pytest.mark.parametrize("max_history", [None, 1, 50, 1000])
+@pytest.mark.parametrize("order", ["sorted", "shuffled", "duplicates"])
+def test_appends_match_reference(order, max_history):
+    data = bars(order)
+    candlestick = Candlestick("BTCUSDT", max_history=max_history)
+    for i, candle in enumerate(data):
+        candlestick.append_candlestick(dict(candle))
+        if i % 97 == 0:
+            expected = reference(data[: i + 1], max_history)
+            np.testing.assert_array_equal(candlestick.np_array, expected)
+
+    expected = reference(data, max_history)
+    assert len(candlestick) == len(expected)
+    assert list(candlestick) == expected
+    np.testing.assert_array_equal(candlestick.np_array, expected)
+    assert candlestick[0] == expected[0]
+    assert candlestick[-1] == expected[-1]
+    assert candlestick[-3:] == expected[-3:]
+    assert candlestick[1:10:2] == expected[1:10:2]
+    np.testing.assert_array_equal(candlestick.close(), [row[4] for row in expected])
+
+
+def test_array_stats():
+    candlestick = Candlestick("BTCUSDT")
+    for i in range(300):
+        candlestick.append_candlestick(bar(START + 60 * i, 100.0))
+    # In place updates of the in-progress bar
+    candlestick.update_candlestick(bar(START + 60 * 299, 101.0))
+    candlestick.update_candlestick(bar(START + 60 * 299, 102.0))
+    # A late bar in the middle
+    candlestick.append_candlestick(bar(START + 60 * 100 + 30, 100.0))
+    assert candlestick.array_stats == {"append": 300, "update": 2, "rebuild": 1}
+    assert candlestick[-1][4] == 102.0
+
+
+def test_np_array_is_a_live_view():
+    candlestick = Candlestick("BTCUSDT", max_history=3)
+    for i in range(5):
+        candlestick.append_candlestick(bar(START + 60 * i, 100.0 + i))
+    array = candlestick.np_array
+    assert not array.flags.writeable
+    np.testing.assert_array_equal(array[:, 4], [102, 103, 104])
+    candlestick.update_candlestick(bar(START + 60 * 4, 110.0))
+    assert array[-1, 4] == 110.0
+
+
+def test_zero_bars_are_skipped():
+    candlestick = Candlestick("BTCUSDT")
+    candlestick.append_candlestick({**bar(START, 100.0), "v": 0, "v2": 0})
+    assert len(candlestick) == 0
+    assert candlestick.np_array.shape == (0, 7)
+
+
+@pytest.mark.parametrize("copy", [True, False])
+@pytest.mark.parametrize("count", [0, 10])
+def test_from_array_then_append(copy, count):
+    array = np.array(reference([bar(START + 60 * i, 100.0 + i) for i in range(count)]))
+    array = array.reshape(-1, 7)
+    candlestick = Candlestick.from_array("BTCUSDT", array, copy=copy)
+    data = [bar(START + 60 * i, 100.0 + i) for i in range(count, count + 300)]
+    for candle in data:
+        candlestick.append_candlestick(dict(candle))
+    np.testing.assert_array_equal(candlestick.np_array[count:], reference(data))
+    np.testing.assert_array_equal(candlestick.np_array[:count], array)
+
+
+def test_resample_forward_fills():
+    candlestick = Candlestick(
+        "BTCUSDT",
+        init=[bar(START, 100.0), bar(START + 60, 101.0), bar(START + 300, 103.0)],
+    )
+    candlestick.resample(120)
+    first = (START // 120) * 120
+    expected = [
+        [first, 100.0, 102.0, 99.0, 101.0, 4.0, 402.0],
+        [first + 120, 101.0, 101.0, 101.0, 101.0, 0.0, 0.0],
+        [first + 240, 103.0, 104.0, 102.0, 103.0, 2.0, 206.0],
+    ]
+    np.testing.assert_array_equal(candlestick.np_array, expected)
+    assert len(candlestick) == 3
+    assert candlestick[1] == expected[1]
+    assert list(candlestick) == expected
+
+    # Appends invalidate the cached resampled array
+    candlestick.append_candlestick(bar(START + 420, 104.0))
+    assert candlestick[-1] == [first + 360, 104.0, 105.0, 103.0, 104.0, 2.0, 208.0]
+    candlestick.resample(None)
+    assert len(candlestick) == 4
+
+
+def test_append_trades_merges_into_bar_in_progress():
+    rng = np.random.default_rng(0)
+    ts = np.sort(rng.integers(START * 1000, (START + 300) * 1000, 1000))
+    px = 100 + np.cumsum(rng.normal(0, 0.1, len(ts)))
+    qty = rng.random(len(ts))
+
+    whole = Candlestick("BTCUSDT")
+    whole.append_trades(ts, px, qty)
+    # Split in the middle of a minute, so the second batch continues a bar
+    split = np.searchsorted(ts, (START + 150) * 1000)
+    batched = Candlestick("BTCUSDT")
+    batched.append_trades(ts[:split], px[:split], qty[:split])
+    batched.append_trades(ts[split:], px[split:], qty[split:])
+    np.testing.assert_allclose(batched.np_array, whole.np_array)
+
+    minute = ts // 60000
+    for row, bucket in zip(whole.np_array, np.unique(minute)):
+        in_bar = minute == bucket
+        assert row[0] == bucket * 60
+        np.testing.assert_allclose(
+            row[1:],
+            [
+                px[in_bar][0],
+                px[in_bar].max(),
+                px[in_bar].min(),
+                px[in_bar][-1],
+                qty[in_bar].sum(),
+                (qty[in_bar] * px[in_bar]).sum(),
+            ],
+        )
+
+    # A single trade adds to the last bar rather than replacing it
+    batched.append_trade({"ts": ts[-1], "px": 1000.0, "qty": 1.0})
+    assert batched[-1][1] == whole[-1][1]
+    assert batched[-1][2] == 1000.0
+    assert batched[-1][5] == pytest.approx(whole[-1][5] + 1.0)
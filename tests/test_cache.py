@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from ladon.cache import CandleCache
+from ladon.database import SqliteDatabase
+
+TIMESTAMPS = range(1500000000, 1500000000 + 60 * 100, 60)
+
+
+def bars(timestamps, close=100.0):
+    return {t: (close, close + 1, close - 1, close, 1.0, close, []) for t in timestamps}
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = SqliteDatabase(str(tmp_path / "ladon.db"))
+    database.add_candlesticks("binance", "BTCUSDT", "1m", bars(TIMESTAMPS))
+    yield database
+    database.connection.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CandleCache(str(tmp_path / "cache"))
+
+
+def load(cache, db):
+    return cache.load(db, "binance", "1m", "BTCUSDT")
+
+
+def path(cache):
+    return cache._path("binance", "1m", "BTCUSDT")
+
+
+def assert_matches_database(array, db):
+    np.testing.assert_array_equal(
+        array, db.get_candlesticks_array("binance", "BTCUSDT", "1m")
+    )
+
+
+def test_unchanged_database_leaves_the_file_alone(cache, db):
+    assert_matches_database(load(cache, db), db)
+    before = os.stat(path(cache))
+    assert_matches_database(load(cache, db), db)
+    after = os.stat(path(cache))
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+
+
+def test_new_bars_are_appended_in_place(cache, db):
+    load(cache, db)
+    inode = os.stat(path(cache)).st_ino
+    db.add_candlesticks(
+        "binance",
+        "BTCUSDT",
+        "1m",
+        bars(range(TIMESTAMPS[-1] + 60, TIMESTAMPS[-1] + 600, 60)),
+    )
+    assert_matches_database(load(cache, db), db)
+    assert os.stat(path(cache)).st_ino == inode
+
+
+def test_bar_in_progress_is_patched_in_place(cache, db):
+    load(cache, db)
+    inode = os.stat(path(cache)).st_ino
+    db.add_candlesticks("binance", "BTCUSDT", "1m", bars([TIMESTAMPS[-1]], 105.0))
+    array = load(cache, db)
+    assert_matches_database(array, db)
+    assert array[-1, 4] == 105.0
+    assert os.stat(path(cache)).st_ino == inode
+
+    # Patched and followed by new bars in the same load
+    db.add_candlesticks("binance", "BTCUSDT", "1m", bars([TIMESTAMPS[-1]], 106.0))
+    db.add_candlesticks("binance", "BTCUSDT", "1m", bars([TIMESTAMPS[-1] + 60], 107.0))
+    array = load(cache, db)
+    assert_matches_database(array, db)
+    np.testing.assert_array_equal(array[-2:, 4], [106.0, 107.0])
+    assert os.stat(path(cache)).st_ino == inode
+
+
+def test_invalidate_rereads_older_bars(cache, db):
+    load(cache, db)
+    db.add_candlesticks("binance", "BTCUSDT", "1m", bars(TIMESTAMPS[40:50], 90.0))
+    # Without invalidation only the last cached bar is re-read
+    assert load(cache, db)[45, 4] == 100.0
+    cache.invalidate("binance", "1m", "BTCUSDT", since=TIMESTAMPS[40])
+    assert_matches_database(load(cache, db), db)
@@ -0,0 +1,321 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from ladon.database import (
+    SCHEMA_VERSION,
+    TRADE_CHUNK,
+    SqliteDatabase,
+    migrate,
+    schema_version,
+)
+
+# The original name keyed layout, before schema versioning
+SCHEMA_V0 = (
+    "CREATE TABLE providers (name TEXT UNIQUE NOT NULL, info JSON NOT NULL)",
+    "CREATE TABLE candlesticks ("
+    "timestamp INTEGER NOT NULL,"
+    "symbol TEXT NOT NULL,"
+    "interval TEXT NOT NULL,"
+    "provider TEXT NOT NULL REFERENCES providers(name),"
+    "open REAL NOT NULL,"
+    "high REAL NOT NULL,"
+    "low REAL NOT NULL,"
+    "close REAL NOT NULL,"
+    "volume REAL NOT NULL,"
+    "quote_volume REAL,"
+    "data JSON NOT NULL,"
+    "PRIMARY KEY (timestamp, symbol, interval, provider))",
+    "CREATE INDEX candlestick_timestamp_idx ON candlesticks (timestamp)",
+)
+
+SYMBOLS = ("BTCUSDT", "ETHUSDT")
+TIMESTAMPS = range(1500000000, 1500000000 + 60 * 100, 60)
+# Trade ids 1 to 300 about 37 seconds apart, so over three hour chunks
+TRADE_IDS = np.arange(1, 301)
+TRADES_START = 1500000000
+
+
+def kline(timestamp, close):
+    return [timestamp * 1000, str(close), str(close + 1), str(close - 1), str(close)]
+
+
+def v0_database(filename):
+    connection = sqlite3.connect(filename)
+    for statement in SCHEMA_V0:
+        connection.execute(statement)
+    connection.execute("INSERT INTO providers VALUES ('binance', '{\"symbols\": []}')")
+    connection.executemany(
+        "INSERT INTO candlesticks VALUES (?, ?, '1m', 'binance', ?, ?, ?, ?, 1, ?, ?)",
+        [
+            (t, symbol, i, i + 1, i - 1, i, i, f"[{t * 1000}]")
+            for symbol in SYMBOLS
+            for i, t in enumerate(TIMESTAMPS)
+        ],
+    )
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = SqliteDatabase(str(tmp_path / "ladon.db"))
+    for symbol in SYMBOLS:
+        database.add_candlesticks(
+            "binance",
+            symbol,
+            "1m",
+            {
+                t: (i, i + 1, i - 1, i, 1.0, i, kline(t, i))
+                for i, t in enumerate(TIMESTAMPS)
+            },
+        )
+    yield database
+    database.connection.close()
+
+
+def test_fresh_database_has_current_schema(tmp_path):
+    filename = str(tmp_path / "ladon.db")
+    SqliteDatabase(filename).connection.close()
+    connection = sqlite3.connect(filename)
+    assert schema_version(connection) == SCHEMA_VERSION
+    tables = {
+        name
+        for name, in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        )
+    }
+    assert {"providers", "symbols", "candlesticks", "coverage", "trades"} <= tables
+    connection.close()
+    assert not migrate(filename)
+
+
+def test_migrates_v0_to_current(tmp_path):
+    filename = str(tmp_path / "legacy.db")
+    v0_database(filename)
+    assert migrate(filename)
+
+    connection = sqlite3.connect(filename)
+    assert schema_version(connection) == SCHEMA_VERSION == 3
+    connection.close()
+
+    database = SqliteDatabase(filename)
+    assert database.get_provider_info("binance") == {"symbols": []}
+    for symbol in SYMBOLS:
+        array = database.get_candlesticks_array("binance", symbol, "1m")
+        np.testing.assert_array_equal(array[:, 0], list(TIMESTAMPS))
+        np.testing.assert_array_equal(array[:, 4], np.arange(len(TIMESTAMPS)))
+    assert len(database.get_trades("binance", "BTCUSDT")["id"]) == 0
+    database.connection.close()
+
+
+def plans(db, query):
+    # EXPLAIN QUERY PLAN of every SELECT run by query()
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+    try:
+        query()
+    finally:
+        db.connection.set_trace_callback(None)
+    return {
+        statement: [
+            row[3] for row in db.connection.execute(f"EXPLAIN QUERY PLAN {statement}")
+        ]
+        for statement in statements
+        if statement.lstrip().upper().startswith("SELECT")
+    }
+
+
+START, END = TIMESTAMPS[10], TIMESTAMPS[50]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        lambda db: db.get_candlestick("binance", "BTCUSDT", "1m"),
+        lambda db: db.get_candlestick("binance", "BTCUSDT", "1m", START),
+        lambda db: db.get_candlesticks("binance", "BTCUSDT", "1m"),
+        lambda db: db.get_candlesticks("binance", "BTCUSDT", "1m", START, END),
+        lambda db: db.get_candlesticks("binance", "BTCUSDT", "1m", start=START),
+        lambda db: db.get_candlesticks("binance", "BTCUSDT", "1m", end=END),
+        lambda db: db.get_candlesticks_array("binance", "BTCUSDT", "1m"),
+        lambda db: db.get_candlesticks_array("binance", "BTCUSDT", "1m", START, END),
+        lambda db: list(db.iter_candlesticks("binance", "BTCUSDT", "1m", START, END)),
+        lambda db: db.get_timestamps("binance", "BTCUSDT", "1m", START, END),
+        lambda db: db.get_candlesticks_arrays("binance", "1m"),
+        lambda db: db.get_candlesticks_arrays("binance", "1m", list(SYMBOLS)),
+        lambda db: db.get_candlesticks_arrays("binance", "1m", None, START, END),
+    ],
+)
+def test_candlestick_queries_use_primary_key(db, query):
+    # Fresh connection so the id lookups are part of the trace too
+    db._ids.clear()
+    query_plans = plans(db, lambda: query(db))
+    candlestick_plans = [
+        plan
+        for statement, plan in query_plans.items()
+        if "from candlesticks" in statement.lower()
+    ]
+    assert len(candlestick_plans) > 0
+    for statement, plan in query_plans.items():
+        assert not any(detail.startswith("SCAN") for detail in plan), (statement, plan)
+        assert not any("TEMP B-TREE" in detail for detail in plan), (statement, plan)
+    for plan in candlestick_plans:
+        assert any(
+            detail.startswith("SEARCH candlesticks USING PRIMARY KEY")
+            for detail in plan
+        ), plan
+
+
+def test_candlesticks_arrays_group_rows_by_symbol(db):
+    db.add_candlesticks(
+        "binance",
+        "XRPUSDT",
+        "1m",
+        {t: (5, 6, 4, 5, 1.0, 5, kline(t, 5)) for t in TIMESTAMPS[20:23]},
+    )
+    arrays = db.get_candlesticks_arrays("binance", "1m", None, START, END)
+    assert set(arrays) == {"BTCUSDT", "ETHUSDT", "XRPUSDT"}
+    for symbol in SYMBOLS:
+        np.testing.assert_array_equal(
+            arrays[symbol],
+            db.get_candlesticks_array("binance", symbol, "1m", START, END),
+        )
+    np.testing.assert_array_equal(arrays["XRPUSDT"][:, 0], TIMESTAMPS[20:23])
+    assert db.get_candlesticks_arrays("binance", "1m", ["DOGEUSDT"]) == {}
+
+
+def test_candlesticks_arrays_with_concurrent_writer(tmp_path):
+    # A fetch committing bars while a backtest loads must not shift rows
+    # into the wrong symbol
+    filename = str(tmp_path / "ladon.db")
+    database = SqliteDatabase(filename, ingest=True)
+    for i, symbol in enumerate(SYMBOLS):
+        database.add_candlesticks(
+            "binance",
+            symbol,
+            "1m",
+            {t: (i, i + 1, i, i, 1.0, i, kline(t, i)) for t in TIMESTAMPS},
+        )
+    writer = SqliteDatabase(filename, ingest=True)
+    late = TIMESTAMPS[-1] + 60
+
+    started = []
+
+    def write_once(statement):
+        # Commit a bar as soon as the load moves past its first candlesticks
+        # statement
+        if started == [True]:
+            writer.add_candlesticks(
+                "binance",
+                SYMBOLS[0],
+                "1m",
+                {late: (0, 1, 0, 0, 1.0, 0, kline(late, 0))},
+            )
+            started.append(True)
+        elif "from candlesticks" in statement:
+            started[:] = [True]
+
+    database.connection.set_trace_callback(write_once)
+    arrays = database.get_candlesticks_arrays("binance", "1m")
+    database.connection.set_trace_callback(None)
+    for i, symbol in enumerate(SYMBOLS):
+        assert np.all(arrays[symbol][:, 4] == i), symbol
+    assert len(started) == 2
+    assert len(arrays[SYMBOLS[1]]) == len(TIMESTAMPS)
+    writer.connection.close()
+    database.connection.close()
+
+
+def trades(ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    return {
+        "id": ids,
+        "ts": TRADES_START * 1000 + ids * 37000 + ids % 7,
+        "px": 100 + 0.01 * (ids % 13),
+        "qty": 0.001 * ids,
+    }
+
+
+def assert_trades_equal(actual, expected):
+    assert set(actual) == set(expected)
+    for field in expected:
+        np.testing.assert_array_equal(actual[field], expected[field], err_msg=field)
+
+
+def segments(database):
+    return database.connection.execute(
+        "SELECT chunk, count(*), compression FROM trades GROUP BY chunk, compression"
+    ).fetchall()
+
+
+@pytest.fixture(params=["zlib", None])
+def trades_db(request, tmp_path):
+    database = SqliteDatabase(
+        str(tmp_path / "ladon.db"), trade_compression=request.param
+    )
+    yield database
+    database.connection.close()
+
+
+def test_trades_appended_as_segments(trades_db):
+    for ids in np.array_split(TRADE_IDS, 7):
+        trades_db.add_trades("binance", "BTCUSDT", trades(ids))
+    assert_trades_equal(trades_db.get_trades("binance", "BTCUSDT"), trades(TRADE_IDS))
+    rows = segments(trades_db)
+    chunks = np.unique(trades(TRADE_IDS)["ts"] // 1000 // TRADE_CHUNK * TRADE_CHUNK)
+    assert [chunk for chunk, _, _ in rows] == chunks.tolist()
+    assert {compression for _, _, compression in rows} == {trades_db.trade_compression}
+    # Newer batches were added to their chunk rather than merged into it
+    assert sum(count for _, count, _ in rows) > len(chunks)
+    assert trades_db.get_trades("binance", "ETHUSDT")["id"].size == 0
+
+
+def test_overlapping_and_out_of_order_trades_merged(trades_db):
+    rng = np.random.default_rng(0)
+    for ids in (TRADE_IDS[100:200], rng.permutation(TRADE_IDS[:120]), TRADE_IDS[150:]):
+        trades_db.add_trades("binance", "BTCUSDT", trades(ids))
+    # Every chunk touched by an older or repeated id is one segment again
+    trades_db.add_trades("binance", "BTCUSDT", trades(TRADE_IDS[::-1]))
+    assert_trades_equal(trades_db.get_trades("binance", "BTCUSDT"), trades(TRADE_IDS))
+    assert all(count == 1 for _, count, _ in segments(trades_db))
+
+
+def test_trades_range_boundaries(trades_db):
+    trades_db.add_trades("binance", "BTCUSDT", trades(TRADE_IDS))
+    # Bounds are plain ints, as the command line passes them
+    seconds = (trades(TRADE_IDS)["ts"] // 1000).tolist()
+
+    def ids(start=None, end=None):
+        return trades_db.get_trades("binance", "BTCUSDT", start, end)["id"].tolist()
+
+    def expected(start, end):
+        return [i for i, t in zip(TRADE_IDS.tolist(), seconds) if start <= t <= end]
+
+    # Both ends inclusive, on and between trades and across chunks
+    for start, end in [
+        (seconds[10], seconds[20]),
+        (seconds[10] + 1, seconds[20] - 1),
+        (seconds[50], seconds[250]),
+        (seconds[0] // TRADE_CHUNK * TRADE_CHUNK + TRADE_CHUNK, seconds[-1]),
+        (seconds[42], seconds[42]),
+    ]:
+        assert ids(start, end) == expected(start, end)
+    assert ids(start=seconds[-1]) == [TRADE_IDS[-1]]
+    assert ids(end=seconds[0]) == [TRADE_IDS[0]]
+    assert ids(start=seconds[-1] + 1) == []
+    assert ids(end=seconds[0] - 1) == []
+    assert ids(seconds[5] + 1, seconds[5] + 2) == []
+
+
+def test_last_trade_id(trades_db):
+    assert trades_db.get_last_trade_id("binance", "BTCUSDT") is None
+    trades_db.add_trades("binance", "BTCUSDT", trades(TRADE_IDS[100:200]))
+    assert trades_db.get_last_trade_id("binance", "BTCUSDT") == 200
+    # An older batch landing in earlier chunks does not move it back
+    trades_db.add_trades("binance", "BTCUSDT", trades(TRADE_IDS[:50]))
+    assert trades_db.get_last_trade_id("binance", "BTCUSDT") == 200
+    trades_db.add_trades("binance", "BTCUSDT", trades(TRADE_IDS[190:]))
+    assert trades_db.get_last_trade_id("binance", "BTCUSDT") == 300
+    assert trades_db.get_last_trade_id("binance", "ETHUSDT") is None
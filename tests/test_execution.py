@@ -0,0 +1,209 @@
+import asyncio
+import time
+from importlib import import_module
+
+import numpy as np
+import pytest
+
+from fake_exchange import API_KEY, API_SECRET, FakeExchange
+from ladon.execution import Executor, order_diffs, quote_asset
+from ladon.providers.ratelimit import RateLimitedAsyncClient
+
+SYMBOLS = [f"SYM{i}USDT" for i in range(12)]
+PRICES = np.linspace(10, 120, len(SYMBOLS))
+
+
+class ThrottledExchange(FakeExchange):
+    # Turns away the first `throttled` order requests with a 429
+    def __init__(self, *args, throttled=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throttled = throttled
+
+    def _count(self, orders):
+        with self._lock:
+            if self.throttled > 0:
+                self.throttled -= 1
+                self.rejected += orders
+                return None
+        return super()._count(orders)
+
+
+@pytest.fixture(params=["binance", "binance_futures"])
+def provider(request, monkeypatch):
+    monkeypatch.setenv("BINANCE_API_KEY", API_KEY)
+    monkeypatch.setenv("BINANCE_API_SECRET", API_SECRET)
+    module = import_module(f"ladon.providers.{request.param}")
+    # The module client would outlive the event loop of a single test
+    monkeypatch.setattr(module, "client", RateLimitedAsyncClient(timeout=None))
+    return module
+
+
+def serve(provider, monkeypatch, exchange_class=FakeExchange, **kwargs):
+    exchange = exchange_class(
+        SYMBOLS, futures=provider.__name__.endswith("futures"), **kwargs
+    )
+    server = exchange.serve()
+    monkeypatch.setattr(provider, "BASE_URL", f"http://localhost:{server.server_port}")
+    return exchange, server
+
+
+def run(provider, server, main):
+    async def session():
+        try:
+            info = await provider.exchange_info()
+            executor = Executor(provider, info, SYMBOLS, band=0.001)
+            await executor.sync(PRICES)
+            return await main(executor)
+        finally:
+            await provider.close()
+
+    try:
+        return asyncio.run(session())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+async def settle(executor, done, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not done() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert done()
+
+
+def one_hot(i):
+    weights = np.zeros(len(SYMBOLS))
+    weights[i] = 0.5
+    return weights
+
+
+def test_order_diffs():
+    symbols = ["AUSDT", "BUSDT", "CUSDT", "DUSDT", "EUSDT"]
+    prices = np.array([100.0, 50.0, np.nan, 10.0, 1.0])
+    weights = np.array([0.5004, 0.001, 0.2, -0.3, 0.008])
+    steps = np.array([0.01, 0.1, 1.0, 1.0, 1.0])
+    min_notional = np.full(5, 5.0)
+    orders = order_diffs(
+        symbols, weights, np.zeros(5), prices, 1000.0, steps, min_notional
+    )
+    # A is truncated to its step, B rounds to nothing and C has no price
+    assert orders == [
+        {"symbol": "AUSDT", "side": "BUY", "quantity": "5.00"},
+        {"symbol": "DUSDT", "side": "SELL", "quantity": "30"},
+        {"symbol": "EUSDT", "side": "BUY", "quantity": "8"},
+    ]
+
+    # Diffs from the held quantities, skipping those inside the band
+    held = np.array([4.0, 0.0, 0.0, -29.0, 0.0])
+    orders = order_diffs(
+        symbols, weights, held, prices, 1000.0, steps, min_notional, band=0.02
+    )
+    assert orders == [{"symbol": "AUSDT", "side": "BUY", "quantity": "1.00"}]
+
+    # The minimum notional applies even with no band
+    orders = order_diffs(
+        symbols, weights, np.zeros(5), prices, 1000.0, steps, np.full(5, 9.0), band=0
+    )
+    assert [order["symbol"] for order in orders] == ["AUSDT", "DUSDT"]
+
+
+def test_mixed_quote_assets_rejected():
+    info = FakeExchange(["AAAUSDT", "BBBUSDT"]).exchange_info()
+    assert quote_asset(info, ["AAAUSDT", "BBBUSDT"]) == "USDT"
+    info["symbols"][1]["quoteAsset"] = "BTC"
+    with pytest.raises(ValueError, match="one quote asset"):
+        Executor(None, info, ["AAAUSDT", "BBBUSDT"])
+
+
+def test_rebalances_coalesce_into_the_latest(provider, monkeypatch):
+    exchange, server = serve(provider, monkeypatch)
+
+    async def main(executor):
+        for i in range(3):
+            executor.rebalance(one_hot(i), PRICES)
+        worker = asyncio.ensure_future(executor.run())
+        await settle(executor, lambda: executor.sent + executor.failed > 0)
+        await asyncio.sleep(0.1)
+        worker.cancel()
+        return executor
+
+    executor = run(provider, server, main)
+    assert (executor.sent, executor.failed, exchange.orders) == (1, 0, 1)
+    expected = dict.fromkeys(SYMBOLS, 0.0)
+    expected[SYMBOLS[2]] = np.trunc(0.5 * exchange.balance / PRICES[2] / 0.001) * 0.001
+    assert exchange.positions == pytest.approx(expected, abs=0.001)
+
+
+def test_orders_sent_in_batches(provider, monkeypatch):
+    exchange, server = serve(provider, monkeypatch)
+
+    async def main(executor):
+        requests = exchange.requests
+        worker = asyncio.ensure_future(executor.run())
+        executor.rebalance(np.full(len(SYMBOLS), 1 / len(SYMBOLS)), PRICES)
+        await settle(executor, lambda: executor.sent == len(SYMBOLS))
+        worker.cancel()
+        return exchange.requests - requests
+
+    requests = run(provider, server, main)
+    assert requests == -(-len(SYMBOLS) // provider.MAX_BATCH_ORDERS)
+    assert exchange.orders == len(SYMBOLS)
+
+
+def test_orders_in_flight_are_not_sent_twice(provider, monkeypatch):
+    exchange, server = serve(provider, monkeypatch, delay=0.2)
+    weights = np.full(len(SYMBOLS), 1 / len(SYMBOLS))
+
+    async def main(executor):
+        worker = asyncio.ensure_future(executor.run())
+        executor.rebalance(weights, PRICES)
+        await settle(executor, lambda: np.any(executor.in_flight != 0))
+        # The same weights again while the first orders are out
+        executor.rebalance(weights, PRICES)
+        assert executor._pending == {}
+        await settle(executor, lambda: executor.sent == len(SYMBOLS))
+        worker.cancel()
+        np.testing.assert_array_equal(executor.in_flight, 0)
+        filled = executor.quantities.copy()
+        await executor.sync(PRICES)
+        return filled, executor.quantities
+
+    filled, synced = run(provider, server, main)
+    assert exchange.orders == len(SYMBOLS)
+    np.testing.assert_allclose(filled, [exchange.positions[s] for s in SYMBOLS])
+    np.testing.assert_allclose(synced, filled)
+
+
+def test_throttled_orders_retried(provider, monkeypatch):
+    exchange, server = serve(provider, monkeypatch, ThrottledExchange)
+
+    async def main(executor):
+        worker = asyncio.ensure_future(executor.run())
+        executor.rebalance(one_hot(0), PRICES)
+        await settle(executor, lambda: executor.sent + executor.failed > 0)
+        worker.cancel()
+        return executor
+
+    executor = run(provider, server, main)
+    assert (executor.sent, executor.failed) == (1, 0)
+    assert (exchange.rejected, exchange.orders) == (1, 1)
+    assert provider.client.concurrency == provider.client.max_concurrency // 2
+    assert executor.quantities[0] == exchange.positions[SYMBOLS[0]] > 0
+
+
+def test_orders_given_up_after_retries_count_as_failed(provider, monkeypatch):
+    monkeypatch.setattr(RateLimitedAsyncClient, "MAX_RETRIES", 1)
+    exchange, server = serve(provider, monkeypatch, ThrottledExchange)
+
+    async def main(executor):
+        worker = asyncio.ensure_future(executor.run())
+        executor.rebalance(one_hot(0), PRICES)
+        await settle(executor, lambda: executor.sent + executor.failed > 0)
+        worker.cancel()
+        return executor
+
+    executor = run(provider, server, main)
+    assert (executor.sent, executor.failed) == (0, 1)
+    assert (exchange.rejected, exchange.orders) == (1, 0)
+    np.testing.assert_array_equal(executor.in_flight, 0)
+    np.testing.assert_array_equal(executor.quantities, 0)
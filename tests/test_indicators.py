@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from ladon import engine, indicators
+from ladon.base import Candlestick
+from ladon.strategies import buyandhold, crossmean, macross, multima
+
+WINDOW = 20
+
+
+def closes(symbols=3, bars=300, seed=0, nans=True):
+    rng = np.random.default_rng(seed)
+    x = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (symbols, bars)), axis=1))
+    if nans:
+        # A listing gap at the start and scattered missing bars
+        x[0, :30] = np.nan
+        x[1, rng.choice(bars, 10, replace=False)] = np.nan
+    return x
+
+
+def stream(indicator, x):
+    return np.array([np.copy(indicator.update(bar)) for bar in x.T]).T
+
+
+@pytest.mark.parametrize(
+    "streaming, batch",
+    [
+        (indicators.RollingSum, indicators.rolling_sum),
+        (indicators.RollingMean, indicators.rolling_mean),
+        (indicators.RollingVar, indicators.rolling_var),
+        (indicators.RollingStd, indicators.rolling_std),
+        (indicators.RollingZScore, indicators.rolling_zscore),
+        (indicators.RollingMax, indicators.rolling_max),
+        (indicators.RollingMin, indicators.rolling_min),
+    ],
+)
+@pytest.mark.parametrize("nans", [False, True])
+def test_rolling_streaming_matches_batch(streaming, batch, nans):
+    x = closes(nans=nans)
+    result = stream(streaming(WINDOW, shape=(len(x),)), x)
+    expected = batch(x, WINDOW)
+    np.testing.assert_allclose(result, expected, rtol=1e-7, atol=1e-9)
+    # Warm-up bars stay NaN
+    assert np.isnan(result[:, : WINDOW - 1]).all()
+
+
+def test_rolling_var_ddof():
+    x = closes()
+    result = stream(indicators.RollingVar(WINDOW, shape=(len(x),), ddof=1), x)
+    np.testing.assert_allclose(
+        result, indicators.rolling_var(x, WINDOW, ddof=1), rtol=1e-7, atol=1e-9
+    )
+
+
+@pytest.mark.parametrize("nans", [False, True])
+def test_ema_streaming_matches_batch(nans):
+    x = closes(nans=nans)
+    result = stream(indicators.EMA(span=WINDOW, shape=(len(x),)), x)
+    np.testing.assert_allclose(result, indicators.ema(x, span=WINDOW))
+
+
+def test_scalar_updates():
+    x = closes(symbols=1, nans=False)[0]
+    indicator = indicators.RollingMean(WINDOW)
+    result = np.array([indicator.update(value) for value in x])
+    np.testing.assert_allclose(result, indicators.rolling_mean(x, WINDOW))
+
+
+def candlesticks(bars=400):
+    result = []
+    for i, close in enumerate(closes(symbols=4, bars=bars, nans=False)):
+        array = np.empty((bars, 7))
+        array[:, 0] = 1500000000 + 60 * np.arange(bars)
+        array[:, 1:5] = close[:, np.newaxis]
+        array[:, 5] = 10.0
+        array[:, 6] = 10.0 * close
+        result.append(Candlestick.from_array(f"SYM{i}USDT", array))
+    return result
+
+
+@pytest.mark.parametrize(
+    "strategy, params",
+    [
+        (buyandhold, {}),
+        (crossmean, {}),
+        (macross, {"fast_length": 10, "slow_length": 50}),
+        (multima, {"periods": [10, 40, 160]}),
+    ],
+)
+def test_on_bar_matches_step(strategy, params):
+    matches, max_difference = engine.verify(strategy, candlesticks(), **params)
+    assert matches, max_difference
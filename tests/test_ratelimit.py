@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+
+from ladon.providers import auth, ratelimit
+from ladon.providers.ratelimit import RateLimitedAsyncClient
+
+URL = "http://exchange.test/api"
+
+
+def client(handler, **kwargs):
+    return RateLimitedAsyncClient(transport=httpx.MockTransport(handler), **kwargs)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_reconciles_used_weight_header():
+    async def main():
+        async with client(
+            lambda request: httpx.Response(200, headers={"x-mbx-used-weight-1m": "80"})
+        ) as c:
+            c.add_rate_limit("REQUEST_WEIGHT", 100, "MINUTE")
+            await c.get(URL, weight=1)
+            bucket = c.buckets[("REQUEST_WEIGHT", 60)]
+            # The server saw 80 of the 90 usable, far more than the 1 taken here
+            assert bucket.tokens == pytest.approx(10, abs=0.1)
+            assert bucket.wait_time(20) > 0
+
+    run(main())
+
+
+@pytest.mark.parametrize("status", [429, 418])
+def test_retry_after_backoff(status):
+    responses = [
+        httpx.Response(status, headers={"Retry-After": "0.3"}),
+        httpx.Response(200),
+    ]
+    times = []
+
+    def handler(request):
+        times.append(time.monotonic())
+        return responses.pop(0)
+
+    async def main():
+        async with client(handler) as c:
+            response = await c.get(URL)
+            assert response.status_code == 200
+            assert c.concurrency == c.max_concurrency // 2
+
+    run(main())
+    assert len(times) == 2
+    assert times[1] - times[0] >= 0.3
+
+
+def test_signed_requests_signed_again_on_retry(monkeypatch):
+    # A signature made before the Retry-After pause would be stale by the
+    # time the request is sent again
+    monkeypatch.setattr(auth, "RECV_WINDOW", 200)
+    responses = [httpx.Response(429, headers={"Retry-After": "0.3"})]
+    queries = []
+
+    def handler(request):
+        query = request.url.query.decode()
+        queries.append(dict(parse_qsl(query)))
+        payload, signature = query.rsplit("&signature=", 1)
+        expected = hmac.new(b"secret", payload.encode(), hashlib.sha256).hexdigest()
+        assert signature == expected
+        params = queries[-1]
+        if time.time() * 1000 - int(params["timestamp"]) > int(params["recvWindow"]):
+            return httpx.Response(400)
+        return responses.pop(0) if responses else httpx.Response(200)
+
+    async def main():
+        async with client(handler) as c:
+            return await c.post(
+                URL, sign=lambda: auth.signed_query({"symbol": "BTCUSDT"}, "secret")
+            )
+
+    assert run(main()).status_code == 200
+    assert len(queries) == 2
+    assert all(query["symbol"] == "BTCUSDT" for query in queries)
+    assert int(queries[1]["timestamp"]) - int(queries[0]["timestamp"]) >= 300
+
+
+def test_concurrency_halves_and_recovers():
+    throttled = [True, True]
+
+    def handler(request):
+        if throttled:
+            throttled.pop()
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200)
+
+    async def main():
+        async with client(handler, max_concurrency=8) as c:
+            await c.get(URL)
+            assert c.concurrency == 2
+            # Grows back by one per `concurrency` successes
+            for expected in (3, 4):
+                for _ in range(c.concurrency):
+                    await c.get(URL)
+                assert c.concurrency == expected
+            for _ in range(4 + 5 + 6 + 7):
+                await c.get(URL)
+            assert c.concurrency == c.max_concurrency
+
+    run(main())
+
+
+def test_in_flight_requests_capped():
+    in_flight = [0, 0]
+
+    async def handler(request):
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight[1], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return httpx.Response(200)
+
+    async def main():
+        async with client(handler, max_concurrency=3) as c:
+            await asyncio.gather(*(c.get(URL) for _ in range(12)))
+
+    run(main())
+    assert in_flight[1] == 3
+
+
+def test_raw_requests_cost_one_per_request():
+    async def main():
+        async with client(lambda request: httpx.Response(200)) as c:
+            c.add_rate_limit("RAW_REQUESTS", 100, "MINUTE")
+            for _ in range(5):
+                await c.get(URL, weight=10)
+            assert c.buckets[("RAW_REQUESTS", 60)].tokens == pytest.approx(85, abs=0.1)
+
+    run(main())
+
+
+def test_orders_counted_in_fixed_windows(monkeypatch):
+    now = [1000.5]
+    monkeypatch.setattr(ratelimit.time, "time", lambda: now[0])
+    counter = ratelimit.WindowCounter(10, 10, "x-mbx-order-count-10s")
+
+    for _ in range(9):
+        assert counter.wait_time(1) == 0
+        counter.take(1)
+    # 90% of the limit is used, wait for the next window at 1010
+    assert counter.wait_time(1) == pytest.approx(9.5)
+
+    now[0] = 1010.0
+    assert counter.wait_time(1) == 0
+    counter.reconcile(8)
+    assert counter.used == 8
+    assert counter.wait_time(2) == pytest.approx(10)
+
+
+def test_orders_only_charged_to_order_requests():
+    async def main():
+        async with client(
+            lambda request: httpx.Response(200, headers={"x-mbx-order-count-10s": "3"})
+        ) as c:
+            c.add_rate_limit("ORDERS", 50, "SECOND", 10)
+            c.add_rate_limit("ORDERS", 1000, "DAY")
+            await c.get(URL)
+            window = c.buckets[("ORDERS", 10)]
+            day = c.buckets[("ORDERS", 86400)]
+            assert day.used == 0
+            # Reconciled from the header, not from the zero cost of the GET
+            assert window.used == 3
+
+            await c.post(URL, orders=5)
+            assert window.used == 8
+            assert day.used == 5
+
+    run(main())
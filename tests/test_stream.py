@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from kline_server import KlineServer
+from ladon.base import Candlestick
+from ladon.providers import stream as kline_stream
+from ladon.providers.stream import KlineStream, rest_update
+
+SYMBOLS = ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+PERIOD = 0.01
+BAR = 4
+# Bars 0 to 9 close, bar 10 is still in progress at the last tick
+TICKS = 42
+BARS = TICKS // BAR
+
+
+def server(**kwargs):
+    # The bar in progress opens now, so only it is still open by the clock
+    # the REST backfill checks close times against
+    return KlineServer(
+        period=PERIOD, bar=BAR, start=int(time.time()) - 60 * BARS, **kwargs
+    )
+
+
+def expected(server, symbol):
+    return np.array(
+        [
+            [update[k] for k in ("id", "o", "h", "l", "c", "v", "v2")]
+            for update in map(rest_update, server.klines(symbol, server.start))
+        ]
+    )
+
+
+def caught_up(server, candlesticks):
+    return all(
+        candlestick.np_array.shape == expected(server, symbol).shape
+        and np.array_equal(candlestick.np_array, expected(server, symbol))
+        for symbol, candlestick in candlesticks.items()
+    )
+
+
+def run(server, max_streams=kline_stream.MAX_STREAMS):
+    candlesticks = {symbol: Candlestick(symbol) for symbol in SYMBOLS}
+    closed = []
+
+    async def main():
+        async with server.serve() as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            stream = KlineStream(
+                f"ws://localhost:{port}",
+                lambda symbol, interval: f"{symbol.lower()}@kline_{interval}",
+                server.backfill,
+                candlesticks,
+                on_close=lambda symbol, open_time: closed.append((symbol, open_time)),
+                max_streams=max_streams,
+            )
+            task = asyncio.ensure_future(stream.run())
+            await server.clock(until=TICKS - 1)
+            deadline = time.monotonic() + 5
+            while not caught_up(server, candlesticks) and time.monotonic() < deadline:
+                await asyncio.sleep(PERIOD)
+            await stream.stop()
+            await task
+            return stream
+
+    return asyncio.run(main()), candlesticks, closed
+
+
+def assert_closed_once(server, closed):
+    for symbol in SYMBOLS:
+        open_times = [open_time for name, open_time in closed if name == symbol]
+        assert open_times == [server.start + 60 * i for i in range(BARS)]
+
+
+def test_several_symbols_per_connection():
+    exchange = server()
+    stream, candlesticks, closed = run(exchange, max_streams=2)
+    assert exchange.connections == 2
+    assert stream.reconnects == 0
+    for symbol, candlestick in candlesticks.items():
+        np.testing.assert_array_equal(candlestick.np_array, expected(exchange, symbol))
+    assert_closed_once(exchange, closed)
+    assert stream.latency.count > 0
+
+
+def test_reconnects_and_backfills_missed_bars(monkeypatch):
+    # Every connection is dropped after about three ticks and stays down for
+    # five, so most closing updates only ever reach the stream through the
+    # REST backfill
+    monkeypatch.setattr(kline_stream, "RECONNECT_DELAY", 5 * PERIOD)
+    monkeypatch.setattr(kline_stream, "MAX_RECONNECT_DELAY", 5 * PERIOD)
+    exchange = server(drop_after=3 * len(SYMBOLS))
+    stream, candlesticks, closed = run(exchange)
+    assert stream.reconnects >= 3
+    assert exchange.connections >= 4
+    for symbol, candlestick in candlesticks.items():
+        np.testing.assert_array_equal(candlestick.np_array, expected(exchange, symbol))
+    assert_closed_once(exchange, closed)
+
+
+@pytest.mark.parametrize("drop_after", [None, 2 * len(SYMBOLS)])
+def test_bar_in_progress_is_not_closed(drop_after, monkeypatch):
+    monkeypatch.setattr(kline_stream, "RECONNECT_DELAY", PERIOD)
+    exchange = server(drop_after=drop_after)
+    _, candlesticks, closed = run(exchange)
+    in_progress = exchange.start + 60 * BARS
+    assert all(open_time < in_progress for _, open_time in closed)
+    for candlestick in candlesticks.values():
+        assert candlestick[-1][0] == in_progress
@@ -0,0 +1,81 @@
+from importlib import import_module
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from ladon.base import Candlestick, Panel
+from ladon.strategies import buyandhold, crossmean, macross, multima
+
+# The package exports the sweep() function under the module's name
+sweep = import_module("ladon.sweep")
+
+STRATEGIES = [
+    (buyandhold, {"width_coef": [2, 4]}),
+    (crossmean, {}),
+    (macross, {"fast_length": [5, 10], "slow_length": [30, 60]}),
+    (multima, {"width_coef": [2, 4]}),
+    (multima, {"periods": [[10, 40], [20, 80, 160]], "time_coef": [0.5]}),
+]
+
+
+def panel(bars=200):
+    rng = np.random.default_rng(0)
+    candlesticks = []
+    for i in range(3):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+        array = np.empty((bars, 7))
+        array[:, 0] = 1500000000 + 60 * np.arange(bars)
+        array[:, 1:5] = close[:, np.newaxis]
+        array[:, 5] = 10.0
+        array[:, 6] = 10.0 * close
+        candlesticks.append(Candlestick.from_array(f"SYM{i}USDT", array))
+    return Panel.from_candlesticks(candlesticks)
+
+
+@pytest.mark.parametrize("strategy, space", STRATEGIES)
+def test_declared_lookback_matches_step(strategy, space):
+    for params in sweep.combinations(space):
+        assert strategy.lookback(**params) == sweep._probe_lookback(strategy, **params)
+
+
+def test_padding_covers_strategy_defaults_and_returns():
+    assert sweep.padding(multima, [{"width_coef": 2}, {"width_coef": 4}]) == 1279
+    assert sweep.padding(macross, [{"fast_length": 5, "slow_length": 30}]) == 29
+    # calc_returns reads one close before the window
+    assert sweep.padding(buyandhold, [{}]) == 1
+    assert sweep.padding(buyandhold, []) == 1
+
+
+@pytest.mark.parametrize("strategy, space", STRATEGIES)
+def test_workers_keep_scoring_on_shared_memory(strategy, space):
+    param_sets = list(sweep.combinations(space))
+    source = panel()
+    source.reserve(sweep.padding(strategy, param_sets))
+    shm = shared_memory.SharedMemory(create=True, size=source.data.nbytes)
+    try:
+        data = np.ndarray(source.data.shape, dtype=np.float64, buffer=shm.buf)
+        data[:] = source.data
+        sweep._attach(
+            shm.name,
+            data.shape,
+            source.symbols,
+            source.times,
+            source.padding,
+            strategy.__name__.rsplit(".", 1)[-1],
+            "1m",
+        )
+        attached = sweep._worker["panel"].data
+        for params in param_sets:
+            scored, report = sweep._score(params)
+            assert scored == params
+            assert set(report) >= {"sharpe", "max_drawdown"}
+            # No reserve() in the worker swapped the data for a private copy
+            assert sweep._worker["panel"].data is attached
+        data[3, 0, -1] = 0.0
+        assert attached[3, 0, -1] == 0.0
+    finally:
+        sweep._worker.pop("panel", None)
+        sweep._worker.pop("shm").close()
+        shm.close()
+        shm.unlink()